@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+# Currency pairs with a typical spot level and volatility
+PAIRS = {
+    "EUR/USD": (1.09, 0.08),
+    "GBP/USD": (1.27, 0.09),
+    "USD/JPY": (150.0, 0.10),
+    "AUD/USD": (0.66, 0.11),
+    "USD/CHF": (0.88, 0.08),
+    "USD/CAD": (1.36, 0.07),
+    "EUR/GBP": (0.86, 0.06),
+    "NZD/USD": (0.61, 0.11),
+}
+
+# Short dated trades dominate a typical book, expiries are in years
+EXPIRIES = np.array([7, 14, 30, 61, 91, 182, 273, 365, 547, 730]) / 365
+EXPIRY_WEIGHTS = np.array([8, 8, 20, 15, 15, 12, 8, 8, 3, 3]) / 100
+
+
+def make_portfolio(n: int, seed: int = 0):
+    """
+    Generate a synthetic portfolio with the input file column names
+    :param n: Number of trades
+    :param seed: Seed of the random generator, the same seed gives the same book
+    :return: DataFrame with one row per trade
+    """
+    rng = np.random.default_rng(seed)
+    names = np.array(list(PAIRS))
+    pair = rng.integers(0, len(names), n)
+    spot_level = np.array([PAIRS[p][0] for p in names])[pair]
+    vol_level = np.array([PAIRS[p][1] for p in names])[pair]
+    base = np.array([p.split("/")[0] for p in names], dtype=object)[pair]
+    quote = np.array([p.split("/")[1] for p in names], dtype=object)[pair]
+
+    expiry = rng.choice(EXPIRIES, n, p=EXPIRY_WEIGHTS)
+    # Spot has drifted around its level, strikes sit within about 2 sd of spot
+    spot = spot_level * np.exp(rng.normal(0, 0.02, n))
+    moneyness = rng.normal(0, 0.5, n) * vol_level * np.sqrt(expiry)
+    # Notionals are lognormal around 5m and rounded to the nearest 100k
+    notional = np.maximum(np.round(rng.lognormal(np.log(5e6), 1.0, n), -5), 1e5)
+
+    return pd.DataFrame(
+        {
+            "TradeID": np.char.add("T", np.arange(n).astype(str)),
+            "Underlying": names[pair],
+            "Notional": notional,
+            "NotionalCurrency": np.where(rng.random(n) < 0.7, base, quote),
+            "Spot": spot.round(5),
+            "Strike": (spot * np.exp(moneyness)).round(4),
+            "Vol": (vol_level * rng.uniform(0.7, 1.5, n)).round(4),
+            "RateDomestic": rng.uniform(0.0, 0.055, n).round(4),
+            "RateForeign": rng.uniform(-0.005, 0.045, n).round(4),
+            "Expiry": expiry,
+            "OptionType": np.where(rng.random(n) < 0.5, "Call", "Put"),
+        }
+    )
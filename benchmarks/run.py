@@ -0,0 +1,257 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from src.io.formats import FORMATS
+from src.profiling import peak_rss_mb
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = "1000,100000,1000000,10000000"
+
+# Building one pydantic model per trade is too slow to run on the largest books
+DEFAULT_MAX_MODEL_TRADES = 100_000
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def measure(records: list[dict], stage: str, trades: int, func, *args, **kwargs):
+    """
+    Time one stage and append its record
+    :param records: List the record is appended to
+    :param stage: Name of the stage, e.g. "load_table"
+    :param trades: Number of trades the stage processes
+    :param func: Callable running the stage
+    :return: The return value of func
+    """
+    gc.collect()
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    records.append(
+        {
+            "stage": stage,
+            "trades": trades,
+            "seconds": seconds,
+            "trades_per_sec": trades / seconds if seconds > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+    )
+    logger.info(f"{trades:>10} trades  {stage:<16} {seconds:10.4f}s")
+    return value
+
+
+def run_size(
+    size: int,
+    file_format: str,
+    workdir: str,
+    workers: int = 1,
+    max_model_trades: int = DEFAULT_MAX_MODEL_TRADES,
+    seed: int = 0,
+):
+    """
+    Generate a portfolio and time every stage of the pipeline on it. The
+    per-trade model stages are skipped above max_model_trades.
+    :param size: Number of trades in the portfolio
+    :param file_format: Extension of the input and output files, e.g. ".csv"
+    :param workdir: Directory the generated files are written to
+    :param workers: Number of processes for the parallel pricing stage
+    :param max_model_trades: Largest book priced through FXOption models
+    :param seed: Seed of the synthetic portfolio
+    :return: List of stage records
+    """
+    from benchmarks.portfolio import make_portfolio
+    from src.io.reader import FileReader
+    from src.io.writer import FileWriter
+    from src.models import PortfolioSummary
+    from src.pricing.black_scholes import BlackScholesFX
+    from src.pricing.parallel import price_parallel
+
+    input_path = os.path.join(workdir, f"trades_{size}{file_format}")
+    output_path = os.path.join(workdir, f"output_{size}{file_format}")
+    FileWriter.write_frame(make_portfolio(size, seed=seed), input_path)
+    gc.collect()
+
+    records = []
+    if size <= max_model_trades:
+        options = measure(records, "load_data", size, FileReader.load_data, input_path)
+        results = measure(
+            records,
+            "price_scalar",
+            size,
+            lambda: [BlackScholesFX.calculate_greeks_and_pv(o) for o in options],
+        )
+        measure(
+            records,
+            "price_batch",
+            size,
+            BlackScholesFX.calculate_greeks_and_pv_batch,
+            options,
+        )
+        measure(
+            records,
+            "aggregate_models",
+            size,
+            lambda: PortfolioSummary(
+                total_pv=sum(r.pv for r in results),
+                total_delta=sum(r.delta for r in results),
+                total_vega=sum(r.vega for r in results),
+                num_of_trades=len(results),
+            ),
+        )
+        del options, results
+
+    trades = measure(records, "load_table", size, FileReader.load_table, input_path)
+    table = measure(records, "price_table", size, BlackScholesFX.price_table, trades)
+    if workers > 1:
+        measure(
+            records, "price_parallel", size, price_parallel, trades, workers=workers
+        )
+    summary = measure(records, "aggregate_table", size, table.summary)
+    measure(
+        records, "write_data", size, FileWriter.write_data, table, summary, output_path
+    )
+    return records
+
+
+def metadata(args: argparse.Namespace):
+    """
+    Describe the code and machine the benchmark ran on
+    :param args: Parsed command line arguments
+    :return: Dictionary stored alongside the results
+    """
+    import numpy
+    import pandas
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "format": args.format,
+        "workers": args.workers,
+        "seed": args.seed,
+    }
+
+
+def compare(records: list[dict], baseline: list[dict]):
+    """
+    Log the throughput of each stage against a previous run
+    :param records: Stage records of this run
+    :param baseline: Stage records of the run to compare against
+    """
+    previous = {(r["trades"], r["stage"]): r for r in baseline}
+    for record in records:
+        old = previous.get((record["trades"], record["stage"]))
+        if old is None or not old["trades_per_sec"] or not record["trades_per_sec"]:
+            continue
+        ratio = record["trades_per_sec"] / old["trades_per_sec"]
+        logger.info(
+            f"{record['trades']:>10} trades  {record['stage']:<16} "
+            f"{ratio:6.2f}x throughput vs baseline"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FXOption Pricer benchmarks")
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help="Comma separated portfolio sizes to benchmark",
+    )
+    parser.add_argument(
+        "--format",
+        default=".csv",
+        choices=sorted(FORMATS),
+        help="Extension of the generated input and output files",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Also time process-pool pricing with this many workers",
+    )
+    parser.add_argument(
+        "--max-model-trades",
+        type=int,
+        default=DEFAULT_MAX_MODEL_TRADES,
+        help="Skip the per-trade FXOption stages for larger portfolios",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Portfolio seed")
+    parser.add_argument(
+        "--output", default="benchmark.json", help="Path of the JSON results file"
+    )
+    parser.add_argument(
+        "--compare", help="Path of a previous JSON results file to compare against"
+    )
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.single is not None:
+            # Child process, report the records of one size on stdout
+            records = run_size(
+                args.single,
+                args.format,
+                workdir,
+                workers=args.workers,
+                max_model_trades=args.max_model_trades,
+                seed=args.seed,
+            )
+            print(json.dumps(records))
+            return
+
+        records = []
+        for size in (int(s) for s in args.sizes.split(",")):
+            # Each size runs in a fresh process so peak RSS is measured per size
+            child = subprocess.run(
+                [sys.executable, "-m", "benchmarks.run", "--single", str(size)]
+                + ["--format", args.format, "--workers", str(args.workers)]
+                + ["--max-model-trades", str(args.max_model_trades)]
+                + ["--seed", str(args.seed)],
+                cwd=ROOT,
+                stdout=subprocess.PIPE,
+                text=True,
+                check=True,
+            )
+            records.extend(json.loads(child.stdout.splitlines()[-1]))
+
+    report = {"metadata": metadata(args), "results": records}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Wrote benchmark results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(records, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
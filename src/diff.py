@@ -0,0 +1,405 @@
+import pickle
+import tempfile
+from itertools import zip_longest
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.io.reader import FileReader
+from src.manifest import CHECKSUM_BUCKETS, id_hashes, load_manifest
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Largest absolute difference of a result counted as unchanged
+DEFAULT_TOLERANCE = 1e-6
+
+# Rows of each output read at a time
+DIFF_CHUNK_SIZE = 100_000
+
+# Trades not matched within their chunk are spilled to this many files by id,
+# and each file is matched on its own once both outputs have been read
+SPILL_PARTITIONS = 64
+
+# Number of changed, added and removed trades quoted in the log
+EXAMPLE_TRADES = 10
+
+
+class RunDiff:
+    """
+    Differences between the results of two runs, accumulated batch by batch
+    of trades matched by id so no more than a batch is held at once
+    """
+
+    def __init__(
+        self,
+        columns: list[str],
+        tolerance: float = DEFAULT_TOLERANCE,
+        relative_tolerance: float = 0.0,
+        changes_path: str | None = None,
+    ):
+        """
+        :param columns: Result columns compared, those both outputs have
+        :param tolerance: Absolute difference allowed for every result
+        :param relative_tolerance: Difference allowed relative to the old result
+        :param changes_path: Optional CSV file every changed trade is written to
+        """
+        self.columns = columns
+        self.tolerance = tolerance
+        self.relative_tolerance = relative_tolerance
+        self.changes_path = changes_path
+        self.compared = 0
+        self.skipped = 0
+        self.changed = {name: 0 for name in columns}
+        self.changed_trades = 0
+        self.largest = {name: 0.0 for name in columns}
+        self.examples = pd.DataFrame()
+        self.added = []
+        self.removed = []
+        self.num_added = 0
+        self.num_removed = 0
+        self.summary_delta = {}
+        self.column_changes = ([], [])
+
+        if changes_path is not None:
+            # Truncated here, each batch of changes is appended
+            open(changes_path, "w").close()
+
+    def __bool__(self):
+        """True when the runs differ beyond the tolerance"""
+        return bool(
+            self.changed_trades
+            or self.num_added
+            or self.num_removed
+            or any(self.column_changes)
+        )
+
+    def compare(self, old_rows: pd.DataFrame, new_rows: pd.DataFrame):
+        """
+        Compare a batch of trades found in both runs
+        :param old_rows: Results of the trades in the old run
+        :param new_rows: Results of the same trades in the new run, in the same order
+        """
+        if old_rows.empty:
+            return
+        self.compared += len(old_rows)
+        changed = np.zeros(len(old_rows), dtype=bool)
+        worst = np.zeros(len(old_rows))
+        olds, news, differences = {}, {}, {}
+        for name in self.columns:
+            old = olds[name] = old_rows[name].to_numpy(dtype=float)
+            new = news[name] = new_rows[name].to_numpy(dtype=float)
+            difference = np.abs(new - old)
+            # Results missing from one run only are always a change
+            missing = np.isnan(old) != np.isnan(new)
+            allowed = self.tolerance + self.relative_tolerance * np.abs(old)
+            hit = (difference > allowed) | missing
+            self.changed[name] += int(np.count_nonzero(hit))
+            if hit.any():
+                difference = np.where(missing, np.inf, difference)
+                self.largest[name] = max(self.largest[name], difference[hit].max())
+                worst = np.fmax(worst, np.where(hit, difference, 0))
+            changed |= hit
+            differences[name] = new - old
+
+        rows = np.flatnonzero(changed)
+        if not rows.size:
+            return
+        self.changed_trades += rows.size
+        changes = pd.DataFrame({"id": old_rows["id"].to_numpy()[rows]})
+        for name in self.columns:
+            changes[f"{name}_old"] = olds[name][rows]
+            changes[f"{name}_new"] = news[name][rows]
+            changes[f"{name}_difference"] = differences[name][rows]
+        if self.changes_path is not None:
+            with open(self.changes_path, "a", newline="") as f:
+                changes.to_csv(f, index=False, header=f.tell() == 0)
+
+        # Keep only the trades with the largest differences as examples
+        changes["largest_difference"] = worst[rows]
+        if len(self.examples):
+            changes = pd.concat([self.examples, changes], ignore_index=True)
+        self.examples = changes.nlargest(EXAMPLE_TRADES, "largest_difference")
+
+    def unmatched(self, ids, added: bool):
+        """
+        Count trades found in one run only
+        :param ids: Ids of the trades
+        :param added: True for trades only in the new run, False for the old
+        """
+        ids = list(ids)
+        examples = self.added if added else self.removed
+        examples.extend(ids[: EXAMPLE_TRADES - len(examples)])
+        if added:
+            self.num_added += len(ids)
+        else:
+            self.num_removed += len(ids)
+
+    def log(self):
+        """
+        Log the trades that changed, were added or removed and the summary delta
+        """
+        old_only, new_only = self.column_changes
+        if old_only:
+            logger.warning(f"Columns only in the old run: {', '.join(old_only)}")
+        if new_only:
+            logger.warning(f"Columns only in the new run: {', '.join(new_only)}")
+        skipped = (
+            f", {self.skipped} of them skipped by matching checksums"
+            if self.skipped
+            else ""
+        )
+        logger.info(
+            f"Compared {self.compared} trades found in both runs{skipped}: "
+            f"{self.changed_trades} changed beyond the tolerance, "
+            f"{self.num_added} added and {self.num_removed} removed"
+        )
+        for name in self.columns:
+            if self.changed[name]:
+                logger.warning(
+                    f"  {name}: {self.changed[name]} trades changed, largest "
+                    f"difference {self.largest[name]:.6g}"
+                )
+        for row in self.examples.itertuples(index=False):
+            moves = ", ".join(
+                f"{name} {getattr(row, f'{name}_old'):.6g} -> "
+                f"{getattr(row, f'{name}_new'):.6g}"
+                for name in self.columns
+                if getattr(row, f"{name}_difference") != 0
+            )
+            logger.warning(f"  Trade {row.id}: {moves}")
+        if self.added:
+            logger.warning(f"  Added trades e.g. {', '.join(map(str, self.added))}")
+        if self.removed:
+            logger.warning(f"  Removed trades e.g. {', '.join(map(str, self.removed))}")
+        if self.summary_delta:
+            deltas = ", ".join(
+                f"{name} {delta:+.6g}"
+                for name, delta in self.summary_delta.items()
+                if delta is not None
+            )
+            logger.info(f"Portfolio summary delta: {deltas}")
+
+
+def summary_delta(old: dict, new: dict):
+    """
+    Change of every portfolio total between two runs
+    :param old: PortfolioSummary fields of the old run
+    :param new: PortfolioSummary fields of the new run
+    :return: Dictionary of field to new minus old, None where a run lacks it
+    """
+    delta = {}
+    for name in dict.fromkeys([*old, *new]):
+        if old.get(name) is None or new.get(name) is None:
+            delta[name] = None
+        else:
+            delta[name] = new[name] - old[name]
+    return delta
+
+
+def check_unique_ids(ids, path: str):
+    """
+    Raise if any trade id appears more than once
+    :param ids: Array of trade ids
+    :param path: Results file the ids were read from, for the message
+    """
+    index = pd.Index(ids)
+    if index.is_unique:
+        return
+    duplicated = sorted({str(i) for i in index[index.duplicated()]})
+    more = len(duplicated) - EXAMPLE_TRADES
+    raise ValueError(
+        f"Duplicate trade ids in {path}, trades cannot be matched by id: "
+        f"{', '.join(duplicated[:EXAMPLE_TRADES])}"
+        + (f" and {more} more" if more > 0 else "")
+    )
+
+
+def same_buckets(old: dict | None, new: dict | None):
+    """
+    Checksum buckets whose trades are the same in both runs, from the manifests
+    :param old: Manifest of the old run, None if it has none
+    :param new: Manifest of the new run, None if it has none
+    :return: Boolean array with one entry per bucket, or None when the
+        manifests are missing or their columns differ
+    """
+    if old is None or new is None or old.get("columns") != new.get("columns"):
+        return None
+    old_buckets = old.get("bucket_checksums")
+    new_buckets = new.get("bucket_checksums")
+    if not old_buckets or len(old_buckets) != CHECKSUM_BUCKETS:
+        return None
+    if not new_buckets or len(new_buckets) != CHECKSUM_BUCKETS:
+        return None
+    return np.array([a == b for a, b in zip(old_buckets, new_buckets)])
+
+
+def diff_runs(
+    old_path: str,
+    new_path: str,
+    tolerance: float = DEFAULT_TOLERANCE,
+    relative_tolerance: float = 0.0,
+    chunk_size: int = DIFF_CHUNK_SIZE,
+    changes_path: str | None = None,
+):
+    """
+    Compare the results of two runs trade by trade, matching trades by id.
+
+    Both outputs are streamed a chunk at a time. Trades whose id is in the
+    other run's chunk are compared straight away, so runs over the same book
+    in the same order hold only two chunks at once. The rest are spilled to
+    SPILL_PARTITIONS temporary files by the hash of their id and matched a
+    file at a time at the end. The hashes of every id are spilled the same
+    way, so an id repeated anywhere in either output is found partition by
+    partition. When both runs wrote manifests, the trades of checksum buckets
+    that are the same in both are skipped without reading their values, and
+    identical runs are not read at all.
+
+    :param old_path: Results file of the old run
+    :param new_path: Results file of the new run
+    :param tolerance: Absolute difference allowed for every result
+    :param relative_tolerance: Difference allowed relative to the old result
+    :param chunk_size: Rows of each output read at a time
+    :param changes_path: Optional CSV file every changed trade is written to
+    :return: RunDiff of the two runs
+    """
+    old_manifest, new_manifest = load_manifest(old_path), load_manifest(new_path)
+    for label, manifest in (("Old", old_manifest), ("New", new_manifest)):
+        if manifest is not None:
+            inputs = ", ".join(
+                f"{name} {entry['sha256'][:12]}"
+                for name, entry in manifest.get("inputs", {}).items()
+            )
+            logger.info(
+                f"{label} run: code {manifest.get('code_version')}, "
+                f"{manifest.get('trades')} trades, inputs {inputs}"
+            )
+    skip = same_buckets(old_manifest, new_manifest)
+
+    old_summary = FileReader.read_summary(old_path).model_dump(exclude_none=True)
+    new_summary = FileReader.read_summary(new_path).model_dump(exclude_none=True)
+
+    if skip is not None and skip.all():
+        # Every bucket matches, so the results are the same without reading them
+        columns = old_manifest["columns"]
+        diff = RunDiff(columns, tolerance, relative_tolerance, changes_path)
+        diff.compared = diff.skipped = int(new_manifest["trades"])
+        diff.summary_delta = summary_delta(old_summary, new_summary)
+        return diff
+
+    old_chunks = FileReader.iter_results(old_path, chunk_size)
+    new_chunks = FileReader.iter_results(new_path, chunk_size)
+    diff = None
+
+    with tempfile.TemporaryDirectory(prefix="fx-diff-") as spill_dir:
+
+        def spill(df: pd.DataFrame, side: str):
+            # Append the unmatched trades to the partition files of their ids
+            if df.empty:
+                return
+            partition = (id_hashes(df["id"]) >> np.uint64(32)) % np.uint64(
+                SPILL_PARTITIONS
+            )
+            for p, part in df.groupby(partition.astype(int)):
+                with open(Path(spill_dir) / f"{side}_{p}.pkl", "ab") as f:
+                    pickle.dump(part, f)
+
+        def unspill(side: str, p: int):
+            # Read back every batch spilled to one partition of one side
+            path = Path(spill_dir) / f"{side}_{p}.pkl"
+            if not path.exists():
+                return pd.DataFrame(columns=["id", *diff.columns])
+            parts = []
+            with open(path, "rb") as f:
+                while True:
+                    try:
+                        parts.append(pickle.load(f))
+                    except EOFError:
+                        break
+            return pd.concat(parts, ignore_index=True)
+
+        def spill_ids(df: pd.DataFrame, side: str):
+            # Append the hash of every id read to the partition file it is in
+            hashes = id_hashes(df["id"])
+            partition = (hashes >> np.uint64(32)) % np.uint64(SPILL_PARTITIONS)
+            # Small integers, so the stable sort is a radix sort
+            partition = partition.astype(np.uint8)
+            order = np.argsort(partition, kind="stable")
+            ends = np.searchsorted(partition[order], np.arange(SPILL_PARTITIONS + 1))
+            for p in np.flatnonzero(np.diff(ends)):
+                with open(Path(spill_dir) / f"{side}_ids_{p}.bin", "ab") as f:
+                    f.write(hashes[order[ends[p] : ends[p + 1]]].tobytes())
+            return hashes
+
+        def check_ids(side: str, path: str, p: int):
+            # Every copy of an id hashes to the same partition, so repeated
+            # hashes there are the only candidates for duplicated ids
+            ids_path = Path(spill_dir) / f"{side}_ids_{p}.bin"
+            if not ids_path.exists():
+                return
+            hashes = pd.Index(np.fromfile(ids_path, dtype=np.uint64))
+            if hashes.is_unique:
+                return
+            # Read the ids of the repeated hashes back, ruling out collisions
+            repeated = hashes[hashes.duplicated()]
+            ids = [
+                df["id"][np.isin(id_hashes(df["id"]), repeated)]
+                for df in FileReader.iter_results(path, chunk_size)
+            ]
+            check_unique_ids(pd.concat(ids, ignore_index=True), path)
+
+        def match(old: pd.DataFrame, new: pd.DataFrame):
+            # Compare the trades found in both, returning those that are not.
+            # A hash lookup of the ids, where a merge would sort them
+            rows = pd.Index(new["id"]).get_indexer(old["id"])
+            found = rows >= 0
+            diff.compare(old[found], new.iloc[rows[found]])
+            matched = np.zeros(len(new), dtype=bool)
+            matched[rows[found]] = True
+            return old[~found], new[~matched]
+
+        def unchanged(df: pd.DataFrame | None, count: bool):
+            # Drop the trades of buckets the manifests show are the same
+            if df is None:
+                return pd.DataFrame(columns=["id", *diff.columns])
+            df = df[["id", *diff.columns]]
+            if skip is None:
+                return df
+            bucket = id_hashes(df["id"]) % np.uint64(CHECKSUM_BUCKETS)
+            same = skip[bucket.astype(int)]
+            if count:
+                diff.skipped += int(np.count_nonzero(same))
+            return df[~same]
+
+        for old, new in zip_longest(old_chunks, new_chunks):
+            if diff is None:
+                old_columns = list((old if old is not None else new).columns)
+                new_columns = list((new if new is not None else old).columns)
+                columns = [c for c in old_columns if c in new_columns and c != "id"]
+                diff = RunDiff(columns, tolerance, relative_tolerance, changes_path)
+                diff.column_changes = (
+                    [c for c in old_columns if c not in new_columns],
+                    [c for c in new_columns if c not in old_columns],
+                )
+            # The hash of every id is spilled as well, so copies of an id in
+            # different chunks meet when the partitions are checked
+            for df, side, path in ((old, "old", old_path), (new, "new", new_path)):
+                if df is not None and not pd.Index(spill_ids(df, side)).is_unique:
+                    check_unique_ids(df["id"], path)
+            # Skipped trades are in both runs, so are counted once
+            old, new = match(unchanged(old, False), unchanged(new, True))
+            spill(old, "old")
+            spill(new, "new")
+
+        if diff is None:
+            diff = RunDiff([], tolerance, relative_tolerance, changes_path)
+        for p in range(SPILL_PARTITIONS):
+            check_ids("old", old_path, p)
+            check_ids("new", new_path, p)
+        for p in range(SPILL_PARTITIONS):
+            old, new = match(unspill("old", p), unspill("new", p))
+            diff.unmatched(old["id"], added=False)
+            diff.unmatched(new["id"], added=True)
+
+    diff.compared += diff.skipped
+    diff.summary_delta = summary_delta(old_summary, new_summary)
+    return diff
@@ -1,2 +1,15 @@
-from .reader import FileReader
-from .writer import FileWriter
+from importlib import import_module
+
+# Public names and the submodule defining them. They are imported on first
+# access so that e.g. src.io.formats can be used without loading pandas
+_EXPORTS = {
+    "FileReader": "reader",
+    "FileWriter": "writer",
+    "StreamingFileWriter": "writer",
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(f".{_EXPORTS[name]}", __name__), name)
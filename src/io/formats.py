@@ -0,0 +1,74 @@
+from pathlib import Path
+
+# Map file extensions to the supported input/output formats
+FORMATS = {
+    ".xlsx": "excel",
+    ".xls": "excel",
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "arrow",
+    ".feather": "arrow",
+    ".ipc": "arrow",
+}
+
+# Sheets of an Excel output holding the results and the portfolio summary
+RESULTS_SHEET = "Individual Greeks"
+SUMMARY_SHEET = "Portfolio Summary"
+
+
+def get_format(path: str):
+    """
+    Work out the file format from the file extension
+    :param path: Path of the input or output file
+
+    :return: One of "excel", "csv", "parquet" or "arrow"
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix not in FORMATS:
+        raise ValueError(
+            f"Unsupported file extension '{suffix}' for {path}, "
+            f"expected one of {', '.join(FORMATS)}"
+        )
+    return FORMATS[suffix]
+
+
+def companion_path(output_path: str, name: str):
+    """
+    Path of a companion file for single-table formats such as CSV, Parquet and
+    Arrow, which cannot hold more than one sheet
+    :param output_path: Path of the results file
+    :param name: Sheet name, e.g. "Portfolio Summary"
+
+    :return: Path with the snake cased sheet name appended to the file name
+    """
+    path = Path(output_path)
+    suffix = name.lower().replace(" ", "_")
+    return str(path.with_name(f"{path.stem}_{suffix}{path.suffix}"))
+
+
+def summary_path(output_path: str):
+    """
+    Path of the companion summary file for single-table formats
+    :param output_path: Path of the results file
+
+    :return: Path with "_summary" appended to the file name
+    """
+    return companion_path(output_path, "summary")
+
+
+def import_pyarrow():
+    """
+    Import pyarrow, which is only needed for the Parquet and Arrow formats
+    :return: The pyarrow module
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError(
+            "pyarrow is required for Parquet and Arrow files, install it with "
+            "'pip install pyarrow'"
+        ) from e
+    return pyarrow
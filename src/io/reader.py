@@ -1,55 +1,507 @@
+import numpy as np
 import pandas as pd
-from src.models import FXOption
+from src.models import MarketData, OptionType, PortfolioSummary, TradeTable
+from src.models.market import MARKET_FIELDS
+from src.models.table import intern_labels
+from src.io.formats import (
+    RESULTS_SHEET,
+    SUMMARY_SHEET,
+    get_format,
+    import_pyarrow,
+    summary_path,
+)
+from src.io.validation import ValidationReport, check_frame
+from src.pricing.black_scholes import BlackScholesFX
+from src.pricing.implied_vol import solve_implied_vol
+from src.pricing.vol_surface import VolSurface
 import logging
-from pydantic import ValidationError
 
 logger = logging.getLogger(__name__)
 
+# Map input column names to model attributes
+COLUMN_MAPPING = {
+    "TradeID": "id",
+    "Underlying": "underlying",
+    "Notional": "notional",
+    "NotionalCurrency": "notional_currency",
+    "Spot": "spot_price",
+    "Strike": "strike",
+    "Vol": "volatility",
+    "RateDomestic": "domestic_rate",
+    "RateForeign": "foreign_rate",
+    "Expiry": "time_to_maturity",
+    "OptionType": "option_type",
+    "Premium": "premium",
+}
+
+# Map the delta quote columns of a vol surface file to VolSurface.from_quotes
+QUOTE_COLUMN_MAPPING = {"ATM": "atm", "RR25": "risk_reversal", "BF25": "butterfly"}
+
 
 class FileReader:
     @staticmethod
-    def load_data(input_path: str):
+    def read_frame(input_path: str):
         """
-        Load in the .xlsx file and return a list of FXOption objects
-        :param input_path: Path of the input .xlsx file
+        Read the input file into a DataFrame, choosing the reader from the file
+        extension. Arrow files are memory-mapped so numeric columns without
+        nulls are handed to pandas without a copy.
+        :param input_path: Path of the .xlsx, .csv, .parquet or .arrow/.feather file
 
-        :return: List of FXOption objects
+        :return: DataFrame with the original input column names
         """
+        file_format = get_format(input_path)
+        if file_format == "csv":
+            return pd.read_csv(input_path)
+        if file_format == "parquet":
+            pa = import_pyarrow()
+            return pa.parquet.read_table(input_path).to_pandas()
+        if file_format == "arrow":
+            pa = import_pyarrow()
+            with pa.memory_map(input_path) as source:
+                table = pa.ipc.open_file(source).read_all()
+            # split_blocks stops pandas consolidating (and copying) the columns
+            return table.to_pandas(split_blocks=True)
+        return pd.read_excel(input_path)
 
-        # Read in file and map column names to model attributes
+    @staticmethod
+    def load_market(input_path: str):
+        """
+        Load a market data snapshot with one row per currency pair
+        :param input_path: Path of the .xlsx, .csv, .parquet or .arrow file with
+            Underlying, Spot, RateDomestic and RateForeign columns and an
+            optional Vol column
 
-        df = pd.read_excel(input_path)
+        :return: MarketData of the snapshot
+        """
+        df = FileReader.read_frame(input_path).rename(columns=COLUMN_MAPPING)
+        missing = [
+            name
+            for name in ("underlying",) + MARKET_FIELDS[:3]
+            if name not in df.columns
+        ]
+        if missing:
+            raise ValueError(
+                f"Market data {input_path} is missing {', '.join(missing)}"
+            )
 
-        column_mapping = {
-            "TradeID": "id",
-            "Underlying": "underlying",
-            "Notional": "notional",
-            "NotionalCurrency": "notional_currency",
-            "Spot": "spot_price",
-            "Strike": "strike",
-            "Vol": "volatility",
-            "RateDomestic": "domestic_rate",
-            "RateForeign": "foreign_rate",
-            "Expiry": "time_to_maturity",
-            "OptionType": "option_type",
+        values = {
+            name: (
+                pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float)
+                if name in df.columns
+                else np.full(len(df), np.nan)
+            )
+            for name in MARKET_FIELDS
         }
+        invalid = ~(values["spot_price"] > 0)
+        invalid |= ~np.isfinite(values["domestic_rate"] + values["foreign_rate"])
+        invalid |= values["volatility"] <= 0
+        invalid |= ~df["underlying"].map(lambda v: isinstance(v, str)).to_numpy(bool)
+        if invalid.any():
+            rows = ", ".join(str(r) for r in df["underlying"][invalid])
+            raise ValueError(f"Invalid market data in {input_path} for {rows}")
+
+        market = MarketData(
+            underlying=intern_labels(df["underlying"].to_numpy(dtype=object)),
+            **values,
+        )
+        logger.info(f"Loaded market data for {len(market)} currency pairs")
+        return market
+
+    @staticmethod
+    def load_vol_surface(input_path: str, market: MarketData | None = None):
+        """
+        Load vol surfaces, either as a strike grid with Underlying, Expiry,
+        Strike and Vol columns or as delta quotes with Underlying, Expiry, ATM,
+        RR25 and BF25 columns, one row per pillar or expiry
+        :param input_path: Path of the .xlsx, .csv, .parquet or .arrow file
+        :param market: MarketData of the pairs, needed to place delta quotes
 
-        # Convert rows to dictionaries and FXOption instances
-        df = df.rename(columns=column_mapping)
-        valid_trades = []
-
-        # Iterate through each row and validate individually
-        for record in df.to_dict("records"):
-            try:
-                # Instantiate the Pydantic model
-                valid_trades.append(FXOption(**record))
-
-            except ValidationError as e:
-                # If validation fails, extract the exact error message and skip the trade
-                error_msg = e.errors()
-                logger.warning(
-                    f"Skipping invalid trade {record.get('id')}: {error_msg}"
+        :return: VolSurface of every pair in the file
+        """
+        df = FileReader.read_frame(input_path).rename(
+            columns={**COLUMN_MAPPING, **QUOTE_COLUMN_MAPPING}
+        )
+        quoted = set(QUOTE_COLUMN_MAPPING.values()) <= set(df.columns)
+        if quoted:
+            if market is None:
+                raise ValueError(
+                    f"Delta quoted surface {input_path} needs market data for the "
+                    "spot and rates of each pair"
                 )
-        if not valid_trades:
+            columns = ["underlying", "time_to_maturity", *QUOTE_COLUMN_MAPPING.values()]
+        else:
+            columns = ["underlying", "time_to_maturity", "strike", "volatility"]
+        missing = [name for name in columns if name not in df.columns]
+        if missing:
+            raise ValueError(
+                f"Vol surface {input_path} is missing {', '.join(missing)}"
+            )
+
+        values = [df[columns[0]].to_numpy(dtype=object)] + [
+            pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float)
+            for name in columns[1:]
+        ]
+        if quoted:
+            return VolSurface.from_quotes(*values, market=market)
+        return VolSurface(*values)
+
+    @staticmethod
+    def prepare_frame(
+        df: pd.DataFrame,
+        market: MarketData | None = None,
+        surface: VolSurface | None = None,
+    ):
+        """
+        Map input column names to model attributes, fill the market columns
+        from the snapshot and the vols from the surface, then solve the
+        volatility of quoted premiums
+        :param df: DataFrame with the original input column names
+        :param market: Optional MarketData joined on the underlying
+        :param surface: Optional VolSurface interpolated at each trade
+
+        :return: DataFrame ready for validation
+        """
+        df = df.rename(columns=COLUMN_MAPPING)
+        if market is not None:
+            df = market.join(df)
+        if surface is not None:
+            df = surface.join(df)
+        return FileReader.solve_premiums(df)
+
+    @staticmethod
+    def load_data(
+        input_path: str,
+        stats: dict | None = None,
+        market: MarketData | None = None,
+        surface: VolSurface | None = None,
+        report: ValidationReport | None = None,
+    ):
+        """
+        Load in the input file and return a list of FXOption objects. Rows are
+        validated in bulk like load_table, so only valid rows become models.
+        :param input_path: Path of the input .xlsx, .csv, .parquet or .arrow file
+        :param stats: Optional dictionary the rows read and rejected are counted in
+        :param market: Optional MarketData supplying spot, rates and vols by pair
+        :param surface: Optional VolSurface supplying the vol of each trade
+        :param report: Optional ValidationReport collecting the rejected rows
+
+        :return: List of FXOption objects
+        """
+        return FileReader.load_table(
+            input_path, stats=stats, market=market, surface=surface, report=report
+        ).to_options()
+
+    @staticmethod
+    def load_table(
+        input_path: str,
+        stats: dict | None = None,
+        market: MarketData | None = None,
+        surface: VolSurface | None = None,
+        report: ValidationReport | None = None,
+    ):
+        """
+        Load in the input file and return a columnar TradeTable, validating the
+        FXOption field constraints as vectorised masks instead of per-row models
+        :param input_path: Path of the input .xlsx, .csv, .parquet or .arrow file
+        :param stats: Optional dictionary the rows read and rejected are counted in
+        :param market: Optional MarketData supplying spot, rates and vols by pair
+        :param surface: Optional VolSurface supplying the vol of each trade
+        :param report: Optional ValidationReport collecting the rejected rows
+
+        :return: TradeTable of the valid trades
+        """
+        report = ValidationReport() if report is None else report
+        df = FileReader.read_frame(input_path)
+        df = FileReader.prepare_frame(df, market, surface)
+        table = FileReader.validate_frame(df, stats=stats, report=report)
+        report.log()
+        return table
+
+    @staticmethod
+    def iter_tables(
+        input_path: str,
+        chunk_size: int,
+        stats: dict | None = None,
+        market: MarketData | None = None,
+        surface: VolSurface | None = None,
+        report: ValidationReport | None = None,
+    ):
+        """
+        Stream the input file in chunks of rows, validating each chunk as it is
+        read so that only one chunk of trades is held in memory at a time
+        :param input_path: Path of the input .xlsx, .csv, .parquet or .arrow file
+        :param chunk_size: Maximum number of rows per chunk
+        :param stats: Optional dictionary the rows read and rejected are counted in
+        :param market: Optional MarketData supplying spot, rates and vols by pair
+        :param surface: Optional VolSurface supplying the vol of each trade
+        :param report: Optional ValidationReport collecting the rejected rows,
+            logged once the whole file has been read
+
+        :return: Generator of TradeTable objects, one per chunk
+        """
+        file_format = get_format(input_path)
+        if file_format == "csv":
+            frames = pd.read_csv(input_path, chunksize=chunk_size)
+        elif file_format == "parquet":
+            frames = FileReader._iter_parquet_frames(input_path, chunk_size)
+        elif file_format == "arrow":
+            frames = FileReader._iter_arrow_frames(input_path, chunk_size)
+        else:
+            frames = FileReader._iter_excel_frames(input_path, chunk_size)
+
+        report = ValidationReport() if report is None else report
+        for df in frames:
+            df = FileReader.prepare_frame(df, market, surface)
+            yield FileReader.validate_frame(
+                df, warn_if_empty=False, stats=stats, report=report
+            )
+        report.log()
+
+    @staticmethod
+    def iter_results(output_path: str, chunk_size: int):
+        """
+        Stream the results of a previous run in chunks of rows, following the
+        Individual Greeks sheets of an Excel output across sheet boundaries
+        :param output_path: Path of the .xlsx, .csv, .parquet or .arrow results
+        :param chunk_size: Maximum number of rows per chunk
+
+        :return: Generator of DataFrames with the result columns, ids as text
+        """
+        file_format = get_format(output_path)
+        if file_format == "csv":
+            frames = pd.read_csv(output_path, chunksize=chunk_size, dtype={"id": str})
+        elif file_format == "parquet":
+            frames = FileReader._iter_parquet_frames(output_path, chunk_size)
+        elif file_format == "arrow":
+            frames = FileReader._iter_arrow_frames(output_path, chunk_size)
+        else:
+            frames = FileReader._iter_excel_frames(
+                output_path, chunk_size, sheets=RESULTS_SHEET
+            )
+        for df in frames:
+            if "id" in df.columns:
+                df["id"] = df["id"].astype(str)
+            yield df
+
+    @staticmethod
+    def read_summary(output_path: str):
+        """
+        Read the portfolio summary of a previous run
+        :param output_path: Path of the .xlsx, .csv, .parquet or .arrow results
+
+        :return: PortfolioSummary of the run
+        """
+        if get_format(output_path) == "excel":
+            df = pd.read_excel(output_path, sheet_name=SUMMARY_SHEET)
+        else:
+            df = FileReader.read_frame(summary_path(output_path))
+        values = {k: v for k, v in df.iloc[0].to_dict().items() if pd.notna(v)}
+        return PortfolioSummary(**values)
+
+    @staticmethod
+    def _iter_excel_frames(input_path: str, chunk_size: int, sheets: str | None = None):
+        """
+        Read a .xlsx file row by row with a read-only workbook
+        :param input_path: Path of the input .xlsx file
+        :param chunk_size: Maximum number of rows per chunk
+        :param sheets: Read every sheet whose name starts with this prefix, one
+            after the other, instead of only the first sheet
+
+        :return: Generator of DataFrames with the original column names
+        """
+        # openpyxl is only loaded for Excel input
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(input_path, read_only=True, data_only=True)
+        try:
+            if sheets is None:
+                # pd.read_excel reads the first sheet, so the stream does too
+                worksheets = workbook.worksheets[:1]
+            else:
+                worksheets = [
+                    s for s in workbook.worksheets if s.title.startswith(sheets)
+                ]
+
+            for worksheet in worksheets:
+                rows = worksheet.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    continue
+
+                chunk = []
+                for row in rows:
+                    # Skip the blank rows openpyxl reports past the end of the data
+                    if all(v is None for v in row):
+                        continue
+                    chunk.append(row)
+                    if len(chunk) == chunk_size:
+                        yield pd.DataFrame(chunk, columns=list(header))
+                        chunk = []
+                if chunk:
+                    yield pd.DataFrame(chunk, columns=list(header))
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _iter_parquet_frames(input_path: str, chunk_size: int):
+        """
+        Read a Parquet file one record batch at a time
+        :param input_path: Path of the input .parquet file
+        :param chunk_size: Maximum number of rows per chunk
+
+        :return: Generator of DataFrames with the original column names
+        """
+        pa = import_pyarrow()
+        parquet_file = pa.parquet.ParquetFile(input_path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+    @staticmethod
+    def _iter_arrow_frames(input_path: str, chunk_size: int):
+        """
+        Memory-map an Arrow IPC/Feather file and slice it into chunks, so only
+        the pages backing the current chunk are touched
+        :param input_path: Path of the input .arrow/.feather file
+        :param chunk_size: Maximum number of rows per chunk
+
+        :return: Generator of DataFrames with the original column names
+        """
+        pa = import_pyarrow()
+        with pa.memory_map(input_path) as source:
+            table = pa.ipc.open_file(source).read_all()
+            for batch in table.to_batches(max_chunksize=chunk_size):
+                yield batch.to_pandas(split_blocks=True)
+
+    @staticmethod
+    def count_rows(stats: dict | None, rows: int, rejected: int):
+        """
+        Add the rows read and rejected by validation to a stats dictionary
+        :param stats: Dictionary to update, nothing is counted when None
+        :param rows: Number of input rows read
+        :param rejected: Number of rows that failed validation
+        """
+        if stats is None:
+            return
+        stats["rows_read"] = stats.get("rows_read", 0) + rows
+        stats["rows_rejected"] = stats.get("rows_rejected", 0) + rejected
+
+    @staticmethod
+    def solve_premiums(df: pd.DataFrame):
+        """
+        Fill in the volatility of every row that has a Premium by solving for
+        its implied volatility, all rows at once. Rows whose other market fields
+        are not usable are left without a volatility so validation rejects them.
+        :param df: DataFrame already renamed to model attributes
+
+        :return: DataFrame with the implied volatilities in the volatility column
+        """
+        if "premium" not in df.columns:
+            return df
+        premium = pd.to_numeric(df["premium"], errors="coerce").to_numpy(dtype=float)
+        has_premium = np.isfinite(premium)
+        required = [
+            "spot_price",
+            "strike",
+            "domestic_rate",
+            "foreign_rate",
+            "time_to_maturity",
+            "notional",
+            "option_type",
+            "underlying",
+            "notional_currency",
+        ]
+        if not has_premium.any() or any(name not in df.columns for name in required):
+            return df
+
+        numeric = {
+            name: pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=float)
+            for name in required[:6]
+        }
+        # Only solve rows whose other fields would pass validation
+        usable = (
+            has_premium
+            & df["option_type"].isin([o.value for o in OptionType]).to_numpy()
+        )
+        for name in ("underlying", "notional_currency"):
+            usable &= df[name].map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+        for name, values in numeric.items():
+            usable &= np.isfinite(values)
+        for name in ("spot_price", "strike", "notional"):
+            usable &= numeric[name] > 0
+        usable &= numeric["time_to_maturity"] >= 0
+
+        rows = np.flatnonzero(usable)
+        solved = np.full(len(df), np.nan)
+        if rows.size:
+            multiplier = BlackScholesFX.get_notional_batch(
+                df["underlying"].to_numpy(dtype=object)[rows],
+                df["notional_currency"].to_numpy(dtype=object)[rows],
+                numeric["notional"][rows],
+                numeric["spot_price"][rows],
+            )
+            solved[rows] = solve_implied_vol(
+                premium[rows],
+                numeric["spot_price"][rows],
+                numeric["strike"][rows],
+                numeric["domestic_rate"][rows],
+                numeric["foreign_rate"][rows],
+                numeric["time_to_maturity"][rows],
+                (
+                    df["option_type"].to_numpy(dtype=object)[rows]
+                    == OptionType.CALL.value
+                ),
+                multiplier,
+            )
+        logger.info(
+            f"Solved implied volatility for {np.count_nonzero(np.isfinite(solved))} "
+            f"of {np.count_nonzero(has_premium)} trades with a premium"
+        )
+
+        df = df.copy()
+        volatility = df["volatility"] if "volatility" in df.columns else None
+        if volatility is None or not pd.api.types.is_float_dtype(volatility.dtype):
+            volatility = pd.Series(volatility, index=df.index, dtype=object)
+        df["volatility"] = volatility.where(~has_premium, solved)
+        return df
+
+    @staticmethod
+    def validate_frame(
+        df: pd.DataFrame,
+        warn_if_empty: bool = True,
+        stats: dict | None = None,
+        report: ValidationReport | None = None,
+    ):
+        """
+        Validate a DataFrame already renamed to model attributes against the
+        FXOption rules in bulk, see check_frame, and build a TradeTable from
+        the valid rows
+        :param df: DataFrame with one column per FXOption field
+        :param warn_if_empty: Log a warning when every row fails validation
+        :param stats: Optional dictionary the rows read and rejected are counted in
+        :param report: Optional ValidationReport the rejected rows are added to
+
+        :return: TradeTable of the valid trades
+        """
+        report = ValidationReport() if report is None else report
+        columns, checks = check_frame(df)
+        invalid = report.add(df, checks)
+        n = len(df)
+
+        valid = ~invalid
+        if warn_if_empty and not valid.any():
             logger.warning("No valid trades found all  records failed validation.")
-        return valid_trades
+        FileReader.count_rows(stats, n, int(np.count_nonzero(invalid)))
+
+        return TradeTable(
+            id=columns["id"][valid],
+            is_call=columns["option_type"][valid] == OptionType.CALL.value,
+            strike=columns["strike"][valid],
+            volatility=columns["volatility"][valid],
+            time_to_maturity=columns["time_to_maturity"][valid],
+            spot_price=columns["spot_price"][valid],
+            domestic_rate=columns["domestic_rate"][valid],
+            foreign_rate=columns["foreign_rate"][valid],
+            underlying=intern_labels(columns["underlying"][valid]),
+            notional=columns["notional"][valid],
+            notional_currency=intern_labels(columns["notional_currency"][valid]),
+        )
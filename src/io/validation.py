@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+from src.models import FXOption, OptionType
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Currency pairs are two non-empty currency codes either side of a slash
+PAIR_PATTERN = r"^([^/]+)/([^/]+)$"
+
+# Number of rejected trade ids quoted in the log for each rule
+EXAMPLE_IDS = 5
+
+# Sheet, or companion file suffix, the rejected rows are written to
+REJECTS_SHEET = "Rejects"
+
+
+def check_frame(df: pd.DataFrame):
+    """
+    Check every row of a frame, renamed to model attributes, against the
+    FXOption rules at once: the Field types and constraints, the option type,
+    the BASE/QUOTE form of the currency pair and a notional currency from one
+    of its legs. Each rule is one vectorised mask, so no exception is raised
+    or message built per row.
+    :param df: DataFrame with one column per FXOption field
+
+    :return: Tuple of the parsed column arrays keyed by field name and a
+        dictionary of reason code, e.g. "strike.greater_than", to the rule's
+        message and mask of failing rows
+    """
+    n = len(df)
+    columns = {}
+    checks = {}
+
+    for name, field in FXOption.model_fields.items():
+        if name not in df.columns:
+            checks[f"{name}.missing"] = ("Field required", np.ones(n, bool))
+            columns[name] = np.full(n, np.nan if field.annotation is float else None)
+            continue
+
+        raw = df[name]
+        missing = raw.isna().to_numpy()
+
+        if field.annotation is float:
+            values = pd.to_numeric(raw, errors="coerce").to_numpy(dtype=float)
+            # Cells that were present but could not be parsed as a number
+            unparsable = np.isnan(values) & ~missing
+            checks[f"{name}.float_parsing"] = (
+                "Input should be a valid number, unable to parse string as a number",
+                unparsable,
+            )
+            # Apply the gt/ge constraints declared on the Field, NaN fails them
+            for constraint in field.metadata:
+                if hasattr(constraint, "gt"):
+                    checks[f"{name}.greater_than"] = (
+                        f"Input should be greater than {constraint.gt}",
+                        ~(values > constraint.gt) & ~unparsable,
+                    )
+                elif hasattr(constraint, "ge"):
+                    checks[f"{name}.greater_than_equal"] = (
+                        f"Input should be greater than or equal to {constraint.ge}",
+                        ~(values >= constraint.ge) & ~unparsable,
+                    )
+            columns[name] = values
+
+        elif field.annotation is OptionType:
+            allowed = [o.value for o in OptionType]
+            expected = " or ".join(f"'{a}'" for a in allowed)
+            checks[f"{name}.enum"] = (
+                f"Input should be {expected}",
+                ~raw.isin(allowed).to_numpy(),
+            )
+            columns[name] = raw.to_numpy(dtype=object)
+
+        else:
+            if isinstance(raw.dtype, pd.StringDtype):
+                # A string column can only fail by having empty cells
+                failed = missing
+            else:
+                failed = ~raw.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+            checks[f"{name}.string_type"] = ("Input should be a valid string", failed)
+            columns[name] = raw.to_numpy(dtype=object)
+
+    # Pairs and currencies that are not strings have failed already
+    pair_text = ~checks.get("underlying.string_type", (None, np.ones(n, bool)))[1]
+    legs = (
+        pd.Series(np.where(pair_text, columns["underlying"], ""), dtype=object)
+        .str.extract(PAIR_PATTERN)
+        .to_numpy(dtype=object)
+    )
+    well_formed = pair_text & pd.notna(legs[:, 0])
+    checks["underlying.currency_pair"] = (
+        "Input should be a currency pair such as 'EUR/USD'",
+        pair_text & ~well_formed,
+    )
+    currency = columns["notional_currency"]
+    currency_text = ~checks.get(
+        "notional_currency.string_type", (None, np.ones(n, bool))
+    )[1]
+    checks["notional_currency.not_in_pair"] = (
+        "Notional currency should be the base or quote currency of the pair",
+        well_formed
+        & currency_text
+        & (currency != legs[:, 0])
+        & (currency != legs[:, 1]),
+    )
+    return columns, checks
+
+
+class ValidationReport:
+    """
+    Rows rejected by validation, kept with the reason codes of every rule they
+    broke. Reports accumulate over the chunks of a streamed file; the rejects
+    become a table for the output and the log gets one line per rule instead
+    of one per rejected row.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.counts = {}
+        self.messages = {}
+        self.examples = {}
+        self.rejects = []
+
+    def __len__(self):
+        return sum(len(frame) for frame in self.rejects)
+
+    def add(self, df: pd.DataFrame, checks: dict):
+        """
+        Record the rows of a frame that failed any rule
+        :param df: DataFrame the checks were run on
+        :param checks: Reason codes to message and failing mask, from check_frame
+        :return: Boolean mask of the rejected rows
+        """
+        invalid = np.zeros(len(df), dtype=bool)
+        for failed in (mask for _, mask in checks.values()):
+            invalid |= failed
+        rows = np.flatnonzero(invalid)
+
+        if rows.size:
+            ids = (
+                df["id"].to_numpy(dtype=object)
+                if "id" in df.columns
+                else np.full(len(df), None)
+            )
+            reasons = np.full(rows.size, "", dtype=object)
+            for code, (message, failed) in checks.items():
+                hit = failed[rows]
+                count = int(np.count_nonzero(hit))
+                if not count:
+                    continue
+                self.counts[code] = self.counts.get(code, 0) + count
+                self.messages[code] = message
+                examples = self.examples.setdefault(code, [])
+                if len(examples) < EXAMPLE_IDS:
+                    examples.extend(ids[rows[hit][: EXAMPLE_IDS - len(examples)]])
+                reasons[hit] += code + ";"
+
+            rejects = df.iloc[rows].copy()
+            for name in rejects.columns:
+                # Rejected cells may mix types, written as text to any format
+                if rejects[name].dtype == object:
+                    rejects[name] = rejects[name].map(
+                        lambda v: v if v is None or isinstance(v, str) else str(v)
+                    )
+            rejects.insert(0, "row", rows + self.rows)
+            rejects.insert(1, "reasons", [r.rstrip(";") for r in reasons])
+            self.rejects.append(rejects)
+
+        self.rows += len(df)
+        return invalid
+
+    def table(self):
+        """
+        Rejected rows for the rejects sheet or file
+        :return: DataFrame with the input row number, the ";" separated reason
+            codes and the row's input columns, or None when nothing was rejected
+        """
+        if not self.rejects:
+            return None
+        return pd.concat(self.rejects, ignore_index=True)
+
+    def log(self):
+        """
+        Log the number of rows rejected by each rule, with a few of their ids
+        """
+        if not self.counts:
+            return
+        logger.warning(f"Rejected {len(self)} of {self.rows} rows")
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        for code, count in ranked:
+            examples = ", ".join(str(i) for i in self.examples[code])
+            logger.warning(
+                f"  {code}: {count} rows, {self.messages[code]} (e.g. {examples})"
+            )
@@ -1,24 +1,236 @@
 import pandas as pd
-from src.models import FXOptionResult, PortfolioSummary
+from src.io.formats import (
+    RESULTS_SHEET,
+    SUMMARY_SHEET,
+    companion_path,
+    get_format,
+    import_pyarrow,
+    summary_path,
+)
+from src.models import FXOptionResult, PortfolioSummary, ResultTable
+
+# Columns of the Individual Greeks table when no extra greeks are requested
+RESULT_COLUMNS = ["id", "pv", "delta", "vega"]
+
+# Rows in an Excel sheet, including the header row
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def sheet_name(name: str, number: int):
+    """
+    Name of one sheet of a table split over several Excel sheets
+    :param name: Name of the table's first sheet
+    :param number: Sheet of the table, counting from 1
+    :return: The name for the first sheet, then "<name> 2", "<name> 3" etc.
+    """
+    return name if number == 1 else f"{name} {number}"
 
 
 class FileWriter:
     @staticmethod
     def write_data(
-        results: list[FXOptionResult], summary: PortfolioSummary, output_path: str
+        results: list[FXOptionResult] | ResultTable,
+        summary: PortfolioSummary,
+        output_path: str,
+        tables: dict[str, pd.DataFrame] | None = None,
     ):
         """
-        Export calculated greeks and totals to a multi-sheet Excel file
+        Export calculated greeks and totals, choosing the format from the file
+        extension. Excel output has two sheets, the single-table formats write
+        the summary to a companion "<name>_summary" file next to the results.
+        Excel is written straight from the result arrays through a write-only
+        workbook, splitting the results over several sheets if they do not
+        fit in one.
 
-        :param results: List of result for each trade
+        :param results: List of result for each trade, or a columnar ResultTable
         :param summary: Total values for the portfolio i.e total pv,total vega etc
-        :param output_path: File path for generated .xlsx file
+        :param output_path: File path for generated .xlsx, .csv, .parquet or .arrow file
+        :param tables: Optional extra tables keyed by sheet name, written as
+            additional sheets or as "<name>_<sheet>" companion files
+
+        """
+
+        results = FileWriter.results_table(results)
+
+        if get_format(output_path) == "excel":
+            writer = StreamingFileWriter(output_path, columns=list(results.columns()))
+            writer.append(results)
+            writer.close(summary, tables=tables)
+        else:
+            summary_df = pd.DataFrame([summary.model_dump(exclude_none=True)])
+            FileWriter.write_frame(pd.DataFrame(results.columns()), output_path)
+            FileWriter.write_frame(summary_df, summary_path(output_path))
+            for name, df in (tables or {}).items():
+                FileWriter.write_frame(df, companion_path(output_path, name))
+
+    @staticmethod
+    def results_table(results: list[FXOptionResult] | ResultTable):
+        """
+        Columnar view of the results, so no dictionary is built per trade
+        :param results: List of result for each trade, or a columnar ResultTable
 
+        :return: ResultTable with one row per trade
         """
+        if isinstance(results, ResultTable):
+            return results
+        return ResultTable.from_results(results)
+
+    @staticmethod
+    def results_frame(results: list[FXOptionResult] | ResultTable):
+        """
+        Build the Individual Greeks table as a DataFrame
+        :param results: List of result for each trade, or a columnar ResultTable
+
+        :return: DataFrame with one row per trade
+        """
+        return pd.DataFrame(FileWriter.results_table(results).columns())
+
+    @staticmethod
+    def write_frame(df: pd.DataFrame, output_path: str):
+        """
+        Write a single table to a CSV, Parquet or Arrow IPC/Feather file
+        :param df: Table to write
+        :param output_path: File path for the generated file
+        """
+        file_format = get_format(output_path)
+        if file_format == "csv":
+            df.to_csv(output_path, index=False)
+        elif file_format == "parquet":
+            pa = import_pyarrow()
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            pa.parquet.write_table(table, output_path)
+        elif file_format == "arrow":
+            pa = import_pyarrow()
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            with pa.ipc.new_file(output_path, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            df.to_excel(output_path, index=False)
+
 
-        results_df = pd.DataFrame([r.model_dump() for r in results])
-        summary_df = pd.DataFrame([summary.model_dump()])
+class StreamingFileWriter:
+    """
+    Writes results chunk by chunk so rows are flushed to disk as they are
+    appended instead of held in memory. Excel output uses a write-only
+    workbook and starts a new "Individual Greeks <n>" sheet whenever one is
+    full, as it does for the extra tables. CSV appends to the open file and
+    Parquet/Arrow write one row group or record batch per chunk.
+    """
+
+    def __init__(self, output_path: str, columns: list[str] = RESULT_COLUMNS):
+        """
+        :param output_path: File path for generated .xlsx, .csv, .parquet or .arrow file
+        :param columns: Result columns written for every trade
+        """
+        self.output_path = output_path
+        self.columns = list(columns)
+        self.file_format = get_format(output_path)
+        self.writer = None
+
+        if self.file_format == "excel":
+            # openpyxl is only loaded for Excel output
+            from openpyxl import Workbook
+
+            self.workbook = Workbook(write_only=True)
+            self.results_sheets = 0
+            self.add_results_sheet()
+        elif self.file_format == "csv":
+            self.writer = open(output_path, "w", newline="")
+
+    def add_results_sheet(self):
+        """
+        Start a new Individual Greeks sheet with its header row
+        """
+        self.results_sheets += 1
+        self.results_sheet = self.workbook.create_sheet(
+            sheet_name(RESULTS_SHEET, self.results_sheets)
+        )
+        self.results_sheet.append(self.columns)
+        self.sheet_rows = 1
+
+    def add_table_sheets(self, name: str, df: pd.DataFrame):
+        """
+        Write an extra table, continuing on "<name> 2", "<name> 3" and so on
+        when it does not fit in one sheet like the results do
+        :param name: Name of the table's first sheet
+        :param df: Table to write, always given at least its header row
+        """
+        rows_per_sheet = EXCEL_MAX_ROWS - 1
+        for i, start in enumerate(range(0, max(len(df), 1), rows_per_sheet), 1):
+            sheet = self.workbook.create_sheet(sheet_name(name, i))
+            sheet.append(list(df.columns))
+            for row in df.iloc[start : start + rows_per_sheet].itertuples(index=False):
+                sheet.append(list(row))
+
+    def append(self, results: ResultTable):
+        """
+        Append one chunk of results to the output
+        :param results: Columnar results for the chunk
+        """
+        columns = results.columns()
+        if self.file_format == "excel":
+            start = 0
+            while start < len(results):
+                if self.sheet_rows == EXCEL_MAX_ROWS:
+                    self.add_results_sheet()
+                # Fill the current sheet, converting the arrays once per slice
+                stop = min(len(results), start + EXCEL_MAX_ROWS - self.sheet_rows)
+                rows = zip(*(columns[name][start:stop].tolist() for name in self.columns))
+                for row in rows:
+                    self.results_sheet.append(row)
+                self.sheet_rows += stop - start
+                start = stop
+            return
+
+        df = pd.DataFrame({name: columns[name] for name in self.columns})
+        if self.file_format == "csv":
+            # Only the first chunk carries the header row
+            df.to_csv(self.writer, index=False, header=self.writer.tell() == 0)
+        elif len(df):
+            pa = import_pyarrow()
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            # The writer is opened on the first chunk so the schema is known
+            if self.writer is None:
+                if self.file_format == "parquet":
+                    self.writer = pa.parquet.ParquetWriter(
+                        self.output_path, table.schema
+                    )
+                else:
+                    self.writer = pa.ipc.new_file(self.output_path, table.schema)
+            self.writer.write_table(table)
+
+    def close(
+        self,
+        summary: PortfolioSummary,
+        tables: dict[str, pd.DataFrame] | None = None,
+    ):
+        """
+        Write the portfolio summary and finish the output file
+        :param summary: Total values for the portfolio i.e total pv,total vega etc
+        :param tables: Optional extra tables keyed by sheet name, written as
+            additional sheets or as "<name>_<sheet>" companion files
+        """
+        if self.file_format == "excel":
+            summary_sheet = self.workbook.create_sheet(SUMMARY_SHEET)
+            values = summary.model_dump(exclude_none=True)
+            summary_sheet.append(list(values.keys()))
+            summary_sheet.append(list(values.values()))
+            for name, df in (tables or {}).items():
+                self.add_table_sheets(name, df)
+            self.workbook.save(self.output_path)
+            return
 
-        with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-            results_df.to_excel(writer, sheet_name="Individual Greeks", index=False)
-            summary_df.to_excel(writer, sheet_name="Portfolio Summary", index=False)
+        if self.file_format == "csv" and self.writer.tell() == 0:
+            # No results were appended, still write the header row
+            pd.DataFrame(columns=self.columns).to_csv(self.writer, index=False)
+        if self.writer is not None:
+            self.writer.close()
+        else:
+            # No results were appended, still leave an empty results file
+            FileWriter.write_frame(pd.DataFrame(columns=self.columns), self.output_path)
+        FileWriter.write_frame(
+            pd.DataFrame([summary.model_dump(exclude_none=True)]),
+            summary_path(self.output_path),
+        )
+        for name, df in (tables or {}).items():
+            FileWriter.write_frame(df, companion_path(self.output_path, name))
@@ -1,50 +1,471 @@
 import argparse
-from src.io.reader import FileReader
-from src.io.writer import FileWriter
-from src.pricing.black_scholes import BlackScholesFX
-from src.models.result import PortfolioSummary
+import sys
+from src.pricing.greeks import EXTRA_GREEKS
+from src.profiling import StageProfiler
 import logging
 
+# pandas, openpyxl, pydantic and the pricing modules are imported by the stage
+# that needs them, so --help and argument errors return without loading them
+
+
+def setup_logging(verbose: bool):
+    """
+    Configure the log format and level of the command line
+    :param verbose: Log at DEBUG level instead of INFO
+    """
+    logging.basicConfig(
+        level=logging.DEBUG if verbose else logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+
+def diff_main(argv: list[str]):
+    """
+    Compare the results of two runs, exiting with status 1 if they differ
+    :param argv: Arguments following "diff" on the command line
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m src.main diff",
+        description="Compare the results of two runs trade by trade, matched by id",
+    )
+    parser.add_argument("old", help="Results file of the old run")
+    parser.add_argument("new", help="Results file of the new run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=None,
+        help="Absolute difference of a result counted as unchanged, 1e-6 by default",
+    )
+    parser.add_argument(
+        "--relative-tolerance",
+        type=float,
+        default=0.0,
+        help="Difference counted as unchanged relative to the old result, added "
+        "to --tolerance",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="Rows of each output read at a time, 100,000 by default",
+    )
+    parser.add_argument(
+        "--changes",
+        metavar="PATH",
+        help="CSV file every changed trade is written to, with its old and new "
+        "results",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size is not None and args.chunk_size <= 0:
+        parser.error("--chunk-size must be a positive integer")
+    if args.changes is not None and not args.changes.lower().endswith(".csv"):
+        parser.error("--changes must be a .csv file")
+
+    setup_logging(args.verbose)
+    from src.diff import DEFAULT_TOLERANCE, DIFF_CHUNK_SIZE, diff_runs
+
+    try:
+        diff = diff_runs(
+            args.old,
+            args.new,
+            tolerance=DEFAULT_TOLERANCE if args.tolerance is None else args.tolerance,
+            relative_tolerance=args.relative_tolerance,
+            chunk_size=args.chunk_size or DIFF_CHUNK_SIZE,
+            changes_path=args.changes,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    diff.log()
+    if diff:
+        sys.exit(1)
+
 
 def main():
 
+    # Comparing two runs has its own arguments
+    if sys.argv[1:2] == ["diff"]:
+        return diff_main(sys.argv[2:])
+
     # Set up command line arguments
-    parser = argparse.ArgumentParser(description="FXOption Pricer")
+    parser = argparse.ArgumentParser(
+        description="FXOption Pricer",
+        epilog="Run 'python -m src.main diff old new' to compare the results of "
+        "two runs",
+    )
 
-    parser.add_argument("input", help="Path to the input .xlsx file")
-    parser.add_argument("output", help="Path to the output .xlsx file")
+    parser.add_argument(
+        "input", help="Path to the input .xlsx, .csv, .parquet or .arrow/.feather file"
+    )
+    parser.add_argument(
+        "output",
+        help="Path to the output .xlsx, .csv, .parquet or .arrow/.feather file",
+    )
     parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    parser.add_argument(
+        "--models",
+        action="store_true",
+        help="Build one Pydantic model per valid trade and price them one at a "
+        "time instead of as columns, ignored by the options that need the "
+        "columnar pipeline",
+    )
+    # Columns are the default, the old flag is still accepted
+    parser.add_argument("--columnar", action="store_true", help=argparse.SUPPRESS)
+
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="Stream the input in chunks of this many rows to bound memory use",
+    )
+    parser.add_argument(
+        "--overlap",
+        action="store_true",
+        help="Stream in chunks, reading the next chunk and writing the previous one "
+        "on background threads while the current one is priced",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of processes used to price the trades",
+    )
+    parser.add_argument(
+        "--greeks",
+        help="Comma separated extra greeks to calculate, or 'all', from "
+        f"{', '.join(EXTRA_GREEKS)}",
+    )
+    parser.add_argument(
+        "--precision",
+        choices=("exact", "fast", "float32"),
+        default="exact",
+        help="Numeric mode of the pricing kernels: exact, a rational approximation "
+        "of the normal CDF accurate to 1e-6 of notional, or float32 kernels "
+        "accurate to 5e-5 of notional",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record per-stage wall and CPU time, trades/sec, peak memory and "
+        "rejected rows, written to <output>_metrics.json",
+    )
+    parser.add_argument(
+        "--profile-pricing",
+        metavar="PATH",
+        help="Dump cProfile stats of the pricing stage to this .prof file, "
+        "implies --profile",
+    )
+    parser.add_argument(
+        "--cache",
+        help="Path of a result cache file, only trades that changed since a "
+        "previous run are repriced",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        help="Maximum number of results kept in the cache before the least "
+        "recently used are evicted, 1,000,000 by default",
+    )
+    parser.add_argument(
+        "--group-by",
+        help="Comma separated groupings to total the portfolio by, or 'all', from "
+        "underlying, notional_currency, option_type, expiry",
+    )
+    parser.add_argument(
+        "--expiry-buckets",
+        help="Comma separated upper edges in years of the expiry buckets used by "
+        "--group-by expiry, e.g. 0.25,0.5,1,2",
+    )
+    parser.add_argument(
+        "--market",
+        metavar="PATH",
+        help="Market data file with Underlying, Spot, RateDomestic, RateForeign and "
+        "optional Vol per currency pair, overriding the trades' own market columns",
+    )
+    parser.add_argument(
+        "--vol-surface",
+        metavar="PATH",
+        help="Vol surface file per currency pair, either Underlying, Expiry, Strike "
+        "and Vol pillars or Underlying, Expiry, ATM, RR25 and BF25 quotes (which "
+        "need --market), overriding the trades' own vols",
+    )
+    parser.add_argument(
+        "--mc-validate",
+        action="store_true",
+        help="Also price every trade by Monte Carlo and compare it with the closed "
+        "form, written to an MC Validation sheet",
+    )
+    parser.add_argument(
+        "--mc-paths",
+        type=int,
+        default=None,
+        help="Monte Carlo paths per trade for --mc-validate, 100,000 by default",
+    )
+    parser.add_argument(
+        "--mc-seed", type=int, default=0, help="Seed of the Monte Carlo random streams"
+    )
+    parser.add_argument(
+        "--spot-shocks",
+        help="Relative spot shocks for the scenario grid as start:stop:step or a "
+        "comma separated list, e.g. -0.1:0.1:0.01",
+    )
+    parser.add_argument(
+        "--vol-shocks",
+        help="Absolute volatility shocks for the scenario grid, e.g. -0.05:0.05:0.01",
+    )
+    parser.add_argument(
+        "--domestic-rate-shocks",
+        help="Absolute domestic rate shocks for the scenario grid",
+    )
+    parser.add_argument(
+        "--foreign-rate-shocks",
+        help="Absolute foreign rate shocks for the scenario grid",
+    )
 
     # Parse arguments
     args = parser.parse_args()
 
-    # Setup default logging level
-    log_level = logging.DEBUG if args.verbose else logging.INFO
+    setup_logging(args.verbose)
+    logger = logging.getLogger(__name__)
 
-    # Apply logging configuration
-    logging.basicConfig(
-        level=log_level,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
+    profiler = StageProfiler(
+        enabled=args.profile or args.profile_pricing is not None,
+        profile_path=args.profile_pricing,
     )
-    logger = logging.getLogger(__name__)
 
-    logger.info("Loading data from .xlsx file")
-    data = FileReader.load_data(args.input)
+    columnar = not args.models or args.columnar
+    if args.workers is not None:
+        if args.workers <= 0:
+            parser.error("--workers must be a positive integer")
+        columnar = True
+    workers = args.workers or 1
 
-    logger.info("Calculating greeks and PVs for each trade")
-    results = [BlackScholesFX.calculate_greeks_and_pv(t) for t in data]
+    if args.precision != "exact":
+        columnar = True
+
+    greeks = ()
+    if args.greeks is not None:
+        if args.greeks == "all":
+            greeks = EXTRA_GREEKS
+        else:
+            greeks = tuple(g.strip() for g in args.greeks.split(",") if g.strip())
+            unknown = sorted(set(greeks) - set(EXTRA_GREEKS))
+            if unknown:
+                parser.error(f"Unknown greeks {', '.join(unknown)}")
+        columnar = True
+
+    cache = None
+    if args.cache is not None:
+        from src.pricing.cache import DEFAULT_MAX_ENTRIES, ResultCache, price_cached
+
+        if args.cache_size is None:
+            args.cache_size = DEFAULT_MAX_ENTRIES
+        if args.cache_size <= 0:
+            parser.error("--cache-size must be a positive integer")
+        if args.precision != "exact":
+            parser.error("--cache only holds exact results, drop --precision")
+        cache = ResultCache(args.cache, max_entries=args.cache_size)
+        columnar = True
+
+    grouped = None
+    if args.group_by is not None:
+        from src.pricing.aggregation import GROUPINGS, GroupedTotals, parse_expiry_edges
+
+        if args.group_by == "all":
+            groupings = GROUPINGS
+        else:
+            groupings = tuple(g.strip() for g in args.group_by.split(",") if g.strip())
+            unknown = sorted(set(groupings) - set(GROUPINGS))
+            if unknown:
+                parser.error(f"Unknown groupings {', '.join(unknown)}")
+        try:
+            edges = parse_expiry_edges(args.expiry_buckets)
+        except ValueError as e:
+            parser.error(f"Invalid expiry buckets: {e}")
+        grouped = GroupedTotals(groupings, expiry_edges=edges)
+        columnar = True
+
+    if args.overlap and args.chunk_size is None:
+        from src.pipeline import DEFAULT_CHUNK_SIZE
+
+        args.chunk_size = DEFAULT_CHUNK_SIZE
+
+    shock_specs = [
+        args.spot_shocks,
+        args.vol_shocks,
+        args.domestic_rate_shocks,
+        args.foreign_rate_shocks,
+    ]
+    run_grid = any(spec is not None for spec in shock_specs)
+    if run_grid:
+        from src.pricing.scenarios import build_grid, parse_shocks
+
+        if args.chunk_size is not None:
+            parser.error("Scenario shocks cannot be combined with --chunk-size")
+        try:
+            grid = build_grid(*(parse_shocks(spec) for spec in shock_specs))
+        except ValueError as e:
+            parser.error(f"Invalid scenario shocks: {e}")
+        columnar = True
+
+    if args.mc_validate:
+        from src.pricing.monte_carlo import (
+            DEFAULT_PATHS,
+            compare_analytic,
+            price_monte_carlo,
+        )
+
+        if args.chunk_size is not None:
+            parser.error("--mc-validate cannot be combined with --chunk-size")
+        if args.mc_paths is None:
+            args.mc_paths = DEFAULT_PATHS
+        if args.mc_paths <= 0:
+            parser.error("--mc-paths must be a positive integer")
+        columnar = True
 
-    logger.info("Calculating total parameters for portfolio summary")
-    summary = PortfolioSummary(
-        total_pv=sum(r.pv for r in results),
-        total_delta=sum(r.delta for r in results),
-        total_vega=sum(r.vega for r in results),
-        num_of_trades=len(results),
+    if args.chunk_size is not None and args.chunk_size <= 0:
+        parser.error("--chunk-size must be a positive integer")
+
+    market = None
+    if args.market is not None:
+        from src.io.reader import FileReader
+
+        logger.info(f"Loading market data from {args.market}")
+        try:
+            market = FileReader.load_market(args.market)
+        except ValueError as e:
+            parser.error(str(e))
+
+    surface = None
+    if args.vol_surface is not None:
+        from src.io.reader import FileReader
+
+        logger.info(f"Loading vol surface from {args.vol_surface}")
+        try:
+            surface = FileReader.load_vol_surface(args.vol_surface, market=market)
+        except ValueError as e:
+            parser.error(str(e))
+
+    from src.manifest import RunManifest
+
+    # Records the inputs and result checksums of the run next to its output
+    manifest = RunManifest(
+        {"trades": args.input, "market": args.market, "vol_surface": args.vol_surface},
+        options={"precision": args.precision, "greeks": list(greeks)},
     )
 
-    logger.info("Writing results to .xlsx file")
-    FileWriter.write_data(results, summary, args.output)
+    if args.chunk_size is not None:
+        from src.pipeline import run_streaming
+
+        logger.info(f"Streaming data in chunks of {args.chunk_size} rows")
+        summary = run_streaming(
+            args.input,
+            args.output,
+            args.chunk_size,
+            workers=workers,
+            greeks=greeks,
+            cache=cache,
+            profiler=profiler,
+            grouped=grouped,
+            market=market,
+            surface=surface,
+            overlap=args.overlap,
+            precision=args.precision,
+            manifest=manifest,
+        )
+        if cache is not None:
+            cache.close()
+        profiler.write(args.output)
+        manifest.write(args.output, summary, profiler.counters)
+        logger.info("Finished processing data")
+        logger.info(f"Successfully processed {summary.num_of_trades} trades.")
+        return
+
+    from src.io.reader import FileReader
+    from src.io.validation import REJECTS_SHEET, ValidationReport
+
+    logger.info(f"Loading data from {args.input}")
+    report = ValidationReport()
+    with profiler.stage("load") as stage:
+        loader = FileReader.load_table if columnar else FileReader.load_data
+        data = loader(
+            args.input,
+            stats=profiler.counters,
+            market=market,
+            surface=surface,
+            report=report,
+        )
+        if columnar:
+            logger.debug(f"Trade table holds {data.nbytes() / 2**20:.1f} MB")
+        stage["trades"] += len(data)
+
+    logger.info("Calculating greeks and PVs for each trade")
+    from src.pricing.black_scholes import BlackScholesFX
+    from src.pricing.parallel import price_parallel
+
+    with profiler.stage("price", trades=len(data), profile=True):
+        if cache is not None:
+            results, summary = price_cached(
+                data, cache, workers=workers, greeks=greeks
+            )
+            cache.close()
+        elif columnar:
+            # Shard totals are reduced as part of pricing in the columnar path
+            results, summary = price_parallel(
+                data, workers=workers, greeks=greeks, precision=args.precision
+            )
+        else:
+            results = [BlackScholesFX.calculate_greeks_and_pv(o) for o in data]
+
+    if not columnar:
+        from src.models import PortfolioSummary
+
+        logger.info("Calculating total parameters for portfolio summary")
+        with profiler.stage("aggregate", trades=len(results)):
+            summary = PortfolioSummary(
+                total_pv=sum(r.pv for r in results),
+                total_delta=sum(r.delta for r in results),
+                total_vega=sum(r.vega for r in results),
+                num_of_trades=len(results),
+            )
+
+    tables = {}
+    rejects = report.table()
+    if rejects is not None:
+        tables[REJECTS_SHEET] = rejects
+    if grouped is not None:
+        logger.info(f"Calculating totals by {', '.join(grouped.groupings)}")
+        with profiler.stage("aggregate", trades=len(data)):
+            grouped.add(data, results)
+            tables.update(grouped.tables())
+
+    if args.mc_validate:
+        logger.info(f"Validating PVs with {args.mc_paths} Monte Carlo paths per trade")
+        with profiler.stage("monte_carlo", trades=len(data)):
+            simulated = price_monte_carlo(
+                data, paths=args.mc_paths, seed=args.mc_seed, workers=workers
+            )
+            tables["MC Validation"] = compare_analytic(simulated, results)
+
+    if run_grid:
+        from src.pricing.scenarios import pnl_ladder, run_scenarios
+
+        logger.info(f"Revaluing portfolio under {len(grid)} scenarios")
+        with profiler.stage("scenarios", trades=len(data)):
+            scenarios = run_scenarios(data, grid, precision=args.precision)
+            tables["Scenario PnL"] = scenarios
+            tables["PnL Ladder"] = pnl_ladder(scenarios)
+
+    from src.io.writer import FileWriter
+
+    logger.info(f"Writing results to {args.output}")
+    with profiler.stage("write", trades=len(results)):
+        FileWriter.write_data(results, summary, args.output, tables=tables)
+    profiler.write(args.output)
+    manifest.add(FileWriter.results_table(results))
+    manifest.write(args.output, summary, profiler.counters)
 
     logger.info("Finished processing data")
     logger.info(f"Successfully processed {len(data)} trades.")
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import subprocess
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from src.models import PortfolioSummary, ResultTable
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Trades are spread over this many checksum buckets by the hash of their id,
+# so the manifest stays the same size however many trades a run has
+CHECKSUM_BUCKETS = 256
+
+# Multiplier of the FNV-1a hash combining the columns of a trade
+HASH_PRIME = np.uint64(0x100000001B3)
+
+# Bytes read at a time when hashing input files
+READ_BLOCK = 1 << 20
+
+
+def manifest_path(output_path: str):
+    """
+    Path of the manifest file written next to the output
+    :param output_path: Path of the results file
+    :return: Path with "_manifest.json" in place of the extension
+    """
+    path = Path(output_path)
+    return str(path.with_name(f"{path.stem}_manifest.json"))
+
+
+def file_sha256(path: str):
+    """
+    SHA-256 of a file, read in blocks so large inputs are not held in memory
+    :param path: Path of the file
+    :return: Hex digest of the file's contents
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def code_version():
+    """
+    Version of the code producing a run, from git where the source is a checkout
+    :return: Output of git describe, marked "-dirty" when there are local
+        changes, or "unknown" outside a git checkout
+    """
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty", "--tags"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+            timeout=10,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def id_hashes(ids):
+    """
+    Hash trade ids the same way whatever type they were read back as
+    :param ids: Array of trade ids
+    :return: uint64 array with one hash per id
+    """
+    ids = np.asarray(ids, dtype=object)
+    if pd.api.types.infer_dtype(ids, skipna=False) != "string":
+        ids = ids.astype(str).astype(object)
+    # Ids are nearly all unique, so factorizing them first only costs time
+    return pd.util.hash_array(ids, categorize=False)
+
+
+def row_checksums(ids, columns: dict):
+    """
+    Checksum of every trade's id and result values, bit for bit except that
+    -0.0 counts as 0.0
+    :param ids: Array of trade ids
+    :param columns: Result arrays keyed by column name, in output column order
+    :return: Tuple of the id hashes and the row checksums, both uint64 arrays
+    """
+    keys = id_hashes(ids)
+    checksum = keys.copy()
+    for values in columns.values():
+        bits = (np.asarray(values, dtype=float) + 0.0).view(np.uint64)
+        checksum = (checksum ^ bits) * HASH_PRIME
+    return keys, checksum
+
+
+def bucket_checksums(ids, columns: dict):
+    """
+    Sum the row checksums of the trades of each bucket. The sums wrap modulo
+    2**64 and do not depend on the order of the trades, so chunked, sharded
+    and cached runs of the same book agree.
+    :param ids: Array of trade ids
+    :param columns: Result arrays keyed by column name, in output column order
+    :return: uint64 array of CHECKSUM_BUCKETS sums
+    """
+    keys, checksum = row_checksums(ids, columns)
+    buckets = np.zeros(CHECKSUM_BUCKETS, dtype=np.uint64)
+    np.add.at(buckets, keys % np.uint64(CHECKSUM_BUCKETS), checksum)
+    return buckets
+
+
+class RunManifest:
+    """
+    Compact record of how an output was produced: hashes of the input files,
+    the code version, trade and rejected row counts, the portfolio summary
+    and checksums of every trade's results. The per-trade checksums are
+    folded into CHECKSUM_BUCKETS buckets by id as the results are written,
+    so two runs can be compared, and their unchanged trades skipped, without
+    storing anything per trade.
+    """
+
+    def __init__(self, inputs: dict[str, str | None], options: dict | None = None):
+        """
+        :param inputs: Paths of the files read by the run keyed by role, e.g.
+            "trades", "market" and "vol_surface", None for those not given
+        :param options: Settings that change the results, e.g. the precision
+        """
+        self.inputs = {name: path for name, path in inputs.items() if path}
+        self.options = options or {}
+        self.columns = None
+        self.trades = 0
+        self.buckets = np.zeros(CHECKSUM_BUCKETS, dtype=np.uint64)
+
+    def add(self, results: ResultTable):
+        """
+        Add the checksums of a chunk of results
+        :param results: Columnar results as written to the output
+        """
+        columns = results.columns()
+        ids = columns.pop("id")
+        if self.columns is None:
+            self.columns = list(columns)
+        self.buckets += bucket_checksums(ids, columns)
+        self.trades += len(results)
+
+    def to_dict(
+        self,
+        summary: PortfolioSummary,
+        counters: dict | None = None,
+        output_path: str | None = None,
+    ):
+        """
+        Contents of the manifest
+        :param summary: Total values for the portfolio
+        :param counters: Profiler counters holding "rows_read" and "rows_rejected"
+        :param output_path: Optional results file, hashed so the manifest can
+            be checked against it later
+        :return: JSON serialisable dictionary
+        """
+        counters = counters or {}
+        output = (
+            {"path": output_path, "sha256": file_sha256(output_path)}
+            if output_path
+            else None
+        )
+        return {
+            "code_version": code_version(),
+            "inputs": {
+                name: {"path": path, "sha256": file_sha256(path)}
+                for name, path in self.inputs.items()
+            },
+            "output": output,
+            "options": self.options,
+            "rows_read": counters.get("rows_read"),
+            "rows_rejected": counters.get("rows_rejected"),
+            "trades": self.trades,
+            "columns": self.columns,
+            "summary": summary.model_dump(exclude_none=True),
+            "checksum": f"{int(self.buckets.sum()):016x}",
+            "bucket_checksums": [f"{int(b):016x}" for b in self.buckets],
+        }
+
+    def write(
+        self, output_path: str, summary: PortfolioSummary, counters: dict | None = None
+    ):
+        """
+        Write the manifest file next to the output, once the output is written
+        :param output_path: Path of the results file
+        :param summary: Total values for the portfolio
+        :param counters: Profiler counters holding "rows_read" and "rows_rejected"
+        :return: Path of the manifest file
+        """
+        path = manifest_path(output_path)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(summary, counters, output_path), f, indent=2)
+        logger.info(f"Wrote run manifest to {path}")
+        return path
+
+
+def load_manifest(output_path: str):
+    """
+    Read the manifest written next to an output, if it is the manifest of
+    that output. A manifest whose recorded SHA-256 is not the output's, e.g.
+    one left behind by an earlier run or copied with another output, is
+    ignored so its checksums are never trusted for the wrong results.
+    :param output_path: Path of the results file
+    :return: Dictionary of the manifest, or None if the run did not write one
+        or it does not match the output
+    """
+    path = Path(manifest_path(output_path))
+    if not path.exists():
+        return None
+    with open(path) as f:
+        manifest = json.load(f)
+    recorded = (manifest.get("output") or {}).get("sha256")
+    if recorded != file_sha256(output_path):
+        logger.warning(f"Ignoring {path}, it does not match {output_path}")
+        return None
+    return manifest
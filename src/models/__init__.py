@@ -1,2 +1,4 @@
 from .option import FXOption, OptionType
 from .result import FXOptionResult, PortfolioSummary
+from .table import ResultTable, TradeTable
+from .market import MarketData
@@ -0,0 +1,100 @@
+from dataclasses import dataclass, field, replace
+import numpy as np
+import pandas as pd
+from .table import TradeTable
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Trade fields a market data snapshot supplies, looked up by currency pair
+MARKET_FIELDS = ("spot_price", "domestic_rate", "foreign_rate", "volatility")
+
+
+@dataclass(slots=True)
+class MarketData:
+    """
+    Snapshot of the market shared by every trade on a currency pair: spot and
+    rates per pair plus an optional flat volatility, NaN where the trades keep
+    their own. Trades find their row through a hash index on the pair built
+    once, so a market move only needs a new snapshot and a reprice.
+    """
+
+    underlying: np.ndarray
+    spot_price: np.ndarray
+    domestic_rate: np.ndarray
+    foreign_rate: np.ndarray
+    volatility: np.ndarray
+    index: pd.Index = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.index = pd.Index(self.underlying)
+        if not self.index.is_unique:
+            duplicated = sorted(set(self.index[self.index.duplicated()]))
+            raise ValueError(f"Duplicate market data for {', '.join(duplicated)}")
+
+    def __len__(self):
+        return len(self.underlying)
+
+    def codes(self, underlying):
+        """
+        Row of the snapshot for each trade
+        :param underlying: Array of the trades' currency pairs
+        :return: Integer array of snapshot rows, -1 for pairs not in the snapshot
+        """
+        return self.index.get_indexer(np.asarray(underlying, dtype=object))
+
+    def lookup(self, name: str, codes: np.ndarray, default=None):
+        """
+        Gather one market field for each trade
+        :param name: Field name, from MARKET_FIELDS
+        :param codes: Snapshot rows from codes()
+        :param default: Trade values used where the snapshot has no value,
+            NaN if not given
+        :return: Float array with one value per trade
+        """
+        values = np.append(getattr(self, name), np.nan)[codes]
+        if default is not None:
+            values = np.where(np.isnan(values), default, values)
+        return values
+
+    def join(self, df: pd.DataFrame):
+        """
+        Fill the market columns of a trade frame, renamed to model attributes,
+        from the snapshot. The snapshot wins where it has a value, other rows
+        keep the frame's own columns if there are any.
+        :param df: DataFrame with an underlying column
+        :return: Copy of the DataFrame with the market columns filled
+        """
+        if "underlying" not in df.columns:
+            return df
+        codes = self.codes(df["underlying"].to_numpy(dtype=object))
+        unknown = codes < 0
+        if unknown.any():
+            pairs = pd.unique(df["underlying"][unknown].astype(str))
+            logger.warning(
+                f"No market data for {', '.join(sorted(pairs))}, "
+                f"{np.count_nonzero(unknown)} trades keep their own inputs"
+            )
+        df = df.copy()
+        for name in MARKET_FIELDS:
+            default = None
+            if name in df.columns:
+                default = pd.to_numeric(df[name], errors="coerce").to_numpy(float)
+            df[name] = self.lookup(name, codes, default)
+        return df
+
+    def apply(self, trades: TradeTable):
+        """
+        Reprice inputs for trades already loaded: gather the snapshot's values
+        for each trade, keeping the trades' own where the snapshot has none
+        :param trades: TradeTable of the book
+        :return: TradeTable with the market columns replaced
+        """
+        codes = self.codes(trades.underlying)
+        return replace(
+            trades,
+            **{
+                name: self.lookup(name, codes, getattr(trades, name))
+                for name in MARKET_FIELDS
+            },
+        )
@@ -1,5 +1,5 @@
 from enum import Enum
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 
 class OptionType(str, Enum):
@@ -20,3 +20,25 @@ class FXOption(BaseModel):
     underlying: str = Field(description="Currency pair")
     notional: float = Field(gt=0, description="Notional amount")
     notional_currency: str = Field(description="Currency of the notional amount")
+
+    @field_validator("underlying")
+    @classmethod
+    def check_pair(cls, value: str):
+        """
+        Require a currency pair of two codes either side of a slash
+        """
+        if value.count("/") != 1 or "" in value.split("/"):
+            raise ValueError("Input should be a currency pair such as 'EUR/USD'")
+        return value
+
+    @model_validator(mode="after")
+    def check_notional_currency(self):
+        """
+        Require the notional to be in the base or quote currency of the pair,
+        get_notional would otherwise treat any other currency as the quote
+        """
+        if self.notional_currency not in self.underlying.split("/"):
+            raise ValueError(
+                "Notional currency should be the base or quote currency of the pair"
+            )
+        return self
@@ -8,6 +8,24 @@ class FXOptionResult(BaseModel):
     vega: float = Field(
         description="Sensitivity to the volatility of the underlying asset"
     )
+    gamma: float | None = Field(
+        default=None, description="Sensitivity of delta to the underlying asset price"
+    )
+    theta: float | None = Field(
+        default=None, description="Change in value per calendar day"
+    )
+    rho_domestic: float | None = Field(
+        default=None, description="Sensitivity to a 1% move in the domestic rate"
+    )
+    rho_foreign: float | None = Field(
+        default=None, description="Sensitivity to a 1% move in the foreign rate"
+    )
+    vanna: float | None = Field(
+        default=None, description="Sensitivity of delta to a 1% move in volatility"
+    )
+    volga: float | None = Field(
+        default=None, description="Sensitivity of vega to a 1% move in volatility"
+    )
 
 
 class PortfolioSummary(BaseModel):
@@ -19,3 +37,13 @@ class PortfolioSummary(BaseModel):
         description="Total Sensitivity to the volatility of the underlying asset"
     )
     num_of_trades: int
+    total_gamma: float | None = Field(default=None, description="Total gamma")
+    total_theta: float | None = Field(default=None, description="Total theta")
+    total_rho_domestic: float | None = Field(
+        default=None, description="Total domestic rho"
+    )
+    total_rho_foreign: float | None = Field(
+        default=None, description="Total foreign rho"
+    )
+    total_vanna: float | None = Field(default=None, description="Total vanna")
+    total_volga: float | None = Field(default=None, description="Total volga")
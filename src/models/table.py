@@ -0,0 +1,248 @@
+import sys
+from dataclasses import dataclass, fields
+import numpy as np
+import pandas as pd
+from .option import FXOption, OptionType
+from .result import FXOptionResult, PortfolioSummary
+
+
+def intern_labels(values):
+    """
+    Point every row of a label column at one shared string per distinct label,
+    so a book of a few currencies holds a few strings instead of one per row
+    :param values: Array or list of strings, e.g. currency pairs
+    :return: Object array of the same labels, interned
+    """
+    codes, labels = pd.factorize(np.asarray(values, dtype=object))
+    labels = np.array([sys.intern(label) for label in labels] + [None], dtype=object)
+    # Missing values have code -1, which picks the trailing None
+    return labels[codes]
+
+
+def nbytes(values: np.ndarray):
+    """
+    Memory held by a column, counting each distinct object of an object array once
+    :param values: NumPy array
+    :return: Size in bytes
+    """
+    size = values.nbytes
+    if values.dtype == object:
+        size += sum(sys.getsizeof(v) for v in {id(v): v for v in values}.values())
+    return size
+
+
+@dataclass(slots=True)
+class TradeTable:
+    """
+    Struct-of-arrays view of a portfolio, one NumPy column per FXOption field.
+    Used by the columnar pipeline so that no FXOption object is built per trade.
+    The option type is held as the boolean is_call and the currency columns
+    share one string per currency, see intern_labels.
+    """
+
+    id: np.ndarray
+    is_call: np.ndarray
+    strike: np.ndarray
+    volatility: np.ndarray
+    time_to_maturity: np.ndarray
+    spot_price: np.ndarray
+    domestic_rate: np.ndarray
+    foreign_rate: np.ndarray
+    underlying: np.ndarray
+    notional: np.ndarray
+    notional_currency: np.ndarray
+
+    def __len__(self):
+        return len(self.id)
+
+    def nbytes(self):
+        """
+        Memory held by the table
+        :return: Size in bytes of the columns and the strings they point at
+        """
+        return sum(nbytes(getattr(self, f.name)) for f in fields(self))
+
+    def take(self, index):
+        """
+        Select rows of the table
+        :param index: Slice, boolean mask or integer index array
+        :return: TradeTable holding only the selected rows
+        """
+        return TradeTable(
+            **{f.name: getattr(self, f.name)[index] for f in fields(self)}
+        )
+
+    @classmethod
+    def from_options(cls, options: list[FXOption]):
+        """
+        Build a table from a list of FXOption objects
+        :param options: List of FXOption objects
+        :return: TradeTable with one row per option
+        """
+        return cls(
+            id=np.array([o.id for o in options], dtype=object),
+            is_call=np.array(
+                [o.option_type == OptionType.CALL for o in options], dtype=bool
+            ),
+            strike=np.array([o.strike for o in options], dtype=float),
+            volatility=np.array([o.volatility for o in options], dtype=float),
+            time_to_maturity=np.array(
+                [o.time_to_maturity for o in options], dtype=float
+            ),
+            spot_price=np.array([o.spot_price for o in options], dtype=float),
+            domestic_rate=np.array([o.domestic_rate for o in options], dtype=float),
+            foreign_rate=np.array([o.foreign_rate for o in options], dtype=float),
+            underlying=intern_labels([o.underlying for o in options]),
+            notional=np.array([o.notional for o in options], dtype=float),
+            notional_currency=intern_labels([o.notional_currency for o in options]),
+        )
+
+    def to_option(self, i: int):
+        """
+        Build the FXOption of one row for the single trade APIs
+        :param i: Row of the trade
+        :return: FXOption object
+        """
+        return FXOption(
+            id=self.id[i],
+            option_type=OptionType.CALL if self.is_call[i] else OptionType.PUT,
+            strike=self.strike[i],
+            volatility=self.volatility[i],
+            time_to_maturity=self.time_to_maturity[i],
+            spot_price=self.spot_price[i],
+            domestic_rate=self.domestic_rate[i],
+            foreign_rate=self.foreign_rate[i],
+            underlying=self.underlying[i],
+            notional=self.notional[i],
+            notional_currency=self.notional_currency[i],
+        )
+
+    def to_options(self):
+        """
+        Convert the table back into FXOption objects for the single trade APIs
+        :return: List of FXOption objects
+        """
+        return [self.to_option(i) for i in range(len(self))]
+
+
+@dataclass(slots=True)
+class ResultTable:
+    """
+    Struct-of-arrays counterpart of a list of FXOptionResult objects.
+    The extra greeks are None unless they were requested from the pricer.
+    """
+
+    id: np.ndarray
+    pv: np.ndarray
+    delta: np.ndarray
+    vega: np.ndarray
+    gamma: np.ndarray | None = None
+    theta: np.ndarray | None = None
+    rho_domestic: np.ndarray | None = None
+    rho_foreign: np.ndarray | None = None
+    vanna: np.ndarray | None = None
+    volga: np.ndarray | None = None
+
+    def __len__(self):
+        return len(self.id)
+
+    def nbytes(self):
+        """
+        Memory held by the table
+        :return: Size in bytes of the populated columns and their trade ids
+        """
+        return sum(nbytes(values) for values in self.columns().values())
+
+    def columns(self):
+        """
+        The populated columns of the table, in FXOptionResult field order
+        :return: Dictionary of column name to array, skipping greeks not calculated
+        """
+        return {
+            f.name: getattr(self, f.name)
+            for f in fields(self)
+            if getattr(self, f.name) is not None
+        }
+
+    def take(self, index):
+        """
+        Select rows of the table
+        :param index: Slice, boolean mask or integer index array
+        :return: ResultTable holding only the selected rows
+        """
+        return ResultTable(
+            **{name: values[index] for name, values in self.columns().items()}
+        )
+
+    def summary(self):
+        """
+        Total the table into a PortfolioSummary
+        :return: PortfolioSummary with a total for every populated greek
+        """
+        totals = {
+            f"total_{name}": float(values.sum())
+            for name, values in self.columns().items()
+            if name != "id"
+        }
+        return PortfolioSummary(**totals, num_of_trades=len(self))
+
+    @classmethod
+    def concat(cls, tables: list["ResultTable"]):
+        """
+        Join result tables end to end, e.g. the shards of a parallel run
+        :param tables: ResultTables in output order, with the same greeks populated
+        :return: Single ResultTable with the rows of every table
+        """
+        return cls(
+            **{
+                name: np.concatenate([t.columns()[name] for t in tables])
+                for name in tables[0].columns()
+            }
+        )
+
+    @classmethod
+    def from_results(cls, results: list[FXOptionResult]):
+        """
+        Build a table from a list of FXOptionResult objects
+        :param results: List of results, with the same greeks populated
+        :return: ResultTable with one row per result
+        """
+        names = [
+            f.name
+            for f in fields(cls)
+            if f.name in ("id", "pv", "delta", "vega")
+            or (results and getattr(results[0], f.name) is not None)
+        ]
+        return cls(
+            **{
+                name: np.array(
+                    [getattr(r, name) for r in results],
+                    dtype=object if name == "id" else float,
+                )
+                for name in names
+            }
+        )
+
+    def to_result(self, i: int):
+        """
+        Build the FXOptionResult of one row for the single trade APIs
+        :param i: Row of the trade
+        :return: FXOptionResult object
+        """
+        return self.take(slice(i, i + 1)).to_results()[0]
+
+    def to_results(self):
+        """
+        Convert the table into FXOptionResult objects
+        :return: List of FXOptionResult objects
+        """
+        columns = self.columns()
+        return [
+            FXOptionResult(
+                **{
+                    name: values[i] if name == "id" else float(values[i])
+                    for name, values in columns.items()
+                }
+            )
+            for i in range(len(self))
+        ]
@@ -0,0 +1,274 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from src.io.reader import FileReader
+from src.io.validation import REJECTS_SHEET, ValidationReport
+from src.io.writer import RESULT_COLUMNS, StreamingFileWriter
+from src.manifest import RunManifest
+from src.models import MarketData
+from src.pricing.black_scholes import EXTRA_GREEKS
+from src.pricing.aggregation import GroupedTotals
+from src.pricing.cache import ResultCache, merge_results
+from src.pricing.parallel import price_shard, reduce_summaries
+from src.pricing.vol_surface import VolSurface
+from src.profiling import StageProfiler
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rows per chunk of the overlapped pipeline when no chunk size is given
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Chunks a stage of the overlapped pipeline may run ahead of the next one
+QUEUE_DEPTH = 2
+
+# Marks the end of the items in a queue
+_DONE = object()
+
+
+def read_ahead(items, depth: int = QUEUE_DEPTH):
+    """
+    Produce the items of an iterator in a background thread, at most depth
+    items ahead of the consumer. Exceptions raised while producing are raised
+    again in the consumer, and closing the generator stops the producer.
+    :param items: Iterable producing the items, e.g. a chunk reader
+    :param depth: Size of the bounded queue between the threads
+    :return: Generator of the items in order
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def send(item, error=None):
+        # Blocks while the queue is full, re-checking for a stop request so a
+        # consumer that stopped reading never leaves the producer waiting
+        while not stop.is_set():
+            try:
+                buffer.put((item, error), timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not send(item):
+                    return
+            send(_DONE)
+        except BaseException as e:
+            send(_DONE, e)
+
+    thread = threading.Thread(target=produce, name="read-ahead", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+class WriteBehind:
+    """
+    Runs write calls in order on a background thread, with at most depth
+    calls queued so a slow writer holds back the stages feeding it. The first
+    exception raised by a write is raised again by submit or close.
+    """
+
+    def __init__(self, depth: int = QUEUE_DEPTH):
+        """
+        :param depth: Size of the bounded queue of pending writes
+        """
+        self.queue = queue.Queue(maxsize=depth)
+        self.error = None
+        self.thread = threading.Thread(
+            target=self.run, name="write-behind", daemon=True
+        )
+        self.thread.start()
+
+    def run(self):
+        while True:
+            call = self.queue.get()
+            if call is _DONE:
+                return
+            if self.error is None:
+                try:
+                    call()
+                except BaseException as e:
+                    self.error = e
+
+    def submit(self, call):
+        """
+        Queue a write, blocking while the queue is full
+        :param call: Function taking no arguments
+        """
+        if self.error is not None:
+            raise self.error
+        self.queue.put(call)
+
+    def close(self):
+        """
+        Wait for the queued writes to finish
+        """
+        self.queue.put(_DONE)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+def run_streaming(
+    input_path: str,
+    output_path: str,
+    chunk_size: int,
+    workers: int = 1,
+    greeks: tuple[str, ...] = (),
+    cache: ResultCache | None = None,
+    profiler: StageProfiler | None = None,
+    grouped: GroupedTotals | None = None,
+    market: MarketData | None = None,
+    surface: VolSurface | None = None,
+    overlap: bool = False,
+    precision: str = "exact",
+    manifest: RunManifest | None = None,
+):
+    """
+    Read, validate, price and write the portfolio one chunk at a time so that
+    peak memory is bounded by the chunk size rather than the size of the book.
+    With several workers the chunks are priced in a process pool, keeping at
+    most two chunks per worker in flight and writing them back in input order.
+    With a cache only the trades of each chunk without a stored result are priced.
+    With overlap, chunks are read on one thread and written on another while
+    the next chunk is priced, through queues of QUEUE_DEPTH chunks, so the run
+    takes about as long as its slowest stage rather than the sum of them.
+
+    :param input_path: Path of the input .xlsx, .csv, .parquet or .arrow file
+    :param output_path: File path for generated .xlsx, .csv, .parquet or .arrow file
+    :param chunk_size: Number of rows read and priced per chunk
+    :param workers: Number of worker processes used to price chunks
+    :param greeks: Names of the extra greeks to calculate, from EXTRA_GREEKS
+    :param cache: Optional ResultCache of results from previous runs
+    :param profiler: Optional StageProfiler timing the load, price and write stages
+    :param grouped: Optional GroupedTotals accumulating totals per group, written
+        as extra tables when the output is closed
+    :param market: Optional MarketData joined onto each chunk by underlying
+    :param surface: Optional VolSurface interpolated for each chunk
+    :param overlap: Read and write on background threads while pricing
+    :param precision: Numeric mode of the pricing kernels, from PRECISIONS
+    :param manifest: Optional RunManifest taking the checksums of each chunk
+    :return: PortfolioSummary accumulated over all chunks, the rejected rows
+        are written to a "Rejects" sheet or companion file
+    """
+    columns = RESULT_COLUMNS + [g for g in EXTRA_GREEKS if g in greeks]
+    writer = StreamingFileWriter(output_path, columns=columns)
+    partials = []
+    profiler = profiler or StageProfiler(enabled=False)
+    write_behind = WriteBehind() if overlap else None
+    report = ValidationReport()
+
+    def read_chunks():
+        # Reading happens inside the generator, so time each step of it
+        chunks = FileReader.iter_tables(
+            input_path,
+            chunk_size,
+            stats=profiler.counters,
+            market=market,
+            surface=surface,
+            report=report,
+        )
+        while True:
+            with profiler.stage("load") as stage:
+                trades = next(chunks, None)
+                if trades is not None:
+                    stage["trades"] += len(trades)
+            if trades is None:
+                return
+            yield trades
+
+    def append(results):
+        with profiler.stage("write", trades=len(results)):
+            writer.append(results)
+
+    def write_chunk(results, partial):
+        # Accumulate the portfolio totals as each chunk is written
+        if manifest is not None:
+            manifest.add(results)
+        if write_behind is not None:
+            write_behind.submit(lambda: append(results))
+        else:
+            append(results)
+        partials.append(partial)
+        logger.debug(f"Chunk {len(partials) - 1}: priced {len(results)} trades")
+
+    def split_chunk(trades):
+        # Look the chunk up in the cache, returning the trades still to price
+        if cache is None:
+            return trades, None
+        with profiler.stage("cache", trades=len(trades)):
+            lookup = cache.lookup(trades, greeks)
+        return trades.take(~lookup[1]), lookup
+
+    def finish_chunk(trades, lookup, priced):
+        results, partial = priced
+        if lookup is not None:
+            keys, found, cached = lookup
+            with profiler.stage("cache"):
+                cache.store(keys[~found], results)
+            results = merge_results(trades, found, cached, results)
+            partial = results.summary()
+        if grouped is not None:
+            with profiler.stage("aggregate", trades=len(trades)):
+                grouped.add(trades, results)
+        write_chunk(results, partial)
+
+    def price_chunks(chunks):
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+
+                def finish_oldest():
+                    trades, lookup, future = pending.popleft()
+                    # Only the time spent waiting on the pool shows up as pricing
+                    with profiler.stage("price", trades=len(trades)):
+                        priced = future.result()
+                    finish_chunk(trades, lookup, priced)
+
+                for trades in chunks:
+                    to_price, lookup = split_chunk(trades)
+                    future = pool.submit(price_shard, to_price, greeks, precision)
+                    pending.append((trades, lookup, future))
+                    if len(pending) >= 2 * workers:
+                        finish_oldest()
+                while pending:
+                    finish_oldest()
+        else:
+            for trades in chunks:
+                to_price, lookup = split_chunk(trades)
+                with profiler.stage("price", trades=len(to_price), profile=True):
+                    priced = price_shard(to_price, greeks, precision)
+                finish_chunk(trades, lookup, priced)
+
+    chunks = read_ahead(read_chunks()) if overlap else read_chunks()
+    try:
+        price_chunks(chunks)
+    finally:
+        chunks.close()
+        if write_behind is not None:
+            write_behind.close()
+
+    summary = reduce_summaries(partials)
+    if summary.num_of_trades == 0:
+        logger.warning("No valid trades found all  records failed validation.")
+
+    tables = grouped.tables() if grouped is not None else {}
+    rejects = report.table()
+    if rejects is not None:
+        tables[REJECTS_SHEET] = rejects
+    with profiler.stage("write"):
+        writer.close(summary, tables=tables)
+    return summary
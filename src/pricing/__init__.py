@@ -1 +1,15 @@
-from .black_scholes import BlackScholesFX
+from importlib import import_module
+
+# Public names and the submodule defining them. They are imported on first
+# access so that importing one pricing module does not load all the others
+_EXPORTS = {
+    "BlackScholesFX": "black_scholes",
+    "price_parallel": "parallel",
+    "solve_implied_vol": "implied_vol",
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(import_module(f".{_EXPORTS[name]}", __name__), name)
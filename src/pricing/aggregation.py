@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+from src.models import ResultTable, TradeTable
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Trade attributes the portfolio can be grouped by
+GROUPINGS = ("underlying", "notional_currency", "option_type", "expiry")
+
+# Upper edges of the default expiry buckets in years, the last bucket is open
+DEFAULT_EXPIRY_EDGES = (1 / 12, 0.25, 0.5, 1.0, 2.0)
+
+# Number of error-free extraction steps taken before the remainder is summed
+EXTRACTIONS = 2
+
+
+def tenor_label(years: float):
+    """
+    Label a tenor in months below a year and in years above
+    :param years: Tenor in years
+    :return: Label such as "3M" or "1.5Y"
+    """
+    months = years * 12
+    if months < 12 and abs(months - round(months)) < 1e-9:
+        return f"{round(months)}M"
+    return f"{years:g}Y"
+
+
+def expiry_labels(edges: tuple[float, ...]):
+    """
+    Labels of the expiry buckets cut by the edges
+    :param edges: Increasing upper edges of the buckets in years
+    :return: List of len(edges) + 1 labels, e.g. "<=1M", "1M-3M", ">2Y"
+    """
+    tenors = [tenor_label(edge) for edge in edges]
+    return (
+        [f"<={tenors[0]}"]
+        + [f"{low}-{high}" for low, high in zip(tenors, tenors[1:])]
+        + [f">{tenors[-1]}"]
+    )
+
+
+def parse_expiry_edges(spec: str | None):
+    """
+    Parse expiry bucket edges from the command line
+    :param spec: Comma separated edges in years e.g. "0.25,0.5,1", None for the default
+    :return: Tuple of increasing edges
+    """
+    if spec is None:
+        return DEFAULT_EXPIRY_EDGES
+    edges = tuple(float(x) for x in spec.split(","))
+    if any(high <= low for low, high in zip(edges, edges[1:])) or edges[0] <= 0:
+        raise ValueError(f"Expiry buckets must be positive and increasing, got {spec}")
+    return edges
+
+
+def group_sums(codes: np.ndarray, values: np.ndarray, n_groups: int):
+    """
+    Sum values per group in a few vectorised passes with compensation.
+
+    Each value is split into a high part on a coarse power of two grid and
+    the low remainder, both exactly (Rump, Ogita and Oishi's error-free
+    extraction). The high parts are small multiples of the grid so their
+    group sums are exact in any order. Repeating the split on the remainder
+    EXTRACTIONS times leaves rounding error only in the sum of tiny values.
+
+    :param codes: Group index of every value
+    :param values: Values to sum
+    :param n_groups: Number of groups
+    :return: Array of shape (EXTRACTIONS + 1, n_groups) of partial sums, the
+        group totals are the sum over the first axis
+    """
+    parts = []
+    for _ in range(EXTRACTIONS):
+        peak = float(np.max(np.abs(values), initial=0.0))
+        if peak == 0 or not np.isfinite(peak):
+            parts.append(np.zeros(n_groups))
+            continue
+        sigma = 2.0 ** (np.ceil(np.log2(len(values) + 2)) + np.ceil(np.log2(peak)))
+        high = (sigma + values) - sigma
+        parts.append(np.bincount(codes, high, n_groups))
+        values = values - high
+    parts.append(np.bincount(codes, values, n_groups))
+    return np.array(parts)
+
+
+def two_sum(a: np.ndarray, b: np.ndarray):
+    """
+    Error-free sum of two arrays (Knuth's TwoSum)
+    :return: Tuple of the rounded sums and their rounding errors
+    """
+    total = a + b
+    b_part = total - a
+    error = (a - (total - b_part)) + (b - b_part)
+    return total, error
+
+
+class GroupedTotals:
+    """
+    Streaming accumulator of portfolio totals per group. Chunks of trades and
+    their results are added as they are priced and each group keeps a running
+    sum and compensation term per greek, so the totals stay accurate on large
+    books however they are chunked.
+    """
+
+    def __init__(
+        self,
+        groupings: tuple[str, ...] = GROUPINGS,
+        expiry_edges: tuple[float, ...] = DEFAULT_EXPIRY_EDGES,
+    ):
+        """
+        :param groupings: Names of the groupings to total, from GROUPINGS
+        :param expiry_edges: Upper edges of the expiry buckets in years
+        """
+        unknown = set(groupings) - set(GROUPINGS)
+        if unknown:
+            raise ValueError(f"Unknown groupings {sorted(unknown)}")
+        self.groupings = tuple(groupings)
+        self.expiry_edges = np.asarray(expiry_edges, dtype=float)
+        self.expiry_labels = expiry_labels(tuple(expiry_edges))
+        self.columns = None
+        # grouping -> label -> (sums, compensations, number of trades)
+        self.groups = {grouping: {} for grouping in self.groupings}
+
+    def codes(self, trades: TradeTable, grouping: str):
+        """
+        Group of every trade
+        :param trades: TradeTable of the trades
+        :param grouping: Name of the grouping, from GROUPINGS
+        :return: Tuple of the group index of every trade and the group labels
+        """
+        if grouping == "option_type":
+            # Calls are group 0 and puts group 1
+            puts = ~np.asarray(trades.is_call, dtype=bool)
+            return puts.astype(np.intp), ["Call", "Put"]
+        if grouping == "expiry":
+            # Bucket i holds expiries up to and including edge i
+            bucket = np.searchsorted(
+                self.expiry_edges, trades.time_to_maturity, side="left"
+            )
+            return bucket, self.expiry_labels
+        # Hash based, so the strings are never sorted
+        codes, labels = pd.factorize(np.asarray(getattr(trades, grouping), object))
+        return codes, [str(label) for label in labels]
+
+    def add(self, trades: TradeTable, results: ResultTable):
+        """
+        Add a chunk of trades and their results to the totals
+        :param trades: TradeTable of the chunk
+        :param results: ResultTable of the chunk, in trade order
+        """
+        columns = {k: v for k, v in results.columns().items() if k != "id"}
+        if self.columns is None:
+            self.columns = list(columns)
+        if not len(trades):
+            return
+        values = [np.asarray(columns[name], dtype=float) for name in self.columns]
+
+        for grouping in self.groupings:
+            codes, names = self.codes(trades, grouping)
+            # Partial sums of shape (parts, greeks, groups)
+            parts = np.stack([group_sums(codes, v, len(names)) for v in values], 1)
+            counts = np.bincount(codes, minlength=len(names))
+
+            groups = self.groups[grouping]
+            for i, name in enumerate(names):
+                if not counts[i]:
+                    continue
+                sums, compensation, count = groups.get(
+                    name, (np.zeros(len(values)), np.zeros(len(values)), 0)
+                )
+                for part in parts[:, :, i]:
+                    sums, error = two_sum(sums, part)
+                    compensation = compensation + error
+                groups[name] = (sums, compensation, count + counts[i])
+
+    def tables(self):
+        """
+        Grouped totals as tables for the output file
+        :return: Dictionary of sheet name, e.g. "Totals by Underlying", to a
+            DataFrame with one row per group
+        """
+        tables = {}
+        for grouping in self.groupings:
+            groups = self.groups[grouping]
+            if grouping == "expiry":
+                order = [label for label in self.expiry_labels if label in groups]
+            else:
+                order = sorted(groups)
+            table = {grouping: order, "num_of_trades": []}
+            table.update({f"total_{name}": [] for name in self.columns or []})
+            for label in order:
+                sums, compensation, count = groups[label]
+                table["num_of_trades"].append(int(count))
+                for name, value in zip(self.columns, sums + compensation):
+                    table[f"total_{name}"].append(float(value))
+            title = grouping.replace("_", " ").title()
+            tables[f"Totals by {title}"] = pd.DataFrame(table)
+        logger.debug(f"Grouped totals by {', '.join(self.groupings)}")
+        return tables
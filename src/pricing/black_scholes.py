@@ -1,12 +1,107 @@
 # Uses BS Implementation for FXOptions (https://www.sciencedirect.com/science/article/abs/pii/S0261560683800011)
 import numpy as np
-import scipy.stats as stats
+import pandas as pd
+from .greeks import EXTRA_GREEKS
+from .normal import PRECISIONS, norm_cdf, norm_cdf_fast, norm_pdf
 from src.models import FXOption, OptionType
-from src.models import FXOptionResult
+from src.models import FXOptionResult, ResultTable, TradeTable
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Trades are only collapsed to their unique contract terms when at most this
+# fraction of them is unique, otherwise the gather and scatter cost more than
+# the pricing they save
+MAX_UNIQUE_FRACTION = 0.9
+
+# Books above this size first estimate their unique fraction from a sample
+# of 1 / 2**SAMPLE_BITS of their contracts, so a book without duplicates
+# skips hashing and factorizing every trade
+SAMPLE_MIN_TRADES = 10_000
+SAMPLE_BITS = 3
+
+# Rows looked at to pick the most varied input the sample is drawn by
+PROBE_ROWS = 1_000
+
+# Multiplier of the FNV-1a style hash combining the key columns
+HASH_PRIME = np.uint64(0x100000001B3)
+
+# Multipliers of the MurmurHash3 finalizer, which spreads every input bit
+# over the high bits the sample is drawn from
+MIX_PRIMES = (np.uint64(0xFF51AFD7ED558CCD), np.uint64(0xC4CEB9FE1A85EC53))
+
+
+def hash_rows(columns, rows=slice(None)):
+    """
+    Hash the key columns of some rows into one integer per row
+    :param columns: Equal length arrays of the pricing inputs
+    :param rows: Rows to hash, all of them by default
+    :return: uint64 array of the hashes
+    """
+    key = None
+    for column in columns:
+        bits = np.asarray(column, dtype=float)[rows].view(np.uint64)
+        key = bits * HASH_PRIME if key is None else (key ^ bits) * HASH_PRIME
+    return key
+
+
+def sample_contracts(columns):
+    """
+    Rows of about 1 / 2**SAMPLE_BITS of the contracts, with every copy of
+    each. Rows are kept by a hash of their most varied input, which copies
+    of a contract share, so copies are kept or dropped together and the
+    unique fraction of the sample estimates that of the book. A sample of
+    rows would not: it keeps one copy of most duplicated contracts and so
+    looks more unique than the book.
+    :param columns: Equal length arrays of the pricing inputs
+    :return: Array of the sampled rows
+    """
+    n = len(columns[0])
+    probe = np.linspace(0, n - 1, min(PROBE_ROWS, n)).astype(int)
+    varied = max(
+        columns, key=lambda c: len(pd.unique(np.asarray(c, dtype=float)[probe]))
+    )
+    mixed = np.asarray(varied, dtype=float).view(np.uint64)
+    for prime in MIX_PRIMES:
+        mixed = (mixed ^ (mixed >> np.uint64(33))) * prime
+    mixed ^= mixed >> np.uint64(33)
+    return np.flatnonzero(mixed >> np.uint64(64 - SAMPLE_BITS) == 0)
+
+
+def pricing_keys(*columns: np.ndarray):
+    """
+    Group trades whose pricing inputs are bit for bit the same, so their unit
+    PV and greeks only need calculating once. The columns are hashed together
+    into one integer per trade and factorized, then every trade is checked
+    against the first trade of its key so a hash collision can never merge
+    different contracts.
+    :param columns: Equal length arrays of the pricing inputs
+    :return: Tuple of the key of every trade and the row of the first trade
+        of each key, or None if more than MAX_UNIQUE_FRACTION of the trades
+        are unique or two different contracts collided
+    """
+    n = len(columns[0])
+    if n >= SAMPLE_MIN_TRADES:
+        rows = sample_contracts(columns)
+        # Too few rows when the most varied input still has few values
+        if len(rows) >= SAMPLE_MIN_TRADES >> SAMPLE_BITS:
+            sampled = hash_rows(columns, rows)
+            if len(pd.unique(sampled)) > MAX_UNIQUE_FRACTION * len(rows):
+                return None
+
+    key = hash_rows(columns)
+    codes, uniques = pd.factorize(key)
+    if len(uniques) > MAX_UNIQUE_FRACTION * n:
+        return None
+    first = np.empty(len(uniques), dtype=int)
+    # Written in reverse so the first trade of each key is the one kept
+    first[codes[::-1]] = np.arange(n)[::-1]
+    for column in columns:
+        column = np.asarray(column, dtype=float)
+        if not np.array_equal(column[first][codes], column, equal_nan=True):
+            return None
+    return codes, first
+
 
 class BlackScholesFX:
 
@@ -66,13 +161,13 @@ class BlackScholesFX:
 
         # Calculate the unit price accordingly for option type then scale by notional
         if option.option_type == OptionType.CALL:
-            unit_pv = option.spot_price * fr * stats.norm.cdf(
+            unit_pv = option.spot_price * fr * norm_cdf(
                 d1
-            ) - option.strike * dr * stats.norm.cdf(d2)
+            ) - option.strike * dr * norm_cdf(d2)
         else:
-            unit_pv = option.strike * dr * stats.norm.cdf(
+            unit_pv = option.strike * dr * norm_cdf(
                 -d2
-            ) - option.spot_price * fr * stats.norm.cdf(-d1)
+            ) - option.spot_price * fr * norm_cdf(-d1)
 
         return unit_pv * multiplier
 
@@ -92,11 +187,11 @@ class BlackScholesFX:
 
         if option.option_type == OptionType.CALL:
             # Call Delta - e^(-foreign_rate * T) * N(d1)
-            delta = fr * stats.norm.cdf(d1)
+            delta = fr * norm_cdf(d1)
 
         else:
             # Put Delta = e ^ (-foreign_rate * T) * (N(d1) -1)
-            delta = fr * (stats.norm.cdf(d1) - 1)
+            delta = fr * (norm_cdf(d1) - 1)
         return delta * multiplier
 
     @staticmethod
@@ -117,19 +212,24 @@ class BlackScholesFX:
             fr
             * option.spot_price
             * np.sqrt(option.time_to_maturity)
-            * stats.norm.pdf(d1)
+            * norm_pdf(d1)
             * 0.01
         )
 
         return vega * multiplier
 
     @staticmethod
-    def calculate_greeks_and_pv(option: FXOption):
+    def calculate_greeks_and_pv(option: FXOption, greeks: tuple[str, ...] = ()):
         """
         This collates all the greeks and pv for a given option
         :param option: The FXOption object containing market data.
+        :param greeks: Names of the extra greeks to calculate, from EXTRA_GREEKS
         :return: FXOptionResult object containing the greeks and pv
         """
+        if greeks:
+            # The extra greeks share their terms with pv, delta and vega
+            return BlackScholesFX.calculate_greeks_and_pv_batch([option], greeks)[0]
+
         # Handling options at or past maturity (T <= 0)
         if option.time_to_maturity <= 0:
             # At maturity, the option value is the intrinsic value
@@ -164,3 +264,291 @@ class BlackScholesFX:
                 delta=float(BlackScholesFX.calculate_delta(option, d1, multiplier)),
                 vega=float(BlackScholesFX.calculate_vega(option, d1, multiplier)),
             )
+
+    @staticmethod
+    def get_notional_batch(
+        underlying: np.ndarray,
+        notional_currency: np.ndarray,
+        notional: np.ndarray,
+        spot: np.ndarray,
+    ):
+        """
+        Vectorised version of get_notional for whole columns of trades.
+
+        :param underlying: Array of currency pairs e.g. "EUR/USD"
+        :param notional_currency: Array of notional currencies
+        :param notional: Array of notional amounts
+        :param spot: Array of spot prices
+        :return: Array of notionals converted to the base currency
+        """
+        underlying = np.asarray(underlying, dtype=object)
+        notional = np.asarray(notional, dtype=float)
+        spot = np.asarray(spot, dtype=float)
+
+        # Base currency is everything before the slash, same as the scalar split.
+        # A book has few pairs, so each distinct pair is split once
+        codes, pairs = pd.factorize(underlying)
+        bases = np.array([pair.split("/")[0] for pair in pairs], dtype=object)
+        in_base = bases[codes] == np.asarray(notional_currency, dtype=object)
+
+        # Quote currency notionals are converted to base currency using spot
+        return np.where(in_base, notional, notional / spot)
+
+    @staticmethod
+    def price_batch(
+        spot: np.ndarray,
+        strike: np.ndarray,
+        volatility: np.ndarray,
+        domestic_rate: np.ndarray,
+        foreign_rate: np.ndarray,
+        time_to_maturity: np.ndarray,
+        is_call: np.ndarray,
+        multiplier: np.ndarray,
+        precision: str = "exact",
+    ):
+        """
+        Price a whole portfolio in one pass over columnar arrays.
+
+        Follows the same formulas as price, calculate_delta and calculate_vega,
+        including the intrinsic value branch for expired trades, so results
+        match calculate_greeks_and_pv trade by trade.
+
+        :param spot: Array of spot prices
+        :param strike: Array of strikes
+        :param volatility: Array of volatilities
+        :param domestic_rate: Array of domestic interest rates
+        :param foreign_rate: Array of foreign interest rates
+        :param time_to_maturity: Array of times to maturity in years
+        :param is_call: Boolean array, True for calls and False for puts
+        :param multiplier: Array of notional multipliers from get_notional_batch
+        :param precision: Numeric mode from PRECISIONS, see calculate_greeks_batch
+        :return: Tuple of pv, delta and vega arrays scaled by notional
+        """
+        values = BlackScholesFX.calculate_greeks_batch(
+            spot,
+            strike,
+            volatility,
+            domestic_rate,
+            foreign_rate,
+            time_to_maturity,
+            is_call,
+            multiplier,
+            precision=precision,
+        )
+        return values["pv"], values["delta"], values["vega"]
+
+    @staticmethod
+    def calculate_greeks_batch(
+        spot: np.ndarray,
+        strike: np.ndarray,
+        volatility: np.ndarray,
+        domestic_rate: np.ndarray,
+        foreign_rate: np.ndarray,
+        time_to_maturity: np.ndarray,
+        is_call: np.ndarray,
+        multiplier: np.ndarray,
+        greeks: tuple[str, ...] = (),
+        precision: str = "exact",
+    ):
+        """
+        Calculate pv, delta, vega and any of the EXTRA_GREEKS in a single pass.
+        d1/d2, the discount factors, the normal CDFs and n(d1) are computed once
+        and shared by every greek, and greeks that are not requested cost nothing.
+
+        Conventions: gamma is per unit of spot, theta is per calendar day, both
+        rhos are per 1% rate move, vanna is per 1% vol move and volga per 1% vol
+        move squared, matching the 1% scaling of vega. All are zero for expired
+        trades.
+
+        The precision trades accuracy for speed: "exact" is accurate to
+        machine precision, "fast" swaps the normal CDF for a rational
+        approximation with 1e-7 relative error, and "float32" also runs the
+        kernels in single precision. The notional scaling is always done in
+        float64. tests/test_pricing.py enforces error bounds of 1e-6 for "fast"
+        and 5e-5 for "float32" on every result, relative to the larger of its
+        exact value and its notional scale: the notional in base currency for
+        delta and vanna, the notional over spot for gamma and the notional
+        times spot for the others.
+
+        :param spot: Array of spot prices
+        :param strike: Array of strikes
+        :param volatility: Array of volatilities
+        :param domestic_rate: Array of domestic interest rates
+        :param foreign_rate: Array of foreign interest rates
+        :param time_to_maturity: Array of times to maturity in years
+        :param is_call: Boolean array, True for calls and False for puts
+        :param multiplier: Array of notional multipliers from get_notional_batch
+        :param greeks: Names of the extra greeks to calculate, from EXTRA_GREEKS
+        :param precision: Numeric mode, one of PRECISIONS
+        :return: Dictionary of float64 arrays keyed by "pv", "delta", "vega" and
+            each greek
+        """
+        unknown = set(greeks) - set(EXTRA_GREEKS)
+        if unknown:
+            raise ValueError(f"Unknown greeks {sorted(unknown)}")
+        if precision not in PRECISIONS:
+            raise ValueError(
+                f"Unknown precision {precision}, expected {', '.join(PRECISIONS)}"
+            )
+        dtype = np.float32 if precision == "float32" else float
+
+        spot = np.asarray(spot, dtype=dtype)
+        strike = np.asarray(strike, dtype=dtype)
+        volatility = np.asarray(volatility, dtype=dtype)
+        domestic_rate = np.asarray(domestic_rate, dtype=dtype)
+        foreign_rate = np.asarray(foreign_rate, dtype=dtype)
+        time_to_maturity = np.asarray(time_to_maturity, dtype=dtype)
+        is_call = np.asarray(is_call, dtype=bool)
+        multiplier = np.asarray(multiplier, dtype=float)
+
+        expired = time_to_maturity <= 0
+
+        # Use a dummy maturity for expired trades so the live formulas stay finite
+        t = np.where(expired, 1.0, time_to_maturity)
+        sqrt_t = np.sqrt(t)
+        vol_sqrt_t = volatility * sqrt_t
+
+        d1 = (
+            np.log(spot / strike)
+            + (domestic_rate - foreign_rate + volatility**2 / 2) * t
+        ) / (volatility * sqrt_t)
+        d2 = d1 - vol_sqrt_t
+
+        dr = np.exp(-domestic_rate * t)
+        fr = np.exp(-foreign_rate * t)
+
+        # Shared terms reused by every greek below
+        if precision == "exact":
+            cdf_d1, cdf_neg_d1 = norm_cdf(d1), norm_cdf(-d1)
+            cdf_d2, cdf_neg_d2 = norm_cdf(d2), norm_cdf(-d2)
+        else:
+            cdf_d1, cdf_neg_d1 = norm_cdf_fast(d1)
+            cdf_d2, cdf_neg_d2 = norm_cdf_fast(d2)
+        pdf_d1 = norm_pdf(d1)
+        spot_fr = spot * fr
+        strike_dr = strike * dr
+
+        call_pv = spot_fr * cdf_d1 - strike_dr * cdf_d2
+        put_pv = strike_dr * cdf_neg_d2 - spot_fr * cdf_neg_d1
+
+        unit = {
+            "pv": np.where(is_call, call_pv, put_pv),
+            "delta": np.where(is_call, fr * cdf_d1, fr * (cdf_d1 - 1)),
+            "vega": fr * spot * sqrt_t * pdf_d1 * 0.01,
+        }
+
+        if "gamma" in greeks:
+            unit["gamma"] = fr * pdf_d1 / (spot * vol_sqrt_t)
+        if "theta" in greeks:
+            decay = -spot_fr * pdf_d1 * volatility / (2 * sqrt_t)
+            call_theta = (
+                decay
+                + foreign_rate * spot_fr * cdf_d1
+                - domestic_rate * strike_dr * cdf_d2
+            )
+            put_theta = (
+                decay
+                - foreign_rate * spot_fr * cdf_neg_d1
+                + domestic_rate * strike_dr * cdf_neg_d2
+            )
+            unit["theta"] = np.where(is_call, call_theta, put_theta) / 365
+        if "rho_domestic" in greeks:
+            unit["rho_domestic"] = (
+                np.where(is_call, strike_dr * cdf_d2, -strike_dr * cdf_neg_d2)
+                * t
+                * 0.01
+            )
+        if "rho_foreign" in greeks:
+            unit["rho_foreign"] = (
+                np.where(is_call, -spot_fr * cdf_d1, spot_fr * cdf_neg_d1) * t * 0.01
+            )
+        if "vanna" in greeks:
+            unit["vanna"] = -fr * pdf_d1 * d2 / volatility * 0.01
+        if "volga" in greeks:
+            unit["volga"] = unit["vega"] * d1 * d2 / volatility * 0.01
+
+        # At maturity the option value is the intrinsic value and vega is zero
+        intrinsic_pv = np.where(
+            is_call, np.maximum(spot - strike, 0), np.maximum(strike - spot, 0)
+        )
+        intrinsic_delta = np.where(
+            is_call, (spot > strike).astype(float), -(strike > spot).astype(float)
+        )
+
+        values = {
+            "pv": np.where(expired, intrinsic_pv, unit["pv"]) * multiplier,
+            "delta": np.where(expired, intrinsic_delta, unit["delta"]) * multiplier,
+        }
+        # Every other greek is zero once the option has expired
+        for name in ("vega",) + tuple(g for g in EXTRA_GREEKS if g in greeks):
+            values[name] = np.where(expired, 0.0, unit[name]) * multiplier
+        return values
+
+    @staticmethod
+    def price_table(
+        trades: TradeTable, greeks: tuple[str, ...] = (), precision: str = "exact"
+    ):
+        """
+        Price a columnar trade table without building per-trade model objects.
+        Trades that differ only in id, pair and notional share their unit PV
+        and greeks: those are calculated once per unique set of pricing
+        inputs and scaled by each trade's notional multiplier.
+        :param trades: TradeTable holding the portfolio columns
+        :param greeks: Names of the extra greeks to calculate, from EXTRA_GREEKS
+        :param precision: Numeric mode from PRECISIONS, see calculate_greeks_batch
+        :return: ResultTable with pv, delta, vega and the requested greek arrays
+        """
+        multiplier = BlackScholesFX.get_notional_batch(
+            trades.underlying,
+            trades.notional_currency,
+            trades.notional,
+            trades.spot_price,
+        )
+        inputs = (
+            trades.spot_price,
+            trades.strike,
+            trades.volatility,
+            trades.domestic_rate,
+            trades.foreign_rate,
+            trades.time_to_maturity,
+            trades.is_call,
+        )
+        keys = pricing_keys(*inputs) if len(trades) > 1 else None
+        if keys is None:
+            values = BlackScholesFX.calculate_greeks_batch(
+                *inputs, multiplier, greeks=greeks, precision=precision
+            )
+            logger.debug(f"Priced {len(trades)} trades in a single batch")
+            return ResultTable(id=trades.id, **values)
+
+        codes, first = keys
+        unit = BlackScholesFX.calculate_greeks_batch(
+            *(np.asarray(column)[first] for column in inputs),
+            np.ones(len(first)),
+            greeks=greeks,
+            precision=precision,
+        )
+        logger.info(
+            f"Priced {len(trades)} trades as {len(first)} unique contracts, "
+            f"a dedupe ratio of {len(trades) / len(first):.1f}"
+        )
+        return ResultTable(
+            id=trades.id,
+            **{name: values[codes] * multiplier for name, values in unit.items()},
+        )
+
+    @staticmethod
+    def calculate_greeks_and_pv_batch(
+        options: list[FXOption], greeks: tuple[str, ...] = ()
+    ):
+        """
+        Batch counterpart of calculate_greeks_and_pv for a list of options
+        :param options: List of FXOption objects containing market data.
+        :param greeks: Names of the extra greeks to calculate, from EXTRA_GREEKS
+        :return: List of FXOptionResult objects in the same order
+        """
+        if not options:
+            return []
+        return BlackScholesFX.price_table(
+            TradeTable.from_options(options), greeks=greeks
+        ).to_results()
@@ -0,0 +1,232 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from src.models import ResultTable, TradeTable
+from .black_scholes import EXTRA_GREEKS
+from .parallel import DEFAULT_SHARD_SIZE, price_parallel, reduce_summaries
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Trade fields that change the price, the trade id is deliberately left out
+KEY_FIELDS = (
+    "is_call",
+    "strike",
+    "volatility",
+    "time_to_maturity",
+    "spot_price",
+    "domestic_rate",
+    "foreign_rate",
+    "underlying",
+    "notional",
+    "notional_currency",
+)
+VALUE_COLUMNS = ("pv", "delta", "vega") + EXTRA_GREEKS
+
+# Number of results kept on disk before the least recently used are evicted
+DEFAULT_MAX_ENTRIES = 1_000_000
+
+# Bump whenever the pricing formulas change so stale results are dropped
+CACHE_VERSION = 2
+
+
+def trade_keys(trades: TradeTable):
+    """
+    Hash the pricing relevant fields of every trade in one vectorised pass
+    :param trades: TradeTable to hash
+    :return: Array of 64 bit keys, equal for trades with identical terms
+    """
+    frame = pd.DataFrame({name: getattr(trades, name) for name in KEY_FIELDS})
+    hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    # SQLite integers are signed
+    return hashes.view(np.int64)
+
+
+def merge_results(
+    trades: TradeTable, found: np.ndarray, cached: ResultTable, fresh: ResultTable
+):
+    """
+    Interleave cached and freshly priced results back into trade order
+    :param trades: TradeTable the results belong to
+    :param found: Boolean mask of the trades that were served from the cache
+    :param cached: Results of the found trades, in trade order
+    :param fresh: Results of the remaining trades, in trade order
+    :return: ResultTable with one row per trade
+    """
+    values = {}
+    for name, column in cached.columns().items():
+        if name == "id":
+            continue
+        merged = np.empty(len(trades), dtype=float)
+        merged[found] = column
+        merged[~found] = getattr(fresh, name)
+        values[name] = merged
+    return ResultTable(id=trades.id, **values)
+
+
+class ResultCache:
+    """
+    Persistent store of pricing results keyed by trade_keys, so trades whose
+    terms and market inputs have not changed since a previous run are not
+    repriced. Results live in a local SQLite file and once it holds more than
+    max_entries results the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        :param path: Path of the cache file, created if it does not exist
+        :param max_entries: Maximum number of results kept in the cache
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path)
+
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != CACHE_VERSION:
+            if version:
+                logger.info(f"Result cache {path} is out of date, clearing it")
+            self.connection.execute("DROP TABLE IF EXISTS results")
+            self.connection.execute(f"PRAGMA user_version = {CACHE_VERSION}")
+        columns = ", ".join(f"{name} REAL" for name in VALUE_COLUMNS)
+        self.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS results "
+            f"(key INTEGER PRIMARY KEY, {columns}, last_used INTEGER NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+        )
+        self.connection.execute(
+            "CREATE TEMP TABLE lookup (row INTEGER PRIMARY KEY, key INTEGER)"
+        )
+
+        # Every run gets a new stamp, evictions drop the oldest stamps first
+        last_run = self.connection.execute(
+            "SELECT MAX(last_used) FROM results"
+        ).fetchone()[0]
+        self.run = (last_run or 0) + 1
+
+    def lookup(self, trades: TradeTable, greeks: tuple[str, ...] = ()):
+        """
+        Find the cached results of a set of trades. A result only counts as a
+        hit if every requested greek was stored with it.
+        :param trades: TradeTable to look up
+        :param greeks: Names of the extra greeks to calculate, from EXTRA_GREEKS
+        :return: Tuple of the trade keys, the boolean mask of trades found and
+            the ResultTable of the found trades
+        """
+        keys = trade_keys(trades)
+        names = ("pv", "delta", "vega") + tuple(g for g in EXTRA_GREEKS if g in greeks)
+
+        self.connection.execute("DELETE FROM lookup")
+        self.connection.executemany(
+            "INSERT INTO lookup VALUES (?, ?)", enumerate(keys.tolist())
+        )
+        complete = "".join(f" AND r.{name} IS NOT NULL" for name in names)
+        rows = self.connection.execute(
+            f"SELECT l.row, {', '.join(f'r.{name}' for name in names)} "
+            f"FROM lookup l JOIN results r ON r.key = l.key{complete} ORDER BY l.row"
+        ).fetchall()
+        self.connection.execute(
+            "UPDATE results SET last_used = ? WHERE key IN (SELECT key FROM lookup)",
+            (self.run,),
+        )
+
+        values = np.array(rows, dtype=float).reshape(len(rows), len(names) + 1)
+        found = np.zeros(len(trades), dtype=bool)
+        found[values[:, 0].astype(int)] = True
+
+        hits = len(rows)
+        self.hits += hits
+        self.misses += len(trades) - hits
+        logger.debug(f"Result cache: {hits} hits, {len(trades) - hits} misses")
+
+        cached = ResultTable(
+            id=trades.id[found],
+            **{name: values[:, i + 1] for i, name in enumerate(names)},
+        )
+        return keys, found, cached
+
+    def store(self, keys: np.ndarray, results: ResultTable):
+        """
+        Save freshly priced results, keeping any greeks already stored for the
+        same key that were not calculated this time, then evict if over size
+        :param keys: Keys of the priced trades from trade_keys
+        :param results: ResultTable of the priced trades, in key order
+        """
+        n = len(results)
+        # Greeks that were not calculated are stored as NULL
+        columns = [getattr(results, name) for name in VALUE_COLUMNS]
+        rows = zip(
+            keys.tolist(),
+            *(c.tolist() if c is not None else [None] * n for c in columns),
+            [self.run] * n,
+        )
+        updates = ", ".join(
+            f"{name} = COALESCE(excluded.{name}, {name})" for name in VALUE_COLUMNS
+        )
+        self.connection.executemany(
+            f"INSERT INTO results VALUES ({', '.join('?' * (len(VALUE_COLUMNS) + 2))}) "
+            f"ON CONFLICT (key) DO UPDATE SET {updates}, last_used = excluded.last_used",
+            rows,
+        )
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        """
+        Drop the least recently used results once the cache is over max_entries
+        """
+        size = self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        excess = size - self.max_entries
+        if excess > 0:
+            self.connection.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            logger.debug(f"Evicted {excess} results from the result cache")
+
+    def close(self):
+        """
+        Report the hits and misses of the run and close the cache file
+        """
+        logger.info(
+            f"Result cache: {self.hits} hits, {self.misses} misses "
+            f"({self.misses} trades repriced)"
+        )
+        self.connection.commit()
+        self.connection.close()
+
+
+def price_cached(
+    trades: TradeTable,
+    cache: ResultCache,
+    workers: int = 1,
+    greeks: tuple[str, ...] = (),
+):
+    """
+    Price only the trades missing from the cache and combine them with the
+    cached results. The totals are reduced over the same fixed size shards as
+    price_parallel, so they match an uncached run exactly.
+
+    :param trades: TradeTable holding the whole portfolio
+    :param cache: ResultCache to read from and save the new results to
+    :param workers: Number of worker processes used for the trades not cached
+    :param greeks: Names of the extra greeks to calculate, from EXTRA_GREEKS
+    :return: Tuple of the ResultTable and the PortfolioSummary
+    """
+    keys, found, cached = cache.lookup(trades, greeks)
+    fresh, _ = price_parallel(trades.take(~found), workers=workers, greeks=greeks)
+    cache.store(keys[~found], fresh)
+
+    results = merge_results(trades, found, cached, fresh)
+    summary = reduce_summaries(
+        [
+            results.take(slice(start, start + DEFAULT_SHARD_SIZE)).summary()
+            for start in range(0, len(results), DEFAULT_SHARD_SIZE)
+        ]
+        or [results.summary()]
+    )
+    return results, summary
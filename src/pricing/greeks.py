@@ -0,0 +1,3 @@
+# Greeks that can be calculated on request on top of pv, delta and vega.
+# Kept free of imports so the command line can list them without loading numpy
+EXTRA_GREEKS = ("gamma", "theta", "rho_domestic", "rho_foreign", "vanna", "volga")
@@ -0,0 +1,129 @@
+import numpy as np
+from .black_scholes import BlackScholesFX
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Volatility bracket searched by the bisection fallback
+MIN_VOLATILITY = 1e-6
+MAX_VOLATILITY = 5.0
+
+
+def solve_implied_vol(
+    premium: np.ndarray,
+    spot: np.ndarray,
+    strike: np.ndarray,
+    domestic_rate: np.ndarray,
+    foreign_rate: np.ndarray,
+    time_to_maturity: np.ndarray,
+    is_call: np.ndarray,
+    multiplier: np.ndarray | float = 1.0,
+    initial_vol: float = 0.2,
+    tol: float = 1e-10,
+    max_iter: int = 20,
+):
+    """
+    Solve the implied volatility of every option at once.
+
+    All options are stepped together with Halley's method, using the vega and
+    volga from BlackScholesFX.calculate_greeks_batch. Options that fail to
+    converge, or step outside the volatility bracket, are finished by a
+    vectorised bisection on [MIN_VOLATILITY, MAX_VOLATILITY]. Premiums outside
+    the no-arbitrage bounds, and expired options, have no implied volatility
+    and are returned as NaN.
+
+    :param premium: Array of option premiums, in the same units as the pv output
+    :param spot: Array of spot prices
+    :param strike: Array of strikes
+    :param domestic_rate: Array of domestic interest rates
+    :param foreign_rate: Array of foreign interest rates
+    :param time_to_maturity: Array of times to maturity in years
+    :param is_call: Boolean array, True for calls and False for puts
+    :param multiplier: Notional multipliers the premiums are scaled by
+    :param initial_vol: Starting point for the Halley iteration
+    :param tol: Absolute tolerance on the unit premium
+    :param max_iter: Maximum number of Halley steps before falling back
+    :return: Array of implied volatilities
+    """
+    spot, strike, domestic_rate, foreign_rate, time_to_maturity = np.broadcast_arrays(
+        *(
+            np.asarray(a, dtype=float)
+            for a in (spot, strike, domestic_rate, foreign_rate, time_to_maturity)
+        )
+    )
+    is_call = np.broadcast_to(np.asarray(is_call, dtype=bool), spot.shape)
+    target = np.asarray(premium, dtype=float) / np.asarray(multiplier, dtype=float)
+    target = np.broadcast_to(target, spot.shape)
+
+    def unit_values(vol, rows, greeks=()):
+        return BlackScholesFX.calculate_greeks_batch(
+            spot[rows],
+            strike[rows],
+            vol,
+            domestic_rate[rows],
+            foreign_rate[rows],
+            time_to_maturity[rows],
+            is_call[rows],
+            1.0,
+            greeks=greeks,
+        )
+
+    # No-arbitrage bounds on the discounted forward payoff
+    spot_fr = spot * np.exp(-foreign_rate * time_to_maturity)
+    strike_dr = strike * np.exp(-domestic_rate * time_to_maturity)
+    lower = np.where(
+        is_call, np.maximum(spot_fr - strike_dr, 0), np.maximum(strike_dr - spot_fr, 0)
+    )
+    upper = np.where(is_call, spot_fr, strike_dr)
+    solvable = (
+        (time_to_maturity > 0)
+        & np.isfinite(target)
+        & (target > lower)
+        & (target < upper)
+    )
+
+    vol = np.full(spot.shape, np.nan)
+    vol[solvable] = initial_vol
+    active = np.flatnonzero(solvable)
+
+    for _ in range(max_iter):
+        if not active.size:
+            break
+        values = unit_values(vol[active], active, greeks=("volga",))
+        diff = values["pv"] - target[active]
+        # vega and volga are quoted per 1% vol move, convert to per unit of vol
+        first = values["vega"] * 100
+        second = values["volga"] * 1e4
+
+        converged = np.abs(diff) < tol
+        newton = diff / first
+        step = newton / (1 - 0.5 * newton * second / first)
+        step = np.where(np.isfinite(step), step, newton)
+        vol[active] = np.where(converged, vol[active], vol[active] - step)
+
+        # Drop converged options, leave diverging ones for the bisection
+        in_bracket = (vol[active] > MIN_VOLATILITY) & (vol[active] < MAX_VOLATILITY)
+        vol[active[~in_bracket]] = np.nan
+        active = active[~converged & in_bracket]
+
+    # Anything still unsolved is finished by bisection over the bracket
+    failed = np.flatnonzero(solvable & ~np.isfinite(vol))
+    if active.size or failed.size:
+        rows = np.union1d(active, failed)
+        logger.debug(f"Falling back to bisection for {rows.size} options")
+        low = np.full(rows.size, MIN_VOLATILITY)
+        high = np.full(rows.size, MAX_VOLATILITY)
+        for _ in range(100):
+            mid = 0.5 * (low + high)
+            too_high = unit_values(mid, rows)["pv"] > target[rows]
+            high = np.where(too_high, mid, high)
+            low = np.where(too_high, low, mid)
+        vol[rows] = 0.5 * (low + high)
+
+    unsolved = np.count_nonzero(~solvable)
+    if unsolved:
+        logger.warning(
+            f"{unsolved} premiums are expired or outside the no-arbitrage bounds, "
+            "no implied volatility"
+        )
+    return vol
@@ -0,0 +1,161 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from src.models import ResultTable, TradeTable
+from .black_scholes import BlackScholesFX
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATHS = 100_000
+
+# Each shard draws from its own child of the root SeedSequence, so the output
+# depends on the seed and the shard size but not on the number of workers
+DEFAULT_SHARD_SIZE = 1_000
+
+# Upper bound on paths x trades simulated in one broadcasted block
+BLOCK_ELEMENTS = 2_000_000
+
+# Trades whose Monte Carlo PV is further than this many standard errors from
+# the closed form are reported as disagreeing
+MAX_Z_SCORE = 4.0
+
+
+def simulate_shard(trades: TradeTable, paths: int, seed: np.random.SeedSequence):
+    """
+    Monte Carlo PV of each trade of a shard from simulated terminal FX rates.
+
+    Terminal spots are drawn under the Garman-Kohlhagen dynamics with
+    antithetic pairs of normals shared by every trade of the shard. The
+    discounted terminal spot, whose expectation S exp(-rf T) is known in
+    closed form, is the control variate, with its coefficient estimated per
+    trade from the same paths.
+
+    :param trades: TradeTable holding the rows of the shard
+    :param paths: Number of paths, rounded up to whole antithetic pairs
+    :param seed: SeedSequence of the shard's random stream
+    :return: Tuple of the PV and standard error arrays, scaled by notional
+    """
+    rng = np.random.default_rng(seed)
+    pairs = max(1, -(-paths // 2))
+    t = trades.time_to_maturity
+    drift = (trades.domestic_rate - trades.foreign_rate - trades.volatility**2 / 2) * t
+    median = trades.spot_price * np.exp(drift)
+    diffusion = trades.volatility * np.sqrt(t)
+    half_discount = np.exp(-trades.domestic_rate * t) / 2
+    # +1 for calls and -1 for puts, so both payoffs are max(phi (S - K), 0)
+    phi = np.where(trades.is_call, 1.0, -1.0)
+    control_mean = trades.spot_price * np.exp(-trades.foreign_rate * t)
+
+    # Running sums over the pairs of the payoff y and the centred control x.
+    # y is shifted by its first value so the sums of squares do not cancel
+    sum_y, sum_x, sum_yy, sum_xx, sum_xy = np.zeros((5, len(trades)))
+    shift = None
+    block = max(1, BLOCK_ELEMENTS // max(len(trades), 1))
+    for start in range(0, pairs, block):
+        z = rng.standard_normal((min(block, pairs - start), 1))
+        shock = np.exp(diffusion * z)
+        # The antithetic path's shock is the reciprocal, saving an exp
+        up, down = median * shock, median / shock
+        y = np.maximum(phi * (up - trades.strike), 0)
+        y += np.maximum(phi * (down - trades.strike), 0)
+        y *= half_discount
+        if shift is None:
+            shift = y[0].copy()
+        y -= shift
+        x = (up + down) * half_discount - control_mean
+        sum_y += y.sum(axis=0)
+        sum_x += x.sum(axis=0)
+        sum_yy += (y * y).sum(axis=0)
+        sum_xx += (x * x).sum(axis=0)
+        sum_xy += (x * y).sum(axis=0)
+
+    mean_y, mean_x = sum_y / pairs, sum_x / pairs
+    dof = max(pairs - 1, 1)
+    var_y = np.maximum(sum_yy - pairs * mean_y**2, 0) / dof
+    var_x = np.maximum(sum_xx - pairs * mean_x**2, 0) / dof
+    cov_xy = (sum_xy - pairs * mean_x * mean_y) / dof
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = np.where(var_x > 0, cov_xy / var_x, 0.0)
+    pv = shift + mean_y - beta * mean_x
+    variance = np.maximum(var_y - beta * cov_xy, 0) / pairs
+
+    multiplier = BlackScholesFX.get_notional_batch(
+        trades.underlying, trades.notional_currency, trades.notional, trades.spot_price
+    )
+    return pv * multiplier, np.sqrt(variance) * multiplier
+
+
+def price_monte_carlo(
+    trades: TradeTable,
+    paths: int = DEFAULT_PATHS,
+    seed: int = 0,
+    workers: int = 1,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+):
+    """
+    Monte Carlo PV and standard error of every trade, for validating the
+    closed form. Shards are simulated in a process pool with one SeedSequence
+    child each, so a run reproduces exactly for any number of workers.
+
+    :param trades: TradeTable holding the portfolio
+    :param paths: Number of paths per trade
+    :param seed: Seed of the root SeedSequence
+    :param workers: Number of worker processes, 1 simulates in this process
+    :param shard_size: Number of trades per shard
+    :return: DataFrame with id, mc_pv and std_error columns
+    """
+    shards = [
+        trades.take(slice(start, start + shard_size))
+        for start in range(0, len(trades), shard_size)
+    ] or [trades]
+    seeds = np.random.SeedSequence(seed).spawn(len(shards))
+    logger.debug(
+        f"Simulating {paths} paths for {len(trades)} trades in {len(shards)} shards"
+    )
+
+    if workers > 1 and len(shards) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as pool:
+            simulated = list(
+                pool.map(simulate_shard, shards, [paths] * len(shards), seeds)
+            )
+    else:
+        simulated = [simulate_shard(s, paths, q) for s, q in zip(shards, seeds)]
+
+    return pd.DataFrame(
+        {
+            "id": trades.id,
+            "mc_pv": np.concatenate([pv for pv, _ in simulated]),
+            "std_error": np.concatenate([error for _, error in simulated]),
+        }
+    )
+
+
+def compare_analytic(simulated: pd.DataFrame, results: ResultTable):
+    """
+    Compare Monte Carlo PVs with the closed form results of the same trades
+    :param simulated: Output of price_monte_carlo
+    :param results: ResultTable of the same trades, in the same order
+    :return: DataFrame with id, pv, mc_pv, std_error, difference and z_score,
+        z_score being the difference in standard errors (NaN when it is 0)
+    """
+    comparison = simulated.copy()
+    comparison.insert(1, "pv", results.pv)
+    comparison["difference"] = comparison["mc_pv"] - comparison["pv"]
+    error = comparison["std_error"].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        comparison["z_score"] = np.where(
+            error > 0, comparison["difference"].to_numpy() / error, np.nan
+        )
+
+    outliers = comparison[comparison["z_score"].abs() > MAX_Z_SCORE]
+    logger.info(
+        f"Monte Carlo agrees with the closed form within {MAX_Z_SCORE:g} standard "
+        f"errors for {len(comparison) - len(outliers)} of {len(comparison)} trades"
+    )
+    for row in outliers.head(10).itertuples():
+        logger.warning(
+            f"Trade {row.id}: Monte Carlo PV {row.mc_pv:.2f} +/- {row.std_error:.2f} "
+            f"vs closed form {row.pv:.2f}"
+        )
+    return comparison
@@ -0,0 +1,207 @@
+import math
+from functools import cache
+import numpy as np
+
+SQRT_2 = math.sqrt(2)
+INV_SQRT_2PI = 1 / math.sqrt(2 * math.pi)
+
+# Half of sqrt(2), below which |x| / sqrt(2) the CDF is taken from erf
+SQRT_HALF = math.sqrt(0.5)
+
+# Cephes ndtr coefficients, the algorithm behind scipy.special.ndtr, highest
+# order first. erf(z) = z T(z^2) / U(z^2) for |z| < 1, and erfc(z) =
+# exp(-z^2) P(z) / Q(z) for 1 <= z < 8 and exp(-z^2) R(z) / S(z) beyond.
+# Q, S and U have an implicit leading coefficient of 1
+ERFC_P = (
+    2.46196981473530512524e-10,
+    5.64189564831068821977e-1,
+    7.46321056442269912687e0,
+    4.86371970985681366614e1,
+    1.96520832956077098242e2,
+    5.26445194995477358631e2,
+    9.34528527171957607540e2,
+    1.02755188689515710272e3,
+    5.57535335369399327526e2,
+)
+ERFC_Q = (
+    1.32281951154744992508e1,
+    8.67072140885989742329e1,
+    3.54937778887819891062e2,
+    9.75708501743205489753e2,
+    1.82390916687909736289e3,
+    2.24633760818710981792e3,
+    1.65666309194161350182e3,
+    5.57535340817727675546e2,
+)
+ERFC_R = (
+    5.64189583547755073984e-1,
+    1.27536670759978104416e0,
+    5.01905042251180477414e0,
+    6.16021097993053585195e0,
+    7.40974269950448939160e0,
+    2.97886665372100240670e0,
+)
+ERFC_S = (
+    2.26052863220117276590e0,
+    9.39603524938001434673e0,
+    1.20489539808096656605e1,
+    1.70814450747565897222e1,
+    9.60896809063285307590e0,
+    3.36907645100081516050e0,
+)
+ERF_T = (
+    9.60497373987051638749e0,
+    9.00260197203842689217e1,
+    2.23200534594684319226e3,
+    7.00332514112805075473e3,
+    5.55923013010394962768e4,
+)
+ERF_U = (
+    3.35617141647503099647e1,
+    5.21357949780152679795e2,
+    4.59432382970980127987e3,
+    2.26290000613890934246e4,
+    4.92673942608635921086e4,
+)
+
+# Numeric modes of the pricing kernels: "exact" evaluates N(x) to machine
+# precision, "fast" uses the rational approximation below in float64 and
+# "float32" uses it in single precision
+PRECISIONS = ("exact", "fast", "float32")
+
+# Chebyshev fit of log(erfc(z) / t) + z^2 in t = 1 / (1 + z / 2), lowest order
+# first (Numerical Recipes, erfcc). Its relative error is below 1.2e-7 for
+# every z, so both tails of N(x) keep their relative accuracy
+ERFC_COEFFICIENTS = (
+    -1.26551223,
+    1.00002368,
+    0.37409196,
+    0.09678418,
+    -0.18628806,
+    0.27886807,
+    -1.13520398,
+    1.48851587,
+    -0.82215223,
+    0.17087277,
+)
+
+
+def polevl(x: np.ndarray, coefficients, leading: bool = False):
+    """
+    Evaluate a polynomial by Horner's rule
+    :param x: Array of points
+    :param coefficients: Coefficients, highest order first
+    :param leading: Whether the polynomial has an implicit leading 1
+    :return: Array of the polynomial's values
+    """
+    result = np.ones_like(x) if leading else np.full_like(x, coefficients[0])
+    for coefficient in coefficients if leading else coefficients[1:]:
+        result = result * x + coefficient
+    return result
+
+
+def exp_neg_square(z: np.ndarray):
+    """
+    exp(-z^2) without the rounding error of squaring z, which would cost
+    z^2 times machine precision far in the tail. z is split into a multiple
+    of 1/128, whose square is exact, and a small remainder
+    :param z: Array of non-negative values
+    :return: Array of exp(-z^2)
+    """
+    m = np.round(z * 128) / 128
+    f = z - m
+    return np.exp(-m * m) * np.exp(-(2 * m * f + f * f))
+
+
+def ndtr(x: np.ndarray):
+    """
+    NumPy port of the Cephes ndtr used by scipy.special.ndtr, for when scipy
+    is not installed. Rational approximations of erf and erfc keep every
+    value, including both tails, within a few ulps of the exact CDF.
+    :param x: Float array
+    :return: Array of N(x)
+    """
+    x = np.asarray(x, dtype=float)
+    scaled = x * SQRT_HALF
+    z = np.abs(scaled)
+
+    with np.errstate(invalid="ignore"):
+        # erf of x / sqrt(2), and of |x| / sqrt(2) below 1 where erfc = 1 - erf
+        z2 = z * z
+        erf = z * polevl(z2, ERF_T) / polevl(z2, ERF_U, True)
+
+        # erfc of |x| / sqrt(2) from 1 up, NaN for infinite x
+        near = polevl(z, ERFC_P) / polevl(z, ERFC_Q, True)
+        far = polevl(z, ERFC_R) / polevl(z, ERFC_S, True)
+        erfc = exp_neg_square(z) * np.where(z < 8, near, far)
+
+    # N(-|x|) is half of erfc, which is 0 for infinite x
+    tail = 0.5 * np.where(z < 1, 1 - erf, np.where(np.isinf(z), 0.0, erfc))
+    central = 0.5 + 0.5 * np.copysign(erf, x)
+    return np.where(z < SQRT_HALF, central, np.where(x > 0, 1 - tail, tail))
+
+
+@cache
+def _ndtr():
+    """
+    scipy.special.ndtr when scipy is installed, imported on first use,
+    otherwise the NumPy port of the same algorithm
+    :return: Function evaluating N(x) on an array
+    """
+    try:
+        from scipy.special import ndtr as scipy_ndtr
+    except ImportError:
+        return ndtr
+    return scipy_ndtr
+
+
+def norm_cdf(x):
+    """
+    Standard normal cumulative distribution function, N(x) = erfc(-x/sqrt(2))/2.
+    Arrays go through scipy.special.ndtr when scipy is installed and through
+    its NumPy port otherwise, whatever their size, so a trade's result does
+    not depend on the chunk, shard or batch it is priced in. Scalars use
+    math.erfc. All agree with scipy.stats.norm.cdf to 1e-13 relative, even
+    far into the tails.
+    :param x: Scalar or array
+    :return: N(x), a float for scalar input and an array otherwise
+    """
+    if np.ndim(x) == 0:
+        return 0.5 * math.erfc(-float(x) / SQRT_2)
+    return _ndtr()(np.asarray(x, dtype=float))
+
+
+def norm_pdf(x):
+    """
+    Standard normal probability density function, n(x) = exp(-x^2/2)/sqrt(2 pi)
+    :param x: Scalar or array
+    :return: n(x)
+    """
+    return np.exp(-(x**2) / 2) * INV_SQRT_2PI
+
+
+def norm_cdf_fast(x):
+    """
+    Standard normal CDF from the ERFC_COEFFICIENTS rational approximation,
+    in the dtype of the input array so float32 input is evaluated in float32.
+    Both N(x) and N(-x) come from one evaluation of the tail, each with its
+    own relative accuracy: about 1e-7 in float64 and 2e-7 absolute in float32.
+    :param x: Float array
+    :return: Tuple of the arrays N(x) and N(-x)
+    """
+    x = np.asarray(x)
+    if x.dtype != np.float32:
+        x = x.astype(float)
+    z = np.abs(x) / SQRT_2
+    t = 1 / (1 + z / 2)
+    poly = np.full_like(x, ERFC_COEFFICIENTS[-1])
+    for coefficient in ERFC_COEFFICIENTS[-2::-1]:
+        poly *= t
+        poly += coefficient
+    poly -= z * z
+    # N(-|x|), the lower tail
+    tail = np.exp(poly, out=poly)
+    tail *= t / 2
+    body = 1 - tail
+    negative = x < 0
+    return np.where(negative, tail, body), np.where(negative, body, tail)
@@ -0,0 +1,83 @@
+from concurrent.futures import ProcessPoolExecutor
+from src.models import PortfolioSummary, ResultTable, TradeTable
+from .black_scholes import BlackScholesFX
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Shards have a fixed size so the summation order, and therefore the output,
+# does not depend on how many workers are used
+DEFAULT_SHARD_SIZE = 50_000
+
+
+def price_shard(
+    trades: TradeTable, greeks: tuple[str, ...] = (), precision: str = "exact"
+):
+    """
+    Price one shard of the portfolio and total it
+    :param trades: TradeTable holding the rows of the shard
+    :param greeks: Names of the extra greeks to calculate, from EXTRA_GREEKS
+    :param precision: Numeric mode of the pricing kernels, from PRECISIONS
+    :return: Tuple of the shard's ResultTable and its partial PortfolioSummary
+    """
+    results = BlackScholesFX.price_table(trades, greeks=greeks, precision=precision)
+    return results, results.summary()
+
+
+def reduce_summaries(partials: list[PortfolioSummary]):
+    """
+    Combine shard level summaries into the portfolio totals, in shard order
+    :param partials: Partial summaries in the order the shards were cut
+    :return: PortfolioSummary for the whole portfolio
+    """
+    totals = {"total_pv": 0.0, "total_delta": 0.0, "total_vega": 0.0}
+    num_of_trades = 0
+    for partial in partials:
+        # Only the totals populated in the partials (i.e. requested greeks) are summed
+        for name, value in partial.model_dump(exclude_none=True).items():
+            if name != "num_of_trades":
+                totals[name] = totals.get(name, 0.0) + value
+        num_of_trades += partial.num_of_trades
+    return PortfolioSummary(**totals, num_of_trades=num_of_trades)
+
+
+def price_parallel(
+    trades: TradeTable,
+    workers: int = 1,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    greeks: tuple[str, ...] = (),
+    precision: str = "exact",
+):
+    """
+    Price the portfolio in fixed size shards spread over a process pool.
+    The shards are pickled to the workers and the results gathered in order,
+    so the output is identical for any number of workers.
+
+    :param trades: TradeTable holding the whole portfolio
+    :param workers: Number of worker processes, 1 prices in this process
+    :param shard_size: Number of trades per shard
+    :param greeks: Names of the extra greeks to calculate, from EXTRA_GREEKS
+    :param precision: Numeric mode of the pricing kernels, from PRECISIONS
+    :return: Tuple of the ResultTable and the PortfolioSummary
+    """
+    shards = [
+        trades.take(slice(start, start + shard_size))
+        for start in range(0, len(trades), shard_size)
+    ] or [trades]
+    logger.debug(f"Pricing {len(shards)} shards with {workers} workers")
+
+    if workers > 1 and len(shards) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards))) as pool:
+            priced = list(
+                pool.map(
+                    price_shard,
+                    shards,
+                    [greeks] * len(shards),
+                    [precision] * len(shards),
+                )
+            )
+    else:
+        priced = [price_shard(shard, greeks, precision) for shard in shards]
+
+    results = ResultTable.concat([r for r, _ in priced])
+    return results, reduce_summaries([p for _, p in priced])
@@ -0,0 +1,292 @@
+import math
+from dataclasses import fields
+import numpy as np
+import pandas as pd
+from src.models import PortfolioSummary, ResultTable, TradeTable
+from .aggregation import group_sums, two_sum
+from .black_scholes import BlackScholesFX
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rows allocated the first time a portfolio grows, doubled from then on
+INITIAL_CAPACITY = 1024
+
+
+def accumulate(groups: dict, codes: np.ndarray, labels, values: np.ndarray, counts):
+    """
+    Add signed rows of results into running totals. The rows of each group
+    are summed with group_sums and added to the group's sums with TwoSum, so
+    a trade added and later removed leaves the totals as they were.
+    :param groups: Dictionary of label to (sums, compensations, number of
+        trades), updated with new tuples so that copies of it are not changed
+    :param codes: Group index of every row
+    :param labels: Label of each group index
+    :param values: Array of shape (rows, columns), negated for rows removed
+    :param counts: +1 for every row added and -1 for every row removed
+    """
+    parts = np.stack(
+        [group_sums(codes, column, len(labels)) for column in values.T], 1
+    )
+    counts = np.bincount(codes, counts, len(labels)).astype(int)
+    for i, label in enumerate(labels):
+        sums, compensation, count = groups.get(
+            label, (np.zeros(values.shape[1]), np.zeros(values.shape[1]), 0)
+        )
+        for part in parts[:, :, i]:
+            sums, error = two_sum(sums, part)
+            compensation = compensation + error
+        count += counts[i]
+        if count:
+            groups[label] = (sums, compensation, count)
+        else:
+            groups.pop(label, None)
+
+
+class Portfolio:
+    """
+    Priced book held in memory for what-if and intraday updates. Trades and
+    their results sit in preallocated rows found through a dictionary keyed by
+    trade id, and running totals are kept for the whole book and per currency
+    pair. Adding, amending or removing trades prices only those trades and
+    updates the totals by their results, so the cost does not depend on the
+    size of the book. reconcile() checks the totals against an exactly
+    rounded recompute over every trade.
+    """
+
+    def __init__(self, greeks: tuple[str, ...] = ()):
+        """
+        :param greeks: Names of the extra greeks calculated for the book
+        """
+        self.greeks = greeks
+        self.columns = None
+        self.rows = {}
+        self.free = []
+        self.trades = None
+        self.values = None
+        # None holds the totals of the whole book, pairs those of their trades
+        self.groups = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, trade_id):
+        return trade_id in self.rows
+
+    def load(self, trades: TradeTable, results: ResultTable):
+        """
+        Replace the book with trades priced elsewhere, e.g. by price_parallel
+        :param trades: TradeTable of the book
+        :param results: ResultTable of the same trades, in trade order
+        """
+        self.columns = [name for name in results.columns() if name != "id"]
+        self.rows, self.free, self.groups = {}, [], {}
+        self.trades = self.values = None
+        self.update(trades, results=results)
+
+    def price(self, trades: TradeTable):
+        """
+        Price trades with the greeks of the book
+        :param trades: TradeTable of the trades
+        :return: Array of shape (trades, columns) of their results
+        """
+        results = BlackScholesFX.price_table(trades, greeks=self.greeks).columns()
+        if self.columns is None:
+            self.columns = [name for name in results if name != "id"]
+        return np.column_stack([results[name] for name in self.columns])
+
+    @staticmethod
+    def removals(remove):
+        """
+        Check the ids of the trades to remove and drop repeats
+        :param remove: Ids of the trades removed
+        :return: List of the distinct ids, in the order given
+        """
+        invalid = [trade_id for trade_id in remove if not isinstance(trade_id, str)]
+        if invalid:
+            listed = ", ".join(map(repr, invalid))
+            raise ValueError(f"Trade ids to remove must be strings, got {listed}")
+        return list(dict.fromkeys(remove))
+
+    def changes(self, trades: TradeTable, remove=(), results: ResultTable = None):
+        """
+        Results of a change to the book, without applying it. Trades whose id
+        is already in the book replace it.
+        :param trades: TradeTable of the trades added or amended
+        :param remove: Ids of the trades removed
+        :param results: ResultTable of the trades if already priced
+        :return: Tuple of the rows of the book leaving it and the results of
+            the trades added, as an array of shape (trades, columns)
+        """
+        unknown = [trade_id for trade_id in remove if trade_id not in self.rows]
+        if unknown:
+            raise ValueError(f"Unknown trade ids {', '.join(map(str, unknown))}")
+        ids = pd.Index(trades.id)
+        if not ids.is_unique:
+            duplicated = sorted(set(ids[ids.duplicated()]))
+            raise ValueError(f"Duplicate trade ids {', '.join(map(str, duplicated))}")
+        # Amended trades leave the book before their new terms come in
+        leaving = remove + [i for i in trades.id if i in self.rows and i not in remove]
+        rows = np.array([self.rows[trade_id] for trade_id in leaving], dtype=int)
+        if results is None:
+            added = self.price(trades)
+        else:
+            columns = results.columns()
+            if self.columns is None:
+                self.columns = [name for name in columns if name != "id"]
+            added = np.column_stack([columns[name] for name in self.columns])
+        return rows, added.reshape(len(trades), len(self.columns))
+
+    def apply_totals(self, groups: dict, trades: TradeTable, rows, added):
+        """
+        Move running totals by the results leaving and joining the book
+        :param groups: Totals to update, self.groups or a copy of it
+        :param trades: TradeTable of the trades joining
+        :param rows: Rows of the book leaving it
+        :param added: Results of the trades joining
+        """
+        values = np.concatenate([added, -self.values[rows]])
+        counts = np.r_[np.ones(len(added)), -np.ones(len(rows))]
+        pairs = np.concatenate([trades.underlying, self.trades.underlying[rows]])
+        codes, labels = pd.factorize(pairs.astype(object))
+        accumulate(groups, np.zeros(len(values), dtype=int), [None], values, counts)
+        accumulate(groups, codes, list(labels), values, counts)
+
+    def what_if(self, trades: TradeTable, remove=()):
+        """
+        Totals of the book with trades added, amended and removed, leaving the
+        book unchanged. Only the trades added are priced.
+        :param trades: TradeTable of the trades added or amended
+        :param remove: Ids of the trades removed
+        :return: Tuple of the PortfolioSummary of the changed book and a
+            dictionary of currency pair to the PortfolioSummary of its trades
+        """
+        rows, added = self.changes(trades, self.removals(remove))
+        groups = dict(self.groups)
+        self.apply_totals(groups, trades, rows, added)
+        return self.summaries(groups)
+
+    def update(self, trades: TradeTable, remove=(), results: ResultTable = None):
+        """
+        Add, amend and remove trades, pricing only the trades added
+        :param trades: TradeTable of the trades added or amended
+        :param remove: Ids of the trades removed
+        :param results: ResultTable of the trades if already priced
+        """
+        remove = self.removals(remove)
+        rows, added = self.changes(trades, remove, results)
+        if self.trades is None:
+            self.trades = trades.take(slice(0, 0))
+            self.values = np.zeros((0, len(self.columns)))
+        self.apply_totals(self.groups, trades, rows, added)
+
+        # Removed rows are freed, amended trades keep theirs
+        amended = set(trades.id)
+        for trade_id in remove:
+            if trade_id not in amended:
+                self.free.append(self.rows.pop(trade_id))
+        fresh = [trade_id for trade_id in trades.id if trade_id not in self.rows]
+        if len(fresh) > len(self.free):
+            self.grow(len(self.rows) + len(fresh))
+        for trade_id in fresh:
+            self.rows[trade_id] = self.free.pop()
+        target = np.array([self.rows[trade_id] for trade_id in trades.id], dtype=int)
+        for f in fields(TradeTable):
+            getattr(self.trades, f.name)[target] = getattr(trades, f.name)
+        self.values[target] = added
+        logger.debug(
+            f"Updated book with {len(trades)} trades and {len(remove)} removals, "
+            f"{len(self)} trades held"
+        )
+
+    def grow(self, size: int):
+        """
+        Double the rows allocated until the book fits, in amortised O(1) per trade
+        :param size: Number of rows needed
+        """
+        capacity = len(self.values)
+        new = max(capacity, INITIAL_CAPACITY)
+        while new < size:
+            new *= 2
+        extra = new - capacity
+        for f in fields(TradeTable):
+            column = getattr(self.trades, f.name)
+            setattr(
+                self.trades,
+                f.name,
+                np.concatenate([column, np.zeros(extra, dtype=column.dtype)]),
+            )
+        self.values = np.concatenate([self.values, np.zeros((extra, len(self.columns)))])
+        # Popped from the end, so new rows are used in order
+        self.free = list(range(new - 1, capacity - 1, -1)) + self.free
+
+    def book(self):
+        """
+        Trades and results of the book, in the order the trades were first added
+        :return: Tuple of the TradeTable and ResultTable
+        """
+        rows = np.fromiter(self.rows.values(), dtype=int, count=len(self.rows))
+        trades = self.trades.take(rows)
+        results = ResultTable(
+            id=trades.id,
+            **{name: self.values[rows, j] for j, name in enumerate(self.columns)},
+        )
+        return trades, results
+
+    def summaries(self, groups: dict = None):
+        """
+        Totals of the book and of each currency pair
+        :param groups: Running totals, the book's own if not given
+        :return: Tuple of the PortfolioSummary of the book and a dictionary of
+            currency pair to the PortfolioSummary of its trades
+        """
+        groups = self.groups if groups is None else groups
+
+        def summary(label):
+            sums, compensation, count = groups.get(
+                label, (np.zeros(len(self.columns)), np.zeros(len(self.columns)), 0)
+            )
+            totals = {
+                f"total_{name}": float(value)
+                for name, value in zip(self.columns, sums + compensation)
+            }
+            return PortfolioSummary(**totals, num_of_trades=count)
+
+        pairs = sorted(label for label in groups if label is not None)
+        return summary(None), {pair: summary(pair) for pair in pairs}
+
+    def reconcile(self):
+        """
+        Recompute every total from the held results with exactly rounded sums
+        and reset the running totals to them
+        :return: Largest absolute difference found between a running total and
+            its recompute
+        """
+        rows = np.fromiter(self.rows.values(), dtype=int, count=len(self.rows))
+        pairs = self.trades.underlying[rows]
+        codes, labels = pd.factorize(pairs.astype(object))
+        exact = {None: (self.values[rows], len(rows))}
+        for i, label in enumerate(labels):
+            members = rows[codes == i]
+            exact[label] = (self.values[members], len(members))
+
+        drift = 0.0
+        groups = {}
+        for label, (values, count) in exact.items():
+            if not count:
+                continue
+            sums = np.array([math.fsum(column) for column in values.T])
+            if label in self.groups:
+                running, compensation, _ = self.groups[label]
+                drift = max(drift, float(np.abs(running + compensation - sums).max()))
+            else:
+                drift = max(drift, float(np.abs(sums).max()))
+            groups[label] = (sums, np.zeros(len(sums)), count)
+        for label in set(self.groups) - set(groups):
+            running, compensation, _ = self.groups[label]
+            drift = max(drift, float(np.abs(running + compensation).max()))
+        self.groups = groups
+        logger.info(
+            f"Reconciled {len(self)} trades, largest drift of a running total {drift:.3g}"
+        )
+        return drift
@@ -0,0 +1,221 @@
+from dataclasses import replace
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from src.models import TradeTable
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Delta of the wing pillars of a surface quoted as ATM, risk reversal and butterfly
+WING_DELTA = 0.25
+
+# Offsets separating the knots of consecutive slices in the sorted search keys.
+# Log strikes are shifted into [0, LOG_STRIKE_SPAN) and expiries must be below
+# EXPIRY_SPAN years, so one searchsorted finds the segment of every trade
+LOG_STRIKE_SPAN = 64.0
+EXPIRY_SPAN = 1000.0
+
+
+class VolSurface:
+    """
+    Implied volatility surfaces per currency pair on a grid of expiries and
+    strikes. The grid is turned into interpolation coefficients once: each
+    expiry slice is piecewise linear in log strike with flat wings, and
+    expiries are joined by linear interpolation in total variance at the same
+    strike, with flat vols outside the quoted expiries. The vols of a whole
+    portfolio are then evaluated with two searchsorted calls, so the same
+    surface serves every scenario run without repeating the setup.
+    """
+
+    def __init__(self, underlying, expiry, strike, vol):
+        """
+        :param underlying: Currency pair of each pillar
+        :param expiry: Expiry in years of each pillar
+        :param strike: Strike of each pillar
+        :param vol: Implied volatility of each pillar
+        """
+        expiry = np.asarray(expiry, dtype=float)
+        strike = np.asarray(strike, dtype=float)
+        vol = np.asarray(vol, dtype=float)
+        if not ((expiry > 0) & (expiry < EXPIRY_SPAN)).all():
+            raise ValueError(f"Surface expiries must be in (0, {EXPIRY_SPAN:g}) years")
+        log_strike = np.log(strike) + LOG_STRIKE_SPAN / 2
+        if not ((log_strike > 0) & (log_strike < LOG_STRIKE_SPAN)).all():
+            raise ValueError("Surface strikes must be positive and finite")
+        if not (vol > 0).all():
+            raise ValueError("Surface vols must be positive")
+
+        pair_codes, pairs = pd.factorize(np.asarray(underlying, dtype=object))
+        self.index = pd.Index(pairs)
+
+        # Slices are the distinct (pair, expiry) rows of the grid, in key order
+        expiry_keys = pair_codes * EXPIRY_SPAN + expiry
+        self.slice_keys, first_rows, slice_ids = np.unique(
+            expiry_keys, return_index=True, return_inverse=True
+        )
+        self.slice_pair = pair_codes[first_rows]
+        self.slice_expiry = expiry[first_rows]
+        self.pair_slices = np.searchsorted(self.slice_pair, np.arange(len(pairs) + 1))
+
+        # Knots of every slice in one sorted array, keyed by slice then log strike
+        knot_keys = slice_ids * LOG_STRIKE_SPAN + log_strike
+        order = np.argsort(knot_keys, kind="stable")
+        self.knot_keys = knot_keys[order]
+        if (np.diff(self.knot_keys) == 0).any():
+            raise ValueError("Surface has duplicate strikes in an expiry slice")
+        slice_ids, x, v = slice_ids[order], log_strike[order], vol[order]
+
+        # Each slice of m knots has m + 1 segments: a flat left wing, the m - 1
+        # linear pieces and a flat right wing. vol = intercept + slope * x
+        n_slices = len(self.slice_keys)
+        segment = np.arange(len(x)) + slice_ids
+        self.slope = np.zeros(len(x) + n_slices)
+        self.intercept = np.zeros(len(x) + n_slices)
+        self.intercept[segment] = v
+        # The right wing of each slice repeats its last knot
+        last = np.r_[np.flatnonzero(np.diff(slice_ids)), len(x) - 1]
+        self.intercept[segment[last] + 1] = v[last]
+        inner = np.flatnonzero(np.diff(slice_ids) == 0)
+        slope = (v[inner + 1] - v[inner]) / (x[inner + 1] - x[inner])
+        self.slope[segment[inner] + 1] = slope
+        self.intercept[segment[inner] + 1] = v[inner] - slope * x[inner]
+
+        logger.info(
+            f"Built vol surface for {len(pairs)} currency pairs, {n_slices} "
+            f"expiries and {len(x)} pillars"
+        )
+
+    @classmethod
+    def from_quotes(cls, underlying, expiry, atm, risk_reversal, butterfly, market):
+        """
+        Build a surface from ATM, 25 delta risk reversal and butterfly quotes.
+        The three pillars of each expiry are the delta neutral ATM strike and
+        the 25 delta call and put strikes, using forward deltas without premium
+        adjustment and the smile strangle approximation for the wing vols.
+        :param underlying: Currency pair of each quote
+        :param expiry: Expiry in years of each quote
+        :param atm: ATM volatility
+        :param risk_reversal: 25 delta call vol minus put vol
+        :param butterfly: Average 25 delta wing vol minus the ATM vol
+        :param market: MarketData with the spot and rates of every pair, used
+            to turn the deltas into strikes
+        :return: VolSurface with three pillars per expiry
+        """
+        underlying = np.asarray(underlying, dtype=object)
+        expiry = np.asarray(expiry, dtype=float)
+        atm = np.asarray(atm, dtype=float)
+        risk_reversal = np.asarray(risk_reversal, dtype=float)
+        butterfly = np.asarray(butterfly, dtype=float)
+
+        codes = market.codes(underlying)
+        if (codes < 0).any():
+            pairs = sorted(set(underlying[codes < 0]))
+            raise ValueError(f"No market data to place quotes of {', '.join(pairs)}")
+        forward = market.spot_price[codes] * np.exp(
+            (market.domestic_rate[codes] - market.foreign_rate[codes]) * expiry
+        )
+        call_vol = atm + butterfly + risk_reversal / 2
+        put_vol = atm + butterfly - risk_reversal / 2
+        root_t = np.sqrt(expiry)
+        # A forward call delta of N(d1) = WING_DELTA puts d1 at its quantile
+        d1 = NormalDist().inv_cdf(WING_DELTA)
+
+        def strike(vol, d1):
+            return forward * np.exp(-d1 * vol * root_t + vol**2 * expiry / 2)
+
+        return cls(
+            np.tile(underlying, 3),
+            np.tile(expiry, 3),
+            np.concatenate(
+                [strike(atm, 0.0), strike(call_vol, d1), strike(put_vol, -d1)]
+            ),
+            np.concatenate([atm, call_vol, put_vol]),
+        )
+
+    def vols(self, underlying, strike, time_to_maturity, default=None):
+        """
+        Interpolate the surface for every trade in one vectorised pass
+        :param underlying: Currency pair of each trade
+        :param strike: Strike of each trade
+        :param time_to_maturity: Time to maturity in years of each trade
+        :param default: Vols used for pairs without a surface, NaN if not given
+        :return: Float array with one vol per trade
+        """
+        strike = np.asarray(strike, dtype=float)
+        t = np.asarray(time_to_maturity, dtype=float)
+        codes = self.index.get_indexer(np.asarray(underlying, dtype=object))
+        known = (codes >= 0) & (strike > 0) & np.isfinite(t)
+        pair = np.where(known, codes, 0)
+
+        # Bracketing slices of each trade's expiry, clipped to its pair's slices
+        first = self.pair_slices[pair]
+        last = self.pair_slices[pair + 1] - 1
+        hi = np.searchsorted(self.slice_keys, pair * EXPIRY_SPAN + t, side="left")
+        hi = np.clip(hi, first, last)
+        lo = np.clip(hi - 1, first, last)
+
+        x = np.log(np.where(known, strike, 1.0)) + LOG_STRIKE_SPAN / 2
+        vol_lo = self.slice_vol(lo, x)
+        vol_hi = self.slice_vol(hi, x)
+
+        t_lo, t_hi = self.slice_expiry[lo], self.slice_expiry[hi]
+        t_eval = np.clip(t, t_lo, t_hi)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            weight = np.where(hi > lo, (t_eval - t_lo) / (t_hi - t_lo), 0.0)
+            variance = (1 - weight) * vol_lo**2 * t_lo + weight * vol_hi**2 * t_hi
+            vols = np.where(hi > lo, np.sqrt(variance / t_eval), vol_lo)
+
+        fallback = np.nan if default is None else np.asarray(default, dtype=float)
+        return np.where(known, vols, fallback)
+
+    def slice_vol(self, slices: np.ndarray, x: np.ndarray):
+        """
+        Vol of the given expiry slices at shifted log strikes
+        :param slices: Slice of each point
+        :param x: Log strike plus LOG_STRIKE_SPAN / 2 of each point
+        :return: Piecewise linear vols with flat wings
+        """
+        position = np.searchsorted(
+            self.knot_keys, slices * LOG_STRIKE_SPAN + x, side="right"
+        )
+        segment = position + slices
+        return self.intercept[segment] + self.slope[segment] * x
+
+    def join(self, df: pd.DataFrame):
+        """
+        Fill the volatility column of a trade frame, renamed to model
+        attributes, from the surface. Pairs without a surface keep the frame's
+        own vols.
+        :param df: DataFrame with underlying, strike and time_to_maturity columns
+        :return: Copy of the DataFrame with the volatility column filled
+        """
+        if not {"underlying", "strike", "time_to_maturity"} <= set(df.columns):
+            return df
+        default = None
+        if "volatility" in df.columns:
+            default = pd.to_numeric(df["volatility"], errors="coerce").to_numpy(float)
+        df = df.copy()
+        df["volatility"] = self.vols(
+            df["underlying"].to_numpy(dtype=object),
+            pd.to_numeric(df["strike"], errors="coerce").to_numpy(float),
+            pd.to_numeric(df["time_to_maturity"], errors="coerce").to_numpy(float),
+            default,
+        )
+        return df
+
+    def apply(self, trades: TradeTable):
+        """
+        Revalue the vols of trades already loaded, e.g. after a new surface
+        :param trades: TradeTable of the book
+        :return: TradeTable with the volatility column taken from the surface
+        """
+        return replace(
+            trades,
+            volatility=self.vols(
+                trades.underlying,
+                trades.strike,
+                trades.time_to_maturity,
+                trades.volatility,
+            ),
+        )
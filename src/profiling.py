@@ -0,0 +1,141 @@
+import cProfile
+import json
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far
+    :return: Peak RSS in MB, or None where the resource module is not available
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def metrics_path(output_path: str):
+    """
+    Path of the metrics file written next to the output
+    :param output_path: Path of the results file
+    :return: Path with "_metrics.json" in place of the extension
+    """
+    path = Path(output_path)
+    return str(path.with_name(f"{path.stem}_metrics.json"))
+
+
+class StageProfiler:
+    """
+    Records the wall time, CPU time, trade count and peak memory of each named
+    stage of a run, plus any counters such as rows rejected by validation.
+    A stage entered several times, e.g. once per chunk, accumulates. When
+    disabled the stages are not timed and nothing is written.
+    """
+
+    def __init__(self, enabled: bool = True, profile_path: str | None = None):
+        """
+        :param enabled: Whether to record anything at all
+        :param profile_path: Optional path the cProfile stats of the stages
+            entered with profile=True are dumped to
+        """
+        self.enabled = enabled
+        self.profile_path = profile_path
+        self.profile = cProfile.Profile() if enabled and profile_path else None
+        self.stages = {}
+        self.counters = {}
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, trades: int = 0, profile: bool = False):
+        """
+        Time a stage of the run
+        :param name: Name of the stage, e.g. "price"
+        :param trades: Number of trades processed, can also be added to the
+            yielded record's "trades" inside the block
+        :param profile: Also run the block under cProfile if a profile path is set
+        :return: Context manager yielding the stage's record
+        """
+        record = self.stages.setdefault(
+            name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "trades": 0}
+        )
+        if not self.enabled:
+            yield record
+            return
+
+        record["trades"] += trades
+        profiler = self.profile if profile else None
+        # CPU time of this thread, so stages on background threads do not overlap
+        wall, cpu = time.perf_counter(), time.thread_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record["wall_seconds"] += time.perf_counter() - wall
+            record["cpu_seconds"] += time.thread_time() - cpu
+            record["peak_rss_mb"] = peak_rss_mb()
+
+    def metrics(self):
+        """
+        Collect the stage records and counters
+        :return: Dictionary of the run's metrics
+        """
+        stages = []
+        for name, record in self.stages.items():
+            wall = record["wall_seconds"]
+            stages.append(
+                {
+                    "stage": name,
+                    **record,
+                    "trades_per_sec": (
+                        record["trades"] / wall if record["trades"] and wall else None
+                    ),
+                }
+            )
+        return {
+            "wall_seconds": time.perf_counter() - self.start,
+            "peak_rss_mb": peak_rss_mb(),
+            **self.counters,
+            "stages": stages,
+        }
+
+    def write(self, output_path: str):
+        """
+        Log each stage and write the metrics file next to the output, plus the
+        cProfile stats if requested
+        :param output_path: Path of the results file
+        """
+        if not self.enabled:
+            return
+        metrics = self.metrics()
+        for stage in metrics["stages"]:
+            rate = stage["trades_per_sec"]
+            logger.info(
+                f"Stage {stage['stage']}: {stage['wall_seconds']:.3f}s wall, "
+                f"{stage['cpu_seconds']:.3f}s CPU"
+                + (f", {rate:,.0f} trades/sec" if rate else "")
+            )
+        if "rows_rejected" in metrics:
+            logger.info(
+                f"Rejected {metrics['rows_rejected']} of {metrics['rows_read']} rows"
+            )
+
+        path = metrics_path(output_path)
+        with open(path, "w") as f:
+            json.dump(metrics, f, indent=2)
+        logger.info(f"Wrote run metrics to {path}")
+
+        if self.profile is not None:
+            self.profile.dump_stats(self.profile_path)
+            logger.info(f"Wrote pricing profile to {self.profile_path}")
@@ -0,0 +1,390 @@
+import argparse
+import asyncio
+import json
+import logging
+from http import HTTPStatus
+from pydantic import ValidationError
+from src.io.reader import FileReader
+from src.models import FXOption, TradeTable
+from src.pricing.black_scholes import EXTRA_GREEKS, BlackScholesFX
+from src.pricing.parallel import price_parallel
+from src.pricing.portfolio import Portfolio
+
+logger = logging.getLogger(__name__)
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 64 * 2**20
+
+
+class PricingService:
+    """
+    Pricing state kept warm between requests: the imports are paid once at
+    startup and a loaded portfolio stays priced in memory as a Portfolio, so
+    what-if totals and trade updates only price the trades in the request.
+    """
+
+    def __init__(self, greeks: tuple[str, ...] = ()):
+        """
+        :param greeks: Names of the extra greeks calculated for the portfolio
+        """
+        self.greeks = greeks
+        self.market = None
+        self.surface = None
+        self.portfolio = None
+
+    @staticmethod
+    def parse_trades(payload: list[dict]):
+        """
+        Validate trade payloads against the FXOption model
+        :param payload: List of dictionaries keyed by FXOption field names
+        :return: List of FXOption objects
+        """
+        if not isinstance(payload, list):
+            raise ValueError("'trades' must be a list of FXOption objects")
+        return [FXOption.model_validate(trade) for trade in payload]
+
+    def price(self, request: dict):
+        """
+        Price a batch of trades
+        :param request: {"trades": [...], "greeks": [...]} with optional greeks
+        :return: {"results": [...]} with one FXOptionResult per trade
+        """
+        greeks = request.get("greeks", [])
+        if not isinstance(greeks, list) or not all(isinstance(g, str) for g in greeks):
+            raise ValueError("'greeks' must be a list of greek names")
+        greeks = tuple(greeks)
+        unknown = sorted(set(greeks) - set(EXTRA_GREEKS))
+        if unknown:
+            raise ValueError(f"Unknown greeks {', '.join(unknown)}")
+        options = self.parse_trades(request.get("trades", []))
+        results = BlackScholesFX.calculate_greeks_and_pv_batch(options, greeks)
+        return {"results": [r.model_dump(exclude_none=True) for r in results]}
+
+    def load(self, request: dict):
+        """
+        Load and price a portfolio file, replacing any portfolio held
+        :param request: {"path": "..."} of an input file FileReader can read
+        :return: {"portfolio": {...}} with the totals of the loaded book
+        """
+        path = request.get("path")
+        if not isinstance(path, str):
+            raise ValueError("'path' of the portfolio file is required")
+        trades = FileReader.load_table(path, market=self.market, surface=self.surface)
+        results, _ = price_parallel(trades, greeks=self.greeks)
+        self.portfolio = Portfolio(self.greeks)
+        self.portfolio.load(trades, results)
+        logger.info(f"Loaded portfolio of {len(trades)} trades from {path}")
+        return self.totals({})
+
+    def load_market(self, request: dict):
+        """
+        Load a market data snapshot, and optionally vol surfaces, used for
+        every portfolio loaded after them, and reprice the portfolio held
+        against them without reading its file again
+        :param request: {"path": "...", "surface": "..."} of a market data file
+            and an optional vol surface file
+        :return: {"pairs": n} plus the repriced "portfolio" totals if one is held
+        """
+        path = request.get("path")
+        if not isinstance(path, str):
+            raise ValueError("'path' of the market data file is required")
+        surface_path = request.get("surface")
+        if surface_path is not None and not isinstance(surface_path, str):
+            raise ValueError("'surface' must be the path of a vol surface file")
+        market = FileReader.load_market(path)
+        if surface_path is not None:
+            self.surface = FileReader.load_vol_surface(surface_path, market=market)
+        self.market = market
+        response = {"pairs": len(self.market)}
+        if self.portfolio is not None:
+            trades, _ = self.portfolio.book()
+            trades = self.revalue(trades)
+            results, _ = price_parallel(trades, greeks=self.greeks)
+            self.portfolio.load(trades, results)
+            response.update(self.totals({}))
+        return response
+
+    def revalue(self, trades: TradeTable):
+        """
+        Take the market inputs of trades from the held snapshot and surface
+        :param trades: TradeTable of the trades
+        :return: TradeTable with the market columns replaced where available
+        """
+        if self.market is not None:
+            trades = self.market.apply(trades)
+        if self.surface is not None:
+            trades = self.surface.apply(trades)
+        return trades
+
+    def totals(self, request: dict):
+        """
+        Totals of the loaded portfolio
+        :param request: Unused, the request body is empty
+        :return: {"portfolio": {...}, "underlyings": {...}} PortfolioSummary of
+            the loaded book and of each currency pair
+        """
+        self.require_portfolio()
+        return self.report(self.portfolio.summaries())
+
+    @staticmethod
+    def report(summaries):
+        """
+        Response payload of portfolio totals
+        :param summaries: Tuple of the book's PortfolioSummary and a dictionary
+            of currency pair to PortfolioSummary, from Portfolio.summaries
+        :return: {"portfolio": {...}, "underlyings": {...}}
+        """
+        total, pairs = summaries
+        return {
+            "portfolio": total.model_dump(exclude_none=True),
+            "underlyings": {
+                pair: summary.model_dump(exclude_none=True)
+                for pair, summary in pairs.items()
+            },
+        }
+
+    def changes(self, request: dict):
+        """
+        Parse the trades added and removed by a request
+        :param request: {"add": [...], "remove": [...]} of FXOption payloads
+            and trade ids, both optional
+        :return: Tuple of the TradeTable of the trades added, with market
+            inputs from the held snapshot, and the list of ids removed
+        """
+        self.require_portfolio()
+        added = self.parse_trades(request.get("add", []))
+        remove = request.get("remove", [])
+        if not isinstance(remove, list):
+            raise ValueError("'remove' must be a list of trade ids")
+        return self.revalue(TradeTable.from_options(added)), remove
+
+    def what_if(self, request: dict):
+        """
+        Totals of the loaded portfolio with trades added and removed, without
+        changing it. The removed trades' results are subtracted from the held
+        totals and only the added trades are priced. Adding a trade whose id
+        is already in the book replaces it.
+        :param request: {"add": [...], "remove": [...]} of FXOption payloads
+            and trade ids, both optional
+        :return: {"portfolio": {...}, "underlyings": {...}} totals of the
+            changed book and of each currency pair
+        """
+        added, remove = self.changes(request)
+        return self.report(self.portfolio.what_if(added, remove))
+
+    def update(self, request: dict):
+        """
+        Add, amend and remove trades of the loaded portfolio, pricing only the
+        trades in the request
+        :param request: {"add": [...], "remove": [...]} of FXOption payloads
+            and trade ids, both optional
+        :return: {"portfolio": {...}, "underlyings": {...}} totals of the
+            updated book and of each currency pair
+        """
+        added, remove = self.changes(request)
+        self.portfolio.update(added, remove)
+        return self.totals({})
+
+    def reconcile(self, request: dict):
+        """
+        Recompute the totals of the loaded portfolio from every trade's results
+        :param request: Unused, the request body is empty
+        :return: {"drift": x} largest difference found in a running total,
+            plus the recomputed "portfolio" and "underlyings" totals
+        """
+        self.require_portfolio()
+        drift = self.portfolio.reconcile()
+        return {"drift": drift, **self.totals({})}
+
+    def require_portfolio(self):
+        """
+        Fail the request if no portfolio has been loaded yet
+        """
+        if self.portfolio is None:
+            raise ValueError("No portfolio loaded, POST its path to /portfolio")
+
+
+class PricingServer:
+    """
+    Minimal HTTP/1.1 JSON front end for a PricingService, one request per
+    connection. Pricing runs in a worker thread so the event loop keeps
+    accepting connections, and a lock keeps requests from seeing a
+    portfolio that is half loaded.
+    """
+
+    def __init__(self, service: PricingService):
+        """
+        :param service: PricingService answering the requests
+        """
+        self.service = service
+        self.lock = asyncio.Lock()
+        self.routes = {
+            ("POST", "/price"): service.price,
+            ("POST", "/portfolio"): service.load,
+            ("GET", "/portfolio"): service.totals,
+            ("POST", "/portfolio/what-if"): service.what_if,
+            ("POST", "/portfolio/trades"): service.update,
+            ("GET", "/portfolio/reconcile"): service.reconcile,
+            ("POST", "/market"): service.load_market,
+        }
+
+    async def dispatch(self, method: str, path: str, body: bytes):
+        """
+        Route a request to the service
+        :param method: HTTP method
+        :param path: Request path
+        :param body: Raw JSON body, may be empty
+        :return: Tuple of HTTP status and JSON response payload
+        """
+        handler = self.routes.get((method, path))
+        if handler is None:
+            return HTTPStatus.NOT_FOUND, {"error": f"No route {method} {path}"}
+        try:
+            request = json.loads(body) if body else {}
+            if not isinstance(request, dict):
+                raise ValueError("Request body must be a JSON object")
+            async with self.lock:
+                response = await asyncio.get_running_loop().run_in_executor(
+                    None, handler, request
+                )
+        except ValidationError as e:
+            return HTTPStatus.BAD_REQUEST, {
+                "error": "Invalid trade",
+                "details": json.loads(e.json()),
+            }
+        except (ValueError, OSError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            # Still answer, rather than dropping the connection unanswered
+            logger.exception(f"Failed to handle {method} {path}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {
+                "error": f"{type(e).__name__}: {e}"
+            }
+        return HTTPStatus.OK, response
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Read one HTTP request from the connection and write the response
+        :param reader: Stream of the request
+        :param writer: Stream of the response
+        """
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, path, _ = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_SIZE:
+                status, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {
+                    "error": f"Request body over {MAX_BODY_SIZE} bytes"
+                }
+            else:
+                body = await reader.readexactly(length)
+                status, payload = await self.dispatch(method, path, body)
+        except (ValueError, asyncio.IncompleteReadError):
+            status, payload = HTTPStatus.BAD_REQUEST, {"error": "Malformed request"}
+
+        logger.debug(f"{status.value} {status.phrase}")
+        content = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1")
+            + content
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 8080, unix_path: str | None = None
+    ):
+        """
+        Start listening on a TCP port or a Unix socket
+        :param host: Interface to bind, local only by default
+        :param port: TCP port, 0 picks a free one
+        :param unix_path: Listen on this Unix socket instead of TCP
+        :return: The asyncio Server
+        """
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        for sock in server.sockets:
+            logger.info(f"Pricing server listening on {sock.getsockname()}")
+        return server
+
+
+async def serve(args: argparse.Namespace):
+    """
+    Run the pricing server until it is cancelled
+    :param args: Parsed command line arguments
+    """
+    service = PricingService(greeks=args.greeks)
+    if args.market is not None:
+        service.load_market({"path": args.market, "surface": args.vol_surface})
+    elif args.vol_surface is not None:
+        service.surface = FileReader.load_vol_surface(args.vol_surface)
+    if args.portfolio is not None:
+        service.load({"path": args.portfolio})
+    server = await PricingServer(service).start(args.host, args.port, args.unix)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="FXOption Pricing server")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8080, help="TCP port")
+    parser.add_argument("--unix", help="Listen on this Unix socket instead of TCP")
+    parser.add_argument(
+        "--portfolio", help="Input file of a portfolio to load and price at startup"
+    )
+    parser.add_argument(
+        "--market", help="Market data file the portfolio is priced against"
+    )
+    parser.add_argument(
+        "--vol-surface", help="Vol surface file the portfolio is priced against"
+    )
+    parser.add_argument(
+        "--greeks",
+        help="Comma separated extra greeks held for the portfolio, or 'all'",
+    )
+    parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+    if args.greeks is None:
+        args.greeks = ()
+    elif args.greeks == "all":
+        args.greeks = EXTRA_GREEKS
+    else:
+        args.greeks = tuple(g.strip() for g in args.greeks.split(",") if g.strip())
+        unknown = sorted(set(args.greeks) - set(EXTRA_GREEKS))
+        if unknown:
+            parser.error(f"Unknown greeks {', '.join(unknown)}")
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        logger.info("Pricing server stopped")
+
+
+if __name__ == "__main__":
+    main()
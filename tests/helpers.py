@@ -0,0 +1,77 @@
+"""Sample books and market data shared by the test modules"""
+
+import numpy as np
+import pandas as pd
+from src.models import TradeTable
+
+MARKET = pd.DataFrame(
+    {
+        "Underlying": ["EUR/USD", "GBP/USD"],
+        "Spot": [1.2, 1.3],
+        "RateDomestic": [0.03, 0.02],
+        "RateForeign": [0.015, 0.01],
+        "Vol": [0.2, np.nan],
+    }
+)
+
+
+def make_frame():
+    """Small input frame with the spreadsheet column names and two bad rows"""
+    return pd.DataFrame(
+        {
+            "TradeID": ["T1", "T2", "T3", "T4"],
+            "Underlying": ["EUR/USD", "EUR/USD", "GBP/USD", "USD/JPY"],
+            "Notional": [1000000, 500000, -5, 900000],
+            "NotionalCurrency": ["USD", "EUR", "USD", "USD"],
+            "Spot": [1.1, 1.1, 1.3, 150.0],
+            "Strike": [1.12, 1.15, 1.25, 148.0],
+            "Vol": [0.15, 0.12, 0.1, 0.11],
+            "RateDomestic": [0.02, 0.02, 0.02, 0.001],
+            "RateForeign": [0.01, 0.01, 0.01, 0.05],
+            "Expiry": [0.25, 0.5, 0.75, 0.25],
+            "OptionType": ["Call", "Put", "Call", "Straddle"],
+        }
+    )
+
+
+def make_book(tmp_path, copies=25):
+    """Write a larger input file by repeating the sample frame"""
+    frame = pd.concat([make_frame()] * copies, ignore_index=True)
+    frame["TradeID"] = [f"T{i}" for i in range(len(frame))]
+    path = tmp_path / "trades.xlsx"
+    frame.to_excel(path, index=False)
+    return path
+
+
+def random_market(n=2000, seed=7):
+    """Randomised portfolio of market inputs with enough vega to pin down the vol"""
+    rng = np.random.default_rng(seed)
+    spot = rng.uniform(0.9, 1.3, n)
+    return dict(
+        spot=spot,
+        strike=spot * rng.uniform(0.9, 1.1, n),
+        domestic_rate=rng.uniform(-0.01, 0.05, n),
+        foreign_rate=rng.uniform(-0.01, 0.05, n),
+        time_to_maturity=rng.uniform(0.25, 3, n),
+        is_call=rng.random(n) < 0.5,
+        multiplier=rng.uniform(1e5, 2e6, n),
+    ), rng.uniform(0.05, 0.8, n)
+
+
+def random_book(n, seed=0):
+    """Random calls and puts on EUR/USD with notionals in both currencies"""
+    market, vol = random_market(n, seed)
+    rng = np.random.default_rng(seed)
+    return TradeTable(
+        id=np.array([f"T{i}" for i in range(n)], dtype=object),
+        is_call=market["is_call"],
+        strike=market["strike"],
+        volatility=vol,
+        time_to_maturity=market["time_to_maturity"],
+        spot_price=market["spot"],
+        domestic_rate=market["domestic_rate"],
+        foreign_rate=market["foreign_rate"],
+        underlying=np.full(n, "EUR/USD", dtype=object),
+        notional=rng.uniform(1e5, 1e7, n),
+        notional_currency=np.where(rng.random(n) < 0.5, "EUR", "USD").astype(object),
+    )
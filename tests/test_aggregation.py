@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.io.reader import FileReader
+from src.pipeline import run_streaming
+from src.pricing.aggregation import GroupedTotals, expiry_labels, group_sums
+from src.pricing.parallel import price_parallel
+from tests.helpers import make_book
+
+
+def test_grouped_totals_match_pandas_groupby(tmp_path):
+    """Totals per group should match a pandas group-by of the results"""
+    trades = FileReader.load_table(str(make_book(tmp_path)))
+    results, _ = price_parallel(trades, greeks=("gamma",))
+    grouped = GroupedTotals()
+
+    grouped.add(trades, results)
+    tables = grouped.tables()
+
+    frame = pd.DataFrame(
+        {"underlying": trades.underlying, "pv": results.pv, "gamma": results.gamma}
+    )
+    expected = frame.groupby("underlying").sum()
+    by_pair = tables["Totals by Underlying"].set_index("underlying")
+    np.testing.assert_allclose(by_pair["total_pv"], expected["pv"], rtol=1e-12)
+    np.testing.assert_allclose(by_pair["total_gamma"], expected["gamma"], rtol=1e-12)
+    assert by_pair["num_of_trades"].sum() == len(trades)
+    assert list(tables["Totals by Option Type"]["option_type"]) == ["Call", "Put"]
+
+
+def test_expiry_buckets_include_their_upper_edge():
+    """A trade expiring exactly on an edge belongs to the bucket below it"""
+    grouped = GroupedTotals(("expiry",), expiry_edges=(0.25, 1.0))
+    trades = type("Trades", (), {"time_to_maturity": np.array([0.1, 0.25, 0.5, 2])})
+
+    codes, labels = grouped.codes(trades, "expiry")
+
+    assert labels == expiry_labels((0.25, 1.0)) == ["<=3M", "3M-1Y", ">1Y"]
+    assert list(codes) == [0, 0, 1, 2]
+
+
+def test_group_sums_are_compensated():
+    """Cancelling large values should not swallow the small ones"""
+    rng = np.random.default_rng(1)
+    values = np.concatenate([rng.normal(0, 1e15, 5000), rng.normal(0, 1, 5000)])
+    values = np.concatenate([values, -values[:5000]])
+    codes = rng.integers(0, 3, len(values))
+    codes[10000:] = codes[:5000]
+
+    parts = group_sums(codes, values, 3)
+
+    exact = [math.fsum(values[codes == g]) for g in range(3)]
+    np.testing.assert_allclose(parts.sum(axis=0), exact, rtol=1e-14)
+    assert np.bincount(codes, values, 3) != pytest.approx(exact, rel=1e-3)
+
+
+def test_streaming_grouped_totals_match_in_memory(tmp_path):
+    """Chunked accumulation should give the same tables as one pass"""
+    path = make_book(tmp_path)
+    output = tmp_path / "output.csv"
+    trades = FileReader.load_table(str(path))
+    results, _ = price_parallel(trades)
+    in_memory = GroupedTotals()
+    in_memory.add(trades, results)
+
+    run_streaming(str(path), str(output), chunk_size=7, grouped=GroupedTotals())
+
+    for name, expected in in_memory.tables().items():
+        written = pd.read_csv(tmp_path / f"output_{name.lower().replace(' ', '_')}.csv")
+        assert list(written.iloc[:, 0]) == list(expected.iloc[:, 0])
+        np.testing.assert_allclose(written["total_pv"], expected["total_pv"], rtol=1e-14)
@@ -0,0 +1,48 @@
+import json
+import sys
+
+import numpy as np
+from benchmarks.portfolio import make_portfolio
+from benchmarks.run import main, run_size
+from src.io.reader import FileReader
+
+
+def test_synthetic_portfolio_is_valid_and_reproducible(tmp_path):
+    """Every generated trade should pass validation, and the seed fixes the book"""
+    path = tmp_path / "trades.csv"
+    make_portfolio(500, seed=3).to_csv(path, index=False)
+
+    table = FileReader.load_table(str(path))
+
+    assert len(table) == 500
+    assert make_portfolio(500, seed=3).equals(make_portfolio(500, seed=3))
+    assert np.isfinite(table.volatility).all()
+
+
+def test_run_size_times_every_stage(tmp_path):
+    """Each stage should be reported with its throughput"""
+    records = run_size(200, ".csv", str(tmp_path), workers=2, max_model_trades=100)
+
+    assert [r["stage"] for r in records] == [
+        "load_table",
+        "price_table",
+        "price_parallel",
+        "aggregate_table",
+        "write_data",
+    ]
+    assert all(r["trades"] == 200 and r["seconds"] >= 0 for r in records)
+
+
+def test_benchmark_writes_json_report(tmp_path, monkeypatch):
+    """The command line should write a machine readable report per size"""
+    output = tmp_path / "bench.json"
+    monkeypatch.setattr(
+        sys, "argv", ["run", "--sizes", "50,100", "--output", str(output)]
+    )
+
+    main()
+
+    report = json.loads(output.read_text())
+    assert report["metadata"]["format"] == ".csv"
+    stages = {(r["trades"], r["stage"]) for r in report["results"]}
+    assert (50, "price_scalar") in stages and (100, "write_data") in stages
@@ -0,0 +1,106 @@
+import logging
+import sqlite3
+
+import numpy as np
+from src.io.reader import FileReader
+from src.pipeline import run_streaming
+from src.pricing.cache import CACHE_VERSION, ResultCache, price_cached, trade_keys
+from src.pricing.parallel import price_parallel
+from tests.helpers import make_book
+
+
+def test_cached_run_matches_uncached_run(tmp_path, caplog):
+    """A warm cache should give exactly the results of pricing from scratch"""
+    trades = FileReader.load_table(str(make_book(tmp_path)))
+    expected, expected_summary = price_parallel(trades, greeks=("gamma",))
+
+    cache = ResultCache(str(tmp_path / "cache.db"))
+    price_cached(trades, cache, greeks=("gamma",))
+    cache.close()
+
+    cache = ResultCache(str(tmp_path / "cache.db"))
+    with caplog.at_level(logging.INFO):
+        results, summary = price_cached(trades, cache, greeks=("gamma",))
+        cache.close()
+
+    assert "50 hits, 0 misses" in caplog.text
+    assert list(results.id) == list(expected.id)
+    np.testing.assert_array_equal(results.pv, expected.pv)
+    np.testing.assert_array_equal(results.gamma, expected.gamma)
+    assert summary == expected_summary
+
+
+def test_only_changed_trades_are_repriced(tmp_path):
+    """Trades with new market inputs or missing greeks should be cache misses"""
+    trades = FileReader.load_table(str(make_book(tmp_path)))
+    cache = ResultCache(str(tmp_path / "cache.db"))
+    price_cached(trades, cache)
+
+    trades.spot_price[:5] *= 1.01
+    _, found, _ = cache.lookup(trades)
+    assert list(np.flatnonzero(~found)) == [0, 1, 2, 3, 4]
+
+    # Results stored without vanna cannot serve a run that asks for it
+    _, found, _ = cache.lookup(trades, greeks=("vanna",))
+    assert not found.any()
+    cache.close()
+
+
+def test_trade_keys_ignore_trade_id(tmp_path):
+    """Identical terms under different trade ids should share a key"""
+    trades = FileReader.load_table(str(make_book(tmp_path)))
+
+    keys = trade_keys(trades)
+
+    # The book repeats the same two valid trades under new ids
+    assert len(set(keys.tolist())) == 2
+
+
+def test_cache_from_older_formulas_is_cleared(tmp_path, caplog):
+    """Results stored under an earlier CACHE_VERSION should not be served"""
+    trades = FileReader.load_table(str(make_book(tmp_path)))
+    cache = ResultCache(str(tmp_path / "cache.db"))
+    price_cached(trades, cache)
+    cache.close()
+    with sqlite3.connect(tmp_path / "cache.db") as connection:
+        connection.execute(f"PRAGMA user_version = {CACHE_VERSION - 1}")
+
+    with caplog.at_level(logging.INFO):
+        cache = ResultCache(str(tmp_path / "cache.db"))
+    assert "out of date" in caplog.text
+    assert not cache.lookup(trades)[1].any()
+    cache.close()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Over its size the cache should drop the results of the oldest run"""
+    trades = FileReader.load_table(str(make_book(tmp_path)))
+    old, new = trades.take(slice(0, 1)), trades.take(slice(1, 2))
+
+    cache = ResultCache(str(tmp_path / "cache.db"), max_entries=1)
+    price_cached(old, cache)
+    cache.close()
+    cache = ResultCache(str(tmp_path / "cache.db"), max_entries=1)
+    price_cached(new, cache)
+
+    assert cache.lookup(new)[1].all()
+    assert not cache.lookup(old)[1].any()
+    cache.close()
+
+
+def test_streaming_with_cache_matches_uncached(tmp_path):
+    """Streaming through a warm cache should write the same file"""
+    path = make_book(tmp_path)
+    plain = tmp_path / "plain.csv"
+    cached = tmp_path / "cached.csv"
+    run_streaming(str(path), str(plain), chunk_size=6)
+
+    for _ in range(2):
+        cache = ResultCache(str(tmp_path / "cache.db"))
+        run_streaming(str(path), str(cached), chunk_size=6, workers=2, cache=cache)
+        cache.close()
+
+    assert plain.read_bytes() == cached.read_bytes()
+    assert (tmp_path / "plain_summary.csv").read_bytes() == (
+        tmp_path / "cached_summary.csv"
+    ).read_bytes()
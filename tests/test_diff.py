@@ -0,0 +1,158 @@
+import json
+import shutil
+from dataclasses import replace
+import numpy as np
+import pandas as pd
+import pytest
+from src.diff import diff_runs
+from src.io.reader import COLUMN_MAPPING, FileReader
+from src.io.writer import FileWriter
+from src.main import diff_main
+from src.manifest import RunManifest, manifest_path
+from src.pipeline import run_streaming
+from src.pricing.black_scholes import BlackScholesFX
+from tests.helpers import make_frame, random_book
+
+
+def write_run(path, results, manifest=True):
+    """Write results and their summary, with a manifest unless asked not to"""
+    FileWriter.write_data(results, results.summary(), str(path))
+    if manifest:
+        run = RunManifest({})
+        run.add(results)
+        run.write(str(path), results.summary())
+
+
+def test_manifest_checksums_do_not_depend_on_chunking(tmp_path):
+    """Streamed and in-memory runs of a book should record the same checksums"""
+    path = tmp_path / "trades.csv"
+    frame = pd.concat([make_frame()] * 5, ignore_index=True)
+    frame["TradeID"] = [f"T{i}" for i in range(len(frame))]
+    frame.to_csv(path, index=False)
+    streamed = RunManifest({"trades": str(path)}, options={"precision": "exact"})
+    summary = run_streaming(
+        str(path), str(tmp_path / "out.csv"), chunk_size=3, manifest=streamed
+    )
+    streamed.write(str(tmp_path / "out.csv"), summary, {"rows_rejected": 10})
+
+    results = BlackScholesFX.price_table(FileReader.load_table(str(path)))
+    whole = RunManifest({})
+    # Added in reverse order, the checksums are sums over the trades
+    whole.add(results.take(np.arange(len(results))[::-1]))
+
+    with open(manifest_path(str(tmp_path / "out.csv"))) as f:
+        written = json.load(f)
+    assert written["trades"] == len(results) == 10
+    assert written["rows_rejected"] == 10
+    assert written["checksum"] == whole.to_dict(summary)["checksum"]
+    assert len(written["inputs"]["trades"]["sha256"]) == 64
+    assert written["output"]["path"] == str(tmp_path / "out.csv")
+    assert written["summary"]["num_of_trades"] == 10
+
+    whole.add(replace(results.take(slice(0, 1)), pv=results.pv[:1] + 1e-9))
+    assert whole.to_dict(summary)["checksum"] != written["checksum"]
+
+
+@pytest.mark.parametrize("manifest", [True, False])
+def test_diff_matches_trades_by_id_across_chunks(tmp_path, manifest):
+    """Reordered runs should report only the changed, added and removed trades"""
+    results = BlackScholesFX.price_table(random_book(3000, seed=5))
+    old = tmp_path / "old.csv"
+    write_run(old, results, manifest)
+
+    # Shuffle, move a few results and swap some trades for new ones
+    rng = np.random.default_rng(6)
+    new_results = results.take(rng.permutation(len(results))[:-40])
+    pv = new_results.pv.copy()
+    pv[:25] += 1.0
+    pv[25:30] += 1e-8
+    new_results = replace(new_results, pv=pv)
+    added = results.take(slice(0, 15))
+    added = replace(added, id=np.array([f"N{i}" for i in range(15)], dtype=object))
+    new_results = type(results).concat([new_results, added])
+    new = tmp_path / "new.xlsx"
+    write_run(new, new_results, manifest)
+
+    changes_path = tmp_path / "changes.csv"
+    diff = diff_runs(str(old), str(new), chunk_size=500, changes_path=str(changes_path))
+
+    assert diff
+    assert diff.changed_trades == diff.changed["pv"] == 25
+    assert diff.num_added == 15 and diff.num_removed == 40
+    assert diff.compared == len(results) - 40
+    assert (diff.skipped > 0) == manifest
+    assert diff.largest["pv"] == pytest.approx(1.0)
+    changes = pd.read_csv(changes_path)
+    assert sorted(changes["id"]) == sorted(new_results.id[:25])
+    assert diff.summary_delta["num_of_trades"] == -25
+    expected = new_results.summary().total_pv - results.summary().total_pv
+    assert diff.summary_delta["total_pv"] == pytest.approx(expected)
+
+    # Within the tolerance and against itself, nothing is reported
+    same = diff_runs(str(old), str(old), chunk_size=500)
+    assert not same and same.compared == len(results)
+    assert not diff_runs(str(new), str(new), tolerance=2.0, chunk_size=700)
+
+
+def test_chunked_and_in_memory_runs_of_a_large_book_agree(tmp_path):
+    """Above the dedupe and scipy thresholds, chunking should not move a result"""
+    book = random_book(60_000, seed=11)
+    columns = {v: k for k, v in COLUMN_MAPPING.items() if hasattr(book, v)}
+    frame = pd.DataFrame({name: getattr(book, v) for v, name in columns.items()})
+    frame["OptionType"] = np.where(book.is_call, "Call", "Put")
+    path = tmp_path / "trades.csv"
+    frame.to_csv(path, index=False)
+    streamed = RunManifest({"trades": str(path)})
+    summary = run_streaming(
+        str(path), str(tmp_path / "streamed.csv"), chunk_size=7_001, manifest=streamed
+    )
+    streamed.write(str(tmp_path / "streamed.csv"), summary)
+    write_run(
+        tmp_path / "whole.csv",
+        BlackScholesFX.price_table(FileReader.load_table(str(path))),
+    )
+
+    with open(manifest_path(str(tmp_path / "whole.csv"))) as f:
+        whole = json.load(f)
+    assert streamed.to_dict(summary)["checksum"] == whole["checksum"]
+    diff = diff_runs(
+        str(tmp_path / "streamed.csv"), str(tmp_path / "whole.csv"), tolerance=0.0
+    )
+    assert not diff and diff.compared == diff.skipped == 60_000
+
+
+def test_manifest_of_another_output_is_not_trusted(tmp_path, caplog):
+    """A manifest left next to a different output should not skip any trades"""
+    results = BlackScholesFX.price_table(random_book(500, seed=7))
+    write_run(tmp_path / "old.csv", results)
+    changed = replace(results, pv=results.pv + 1.0)
+    write_run(tmp_path / "new.csv", changed)
+    # Copy the old run's manifest over the new one's, as if left behind
+    shutil.copy(
+        manifest_path(str(tmp_path / "old.csv")),
+        manifest_path(str(tmp_path / "new.csv")),
+    )
+
+    diff = diff_runs(str(tmp_path / "old.csv"), str(tmp_path / "new.csv"))
+    assert diff.changed_trades == 500 and diff.skipped == 0
+    assert "does not match" in caplog.text
+
+
+@pytest.mark.parametrize("side", ["old", "new"])
+def test_duplicate_ids_in_different_chunks_are_reported(tmp_path, capsys, side):
+    """A repeated id should stop the diff with its ids, wherever the copies are"""
+    results = BlackScholesFX.price_table(random_book(1000, seed=8))
+    ids = results.id.copy()
+    # Far apart, so the copies are read in different chunks
+    ids[900] = ids[3]
+    duplicated = replace(results, id=ids)
+    write_run(tmp_path / "old.csv", duplicated if side == "old" else results)
+    write_run(tmp_path / "new.csv", duplicated if side == "new" else results)
+
+    with pytest.raises(ValueError, match=f"{side}.csv.*: T3$"):
+        diff_runs(str(tmp_path / "old.csv"), str(tmp_path / "new.csv"), chunk_size=100)
+
+    with pytest.raises(SystemExit) as exit_info:
+        diff_main([str(tmp_path / "old.csv"), str(tmp_path / "new.csv")])
+    assert exit_info.value.code == 2
+    assert "Duplicate trade ids" in capsys.readouterr().err
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.io.formats import get_format, summary_path
+from src.io.reader import FileReader
+from src.io.writer import FileWriter
+from src.pipeline import run_streaming
+from src.pricing.black_scholes import BlackScholesFX
+from tests.helpers import make_frame
+
+
+def write_input(frame, path):
+    """Write the input frame in the format given by the file extension"""
+    if path.suffix == ".csv":
+        frame.to_csv(path, index=False)
+    elif path.suffix == ".xlsx":
+        frame.to_excel(path, index=False)
+    else:
+        FileWriter.write_frame(frame, str(path))
+
+
+def test_format_dispatch_by_extension():
+    """File extensions should map onto the supported formats"""
+    assert get_format("book.XLSX") == "excel"
+    assert get_format("book.feather") == "arrow"
+    assert summary_path("out/results.parquet") == "out/results_summary.parquet"
+    with pytest.raises(ValueError):
+        get_format("book.json")
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet", ".arrow"])
+def test_columnar_formats_load_same_trades_as_excel(tmp_path, suffix):
+    """CSV, Parquet and Arrow inputs should validate the same as Excel"""
+    if suffix != ".csv":
+        pytest.importorskip("pyarrow")
+    excel = tmp_path / "trades.xlsx"
+    other = tmp_path / f"trades{suffix}"
+    write_input(make_frame(), excel)
+    write_input(make_frame(), other)
+
+    expected = FileReader.load_table(str(excel))
+    table = FileReader.load_table(str(other))
+
+    assert list(table.id) == list(expected.id)
+    np.testing.assert_array_equal(table.strike, expected.strike)
+    chunks = list(FileReader.iter_tables(str(other), chunk_size=3))
+    assert sum(len(c) for c in chunks) == len(expected)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet", ".arrow"])
+def test_streaming_output_round_trips(tmp_path, suffix):
+    """Streaming writes to columnar formats should match the in-memory writer"""
+    if suffix != ".csv":
+        pytest.importorskip("pyarrow")
+    path = tmp_path / "trades.xlsx"
+    write_input(make_frame(), path)
+    streamed = tmp_path / f"streamed{suffix}"
+    written = tmp_path / f"written{suffix}"
+
+    summary = run_streaming(str(path), str(streamed), chunk_size=1)
+    results = BlackScholesFX.price_table(FileReader.load_table(str(path)))
+    FileWriter.write_data(results, summary, str(written))
+
+    streamed_df = FileReader.read_frame(str(streamed))
+    written_df = FileReader.read_frame(str(written))
+    pd.testing.assert_frame_equal(streamed_df, written_df)
+    summary_df = FileReader.read_frame(summary_path(str(streamed)))
+    assert summary_df["num_of_trades"][0] == 2
+
+
+def test_excel_output_splits_results_across_sheets(tmp_path, monkeypatch):
+    """Results past the Excel row limit should continue on numbered sheets"""
+    monkeypatch.setattr("src.io.writer.EXCEL_MAX_ROWS", 3)
+    path = tmp_path / "trades.xlsx"
+    frame = pd.concat([make_frame()] * 3, ignore_index=True)
+    frame["TradeID"] = [f"T{i}" for i in range(len(frame))]
+    write_input(frame, path)
+    results = BlackScholesFX.price_table(FileReader.load_table(str(path)))
+    output = tmp_path / "output.xlsx"
+
+    rejects = pd.DataFrame({"row": range(5), "reasons": ["notional.greater_than"] * 5})
+    tables = {"Rejects": rejects, "Scenario PnL": rejects.iloc[:0]}
+
+    FileWriter.write_data(
+        results.to_results(), results.summary(), str(output), tables=tables
+    )
+
+    sheets = pd.read_excel(output, sheet_name=None)
+    names = ["Individual Greeks", "Individual Greeks 2", "Individual Greeks 3"]
+    extra = ["Rejects", "Rejects 2", "Rejects 3", "Scenario PnL"]
+    assert list(sheets) == names + ["Portfolio Summary"] + extra
+    split = pd.concat([sheets[name] for name in extra[:3]], ignore_index=True)
+    pd.testing.assert_frame_equal(split, rejects)
+    assert list(sheets["Scenario PnL"].columns) == ["row", "reasons"]
+    assert all(len(sheets[name]) == 2 for name in names)
+    written = pd.concat([sheets[name] for name in names], ignore_index=True)
+    np.testing.assert_array_equal(written["id"], results.id)
+    np.testing.assert_allclose(written["pv"], results.pv)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from src.io.reader import FileReader
+from src.pricing.black_scholes import BlackScholesFX
+from src.pricing.implied_vol import solve_implied_vol
+from tests.helpers import make_frame, random_market
+
+
+def test_implied_vol_round_trips_prices():
+    """Solving the premium of a priced option should give back its vol"""
+    market, vol = random_market()
+    pv, _, _ = BlackScholesFX.price_batch(volatility=vol, **market)
+
+    implied = solve_implied_vol(pv, **market)
+
+    np.testing.assert_allclose(implied, vol, atol=1e-7)
+
+
+def test_bisection_fallback_when_halley_does_not_converge():
+    """Options left unsolved by Halley should be finished by bisection"""
+    market, vol = random_market(n=200)
+    pv, _, _ = BlackScholesFX.price_batch(volatility=vol, **market)
+
+    implied = solve_implied_vol(pv, **market, max_iter=0)
+
+    np.testing.assert_allclose(implied, vol, atol=1e-7)
+
+
+def test_premium_outside_arbitrage_bounds_has_no_vol():
+    """Premiums below intrinsic or above the discounted spot cannot be solved"""
+    market, _ = random_market(n=3)
+    premium = np.array([-1.0, 1e12, np.nan])
+
+    implied = solve_implied_vol(premium, **market)
+
+    assert np.isnan(implied).all()
+
+
+def test_reader_solves_premium_column(tmp_path):
+    """A Premium column should replace Vol with the implied volatility"""
+    frame = make_frame()
+    path = tmp_path / "trades.csv"
+    frame.to_csv(path, index=False)
+    priced = BlackScholesFX.price_table(FileReader.load_table(str(path)))
+
+    frame["Premium"] = [priced.pv[0], priced.pv[1], np.nan, np.nan]
+    frame["Vol"] = [np.nan, np.nan, 0.1, 0.11]
+    frame.to_csv(path, index=False)
+
+    table = FileReader.load_table(str(path))
+    options = FileReader.load_data(str(path))
+
+    assert list(table.id) == [o.id for o in options] == ["T1", "T2"]
+    np.testing.assert_allclose(table.volatility, [0.15, 0.12], atol=1e-8)
+    assert [o.volatility for o in options] == pytest.approx([0.15, 0.12], abs=1e-8)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.io.reader import FileReader
+from src.pricing.black_scholes import BlackScholesFX
+from src.server import PricingService
+from tests.helpers import MARKET, make_frame
+
+
+@pytest.fixture
+def market_path(tmp_path):
+    path = tmp_path / "market.csv"
+    MARKET.to_csv(path, index=False)
+    return str(path)
+
+
+def test_trades_without_market_columns_are_joined_by_pair(tmp_path, market_path):
+    """Trades should take spot, rates and vol from the snapshot of their pair"""
+    frame = make_frame()
+    frame.loc[2, "Notional"] = 700000
+    path = tmp_path / "trades.csv"
+    frame.drop(columns=["Spot", "RateDomestic", "RateForeign"]).to_csv(
+        path, index=False
+    )
+
+    market = FileReader.load_market(market_path)
+    table = FileReader.load_table(str(path), market=market)
+
+    # USD/JPY is not in the snapshot and has no spot of its own
+    assert list(table.id) == ["T1", "T2", "T3"]
+    np.testing.assert_array_equal(table.spot_price, [1.2, 1.2, 1.3])
+    np.testing.assert_array_equal(table.domestic_rate, [0.03, 0.03, 0.02])
+    # GBP/USD has no market vol, so the trade keeps its own
+    np.testing.assert_array_equal(table.volatility, [0.2, 0.2, 0.1])
+
+
+def test_market_move_reprices_loaded_trades(tmp_path, market_path):
+    """Applying a new snapshot should match loading the trades against it"""
+    path = tmp_path / "trades.csv"
+    make_frame().to_csv(path, index=False)
+    market = FileReader.load_market(market_path)
+    trades = FileReader.load_table(str(path))
+
+    moved = market.apply(trades)
+
+    expected = FileReader.load_table(str(path), market=market)
+    np.testing.assert_array_equal(moved.spot_price, expected.spot_price)
+    np.testing.assert_array_equal(moved.volatility, expected.volatility)
+    np.testing.assert_array_equal(
+        BlackScholesFX.price_table(moved).pv, BlackScholesFX.price_table(expected).pv
+    )
+
+    service = PricingService()
+    service.load({"path": str(path)})
+    response = service.load_market({"path": market_path})
+    assert response["pairs"] == 2
+    assert response["portfolio"]["total_pv"] == pytest.approx(
+        float(BlackScholesFX.price_table(expected).pv.sum()), rel=1e-12
+    )
+
+
+def test_invalid_market_data_is_rejected(tmp_path):
+    """Duplicate pairs and non-positive spots should fail the whole snapshot"""
+    path = tmp_path / "market.csv"
+    pd.concat([MARKET, MARKET.iloc[:1]]).to_csv(path, index=False)
+    with pytest.raises(ValueError, match="Duplicate market data for EUR/USD"):
+        FileReader.load_market(str(path))
+
+    MARKET.assign(Spot=[1.2, 0.0]).to_csv(path, index=False)
+    with pytest.raises(ValueError, match="GBP/USD"):
+        FileReader.load_market(str(path))
@@ -0,0 +1,42 @@
+import numpy as np
+from src.pricing.black_scholes import BlackScholesFX
+from src.pricing.monte_carlo import MAX_Z_SCORE, compare_analytic, price_monte_carlo
+from tests.helpers import random_book
+
+
+def test_monte_carlo_agrees_with_closed_form():
+    """Every trade should be within a few standard errors of the closed form"""
+    trades = random_book(200)
+    results = BlackScholesFX.price_table(trades)
+
+    simulated = price_monte_carlo(trades, paths=20_000)
+    comparison = compare_analytic(simulated, results)
+
+    assert (comparison["z_score"].abs() < MAX_Z_SCORE).all()
+    # The standard error halves with four times the paths
+    coarse = price_monte_carlo(trades, paths=5_000, seed=1)
+    ratio = simulated["std_error"] / coarse["std_error"]
+    assert 0.4 < ratio.median() < 0.6
+
+
+def test_monte_carlo_reproduces_for_any_number_of_workers():
+    """Shards draw from their own seed streams, so workers do not change the output"""
+    trades = random_book(40)
+    serial = price_monte_carlo(trades, paths=2_000, seed=7, shard_size=10)
+    pooled = price_monte_carlo(trades, paths=2_000, seed=7, shard_size=10, workers=3)
+
+    assert serial.equals(pooled)
+    other = price_monte_carlo(trades, paths=2_000, seed=8, shard_size=10)
+    assert not np.array_equal(serial["mc_pv"], other["mc_pv"])
+
+
+def test_expired_trades_are_priced_without_error():
+    """At expiry every path ends at spot, so the PV is the intrinsic value"""
+    trades = random_book(10)
+    trades.time_to_maturity[:] = 0.0
+    results = BlackScholesFX.price_table(trades)
+
+    simulated = price_monte_carlo(trades, paths=100)
+
+    np.testing.assert_allclose(simulated["mc_pv"], results.pv, rtol=1e-12)
+    np.testing.assert_array_equal(simulated["std_error"], 0.0)
@@ -0,0 +1,34 @@
+import numpy as np
+from src.io.reader import FileReader
+from src.pipeline import run_streaming
+from src.pricing.parallel import price_parallel
+from tests.helpers import make_book
+
+
+def test_parallel_results_independent_of_workers(tmp_path):
+    """Results and totals should be bit for bit identical for any worker count"""
+    trades = FileReader.load_table(str(make_book(tmp_path)))
+
+    serial, serial_summary = price_parallel(trades, workers=1, shard_size=7)
+    parallel, parallel_summary = price_parallel(trades, workers=3, shard_size=7)
+
+    assert list(parallel.id) == list(serial.id)
+    np.testing.assert_array_equal(parallel.pv, serial.pv)
+    np.testing.assert_array_equal(parallel.vega, serial.vega)
+    assert parallel_summary == serial_summary
+    assert serial_summary.num_of_trades == 50
+
+
+def test_parallel_streaming_output_is_byte_identical(tmp_path):
+    """Streaming with a process pool should write the same file as one worker"""
+    path = make_book(tmp_path)
+    one = tmp_path / "one.csv"
+    many = tmp_path / "many.csv"
+
+    run_streaming(str(path), str(one), chunk_size=6, workers=1)
+    run_streaming(str(path), str(many), chunk_size=6, workers=2)
+
+    assert one.read_bytes() == many.read_bytes()
+    assert (tmp_path / "one_summary.csv").read_bytes() == (
+        tmp_path / "many_summary.csv"
+    ).read_bytes()
@@ -0,0 +1,129 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.io.reader import FileReader
+from src.pipeline import WriteBehind, read_ahead, run_streaming
+from src.pricing.black_scholes import BlackScholesFX
+from tests.helpers import make_frame
+
+
+def test_iter_tables_chunks_cover_all_valid_trades(tmp_path):
+    """Chunks should add up to the same valid trades as a full load"""
+    path = tmp_path / "trades.xlsx"
+    make_frame().to_excel(path, index=False)
+
+    chunks = list(FileReader.iter_tables(str(path), chunk_size=3))
+
+    assert [len(c) for c in chunks] == [2, 0]
+    assert list(chunks[0].id) == list(FileReader.load_table(str(path)).id)
+
+
+def test_streaming_matches_in_memory_pipeline(tmp_path):
+    """Streaming output and totals should match pricing the whole book at once"""
+    path = tmp_path / "trades.xlsx"
+    output = tmp_path / "output.xlsx"
+    frame = pd.concat([make_frame()] * 5, ignore_index=True)
+    frame["TradeID"] = [f"T{i}" for i in range(len(frame))]
+    frame.to_excel(path, index=False)
+
+    summary = run_streaming(str(path), str(output), chunk_size=4)
+    expected = BlackScholesFX.price_table(FileReader.load_table(str(path)))
+
+    written = pd.read_excel(output, sheet_name=None)
+    assert list(written) == ["Individual Greeks", "Portfolio Summary", "Rejects"]
+    # The two bad rows of each copy of the frame, with their reason codes
+    assert len(written["Rejects"]) == 10
+    assert set(written["Rejects"]["reasons"]) == {
+        "notional.greater_than",
+        "option_type.enum",
+    }
+    greeks = written["Individual Greeks"]
+    assert list(greeks["id"]) == list(expected.id)
+    np.testing.assert_allclose(greeks["pv"], expected.pv, rtol=1e-12)
+
+    assert summary.num_of_trades == len(expected) == 10
+    assert summary.total_pv == pytest.approx(expected.pv.sum())
+    assert written["Portfolio Summary"]["total_vega"][0] == pytest.approx(
+        expected.vega.sum()
+    )
+
+
+def test_read_ahead_overlaps_with_backpressure():
+    """The producer should run ahead of the consumer by at most the queue depth"""
+    produced = []
+
+    def slow_reader():
+        for i in range(6):
+            time.sleep(0.05)
+            produced.append(i)
+            yield i
+
+    start = time.perf_counter()
+    for i in read_ahead(slow_reader(), depth=2):
+        # Queue depth plus the item the producer is holding
+        assert len(produced) - i <= 4
+        time.sleep(0.05)
+    # Reading and consuming overlap instead of taking 0.6s in sequence
+    assert time.perf_counter() - start < 0.5
+
+
+def test_overlap_stage_errors_reach_the_caller():
+    """Failures on the reader or writer threads should be raised, not lost"""
+
+    def failing_reader():
+        yield 1
+        raise OSError("disk gone")
+
+    with pytest.raises(OSError, match="disk gone"):
+        list(read_ahead(failing_reader()))
+
+    writes = WriteBehind()
+    writes.submit(lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        writes.close()
+
+
+def test_overlap_stops_the_reader_when_pricing_fails(tmp_path, monkeypatch):
+    """A failure after the read-ahead queue fills should raise, not hang"""
+    items = read_ahead(iter(range(10)), depth=2)
+    assert next(items) == 0
+    time.sleep(0.3)
+    items.close()
+
+    path = tmp_path / "trades.csv"
+    frame = pd.concat([make_frame()] * 20, ignore_index=True)
+    frame["TradeID"] = [f"T{i}" for i in range(len(frame))]
+    frame.to_csv(path, index=False)
+
+    def failing_price_shard(*args):
+        # Give the reader time to fill the queue and reach the end of the file
+        time.sleep(0.3)
+        raise RuntimeError("pricing failed")
+
+    monkeypatch.setattr("src.pipeline.price_shard", failing_price_shard)
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError, match="pricing failed"):
+        run_streaming(
+            str(path), str(tmp_path / "out.csv"), chunk_size=30, overlap=True
+        )
+    assert time.perf_counter() - start < 5
+
+
+def test_overlapped_streaming_matches_sequential(tmp_path):
+    """Overlapping the stages should not change the output"""
+    path = tmp_path / "trades.csv"
+    frame = pd.concat([make_frame()] * 20, ignore_index=True)
+    frame["TradeID"] = [f"T{i}" for i in range(len(frame))]
+    frame.to_csv(path, index=False)
+
+    sequential = run_streaming(str(path), str(tmp_path / "a.csv"), chunk_size=7)
+    overlapped = run_streaming(
+        str(path), str(tmp_path / "b.csv"), chunk_size=7, overlap=True
+    )
+
+    assert overlapped == sequential
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "a.csv"), pd.read_csv(tmp_path / "b.csv")
+    )
@@ -0,0 +1,103 @@
+import math
+from dataclasses import fields, replace
+import numpy as np
+import pytest
+from src.models import TradeTable
+from src.pricing.black_scholes import BlackScholesFX
+from src.pricing.portfolio import Portfolio
+from tests.helpers import random_book
+
+
+def book(n, seed, prefix="T"):
+    """Random book over two currency pairs with ids starting with the prefix"""
+    trades = random_book(n, seed)
+    rng = np.random.default_rng(seed)
+    return replace(
+        trades,
+        id=np.array([f"{prefix}{i}" for i in range(n)], dtype=object),
+        underlying=np.where(rng.random(n) < 0.5, "EUR/USD", "GBP/USD").astype(object),
+        notional_currency=np.full(n, "USD", dtype=object),
+    )
+
+
+def exact_totals(trades, greeks=()):
+    """Reprice the whole book and total it per pair with exactly rounded sums"""
+    results = BlackScholesFX.price_table(trades, greeks=greeks)
+    totals = {}
+    for pair in [None, "EUR/USD", "GBP/USD"]:
+        rows = slice(None) if pair is None else trades.underlying == pair
+        totals[pair] = {
+            name: math.fsum(values[rows])
+            for name, values in results.columns().items()
+            if name != "id"
+        }
+    return totals
+
+
+def test_incremental_updates_match_full_recompute():
+    """Running totals after many updates should match repricing the final book"""
+    trades = book(2000, 1)
+    portfolio = Portfolio(greeks=("gamma",))
+    portfolio.load(trades, BlackScholesFX.price_table(trades, greeks=("gamma",)))
+    rng = np.random.default_rng(2)
+    final = {trade_id: row for row, trade_id in enumerate(trades.id)}
+    held = trades
+
+    for step in range(20):
+        added = book(60, 10 + step, prefix=f"S{step}-")
+        # Half of the trades in the request amend trades already in the book
+        amend = rng.choice(list(final), 30, replace=False)
+        added.id[:30] = amend
+        remove = [i for i in rng.choice(list(final), 20, replace=False) if i not in amend]
+        portfolio.update(added, remove)
+
+        held = held.take(np.array([final[i] for i in final if i not in remove]))
+        held = held.take(~np.isin(held.id, amend))
+        held = TradeTable(
+            **{
+                f.name: np.concatenate([getattr(held, f.name), getattr(added, f.name)])
+                for f in fields(TradeTable)
+            }
+        )
+        final = {trade_id: row for row, trade_id in enumerate(held.id)}
+
+    total, pairs = portfolio.summaries()
+    expected = exact_totals(held, greeks=("gamma",))
+    assert total.num_of_trades == len(portfolio) == len(held)
+    for summary, pair in [(total, None), (pairs["EUR/USD"], "EUR/USD")]:
+        for name, value in expected[pair].items():
+            assert getattr(summary, f"total_{name}") == pytest.approx(value, rel=1e-14)
+    assert sum(p.num_of_trades for p in pairs.values()) == len(held)
+
+    drift = portfolio.reconcile()
+    assert drift <= 1e-12 * abs(expected[None]["pv"])
+    assert portfolio.summaries()[0].total_pv == expected[None]["pv"]
+    book_trades, results = portfolio.book()
+    assert sorted(book_trades.id) == sorted(held.id)
+    np.testing.assert_array_equal(
+        results.pv, BlackScholesFX.price_table(book_trades).pv
+    )
+
+
+def test_what_if_leaves_the_book_unchanged():
+    """A what-if should give the totals of the update without applying it"""
+    trades = book(500, 3)
+    portfolio = Portfolio()
+    portfolio.load(trades, BlackScholesFX.price_table(trades))
+    added = book(5, 4, prefix="N")
+    before = portfolio.summaries()
+
+    what_if = portfolio.what_if(added, remove=["T0", "T1"])
+
+    assert portfolio.summaries() == before
+    portfolio.update(added, remove=["T0", "T1"])
+    assert portfolio.summaries() == what_if
+    assert what_if[0].num_of_trades == 503
+
+    with pytest.raises(ValueError, match="Unknown trade ids T0"):
+        portfolio.what_if(added, remove=["T0"])
+    with pytest.raises(ValueError, match="Duplicate trade ids N1"):
+        portfolio.update(added.take(np.array([1, 1])))
+    with pytest.raises(ValueError, match=r"must be strings, got \{'a': 1\}, 3"):
+        portfolio.update(added, remove=[{"a": 1}, 3, "T2"])
+    assert portfolio.summaries() == what_if
@@ -1,10 +1,14 @@
+import logging
 import math
+from dataclasses import replace
 
 import pytest
 from pydantic import ValidationError
 from src.models.option import FXOption, OptionType
 from src.models.result import PortfolioSummary
-from src.pricing.black_scholes import BlackScholesFX
+from src.pricing import black_scholes
+from src.pricing.black_scholes import EXTRA_GREEKS, BlackScholesFX
+from tests.helpers import random_book
 import numpy as np
 
 
@@ -289,3 +293,233 @@ def test_at_maturity_intrinsic_value():
     assert math.isclose(result.pv, 0.1), f"PV should be 0.1, got {result.pv}"
     assert math.isclose(result.delta, 1.0), f"Delta should be 1.0, got {result.delta}"
     assert math.isclose(result.vega, 0.0), f"Vega should be 0.0, got {result.vega}"
+
+
+def test_batch_matches_scalar_pricing():
+    """Batch pricing should match the scalar path trade by trade"""
+    rng = np.random.default_rng(42)
+    options = []
+    for i in range(200):
+        options.append(
+            FXOption(
+                id=f"T{i:06d}",
+                underlying="EUR/USD",
+                notional=float(rng.uniform(1e5, 2e6)),
+                notional_currency="USD" if i % 2 else "EUR",
+                spot_price=float(rng.uniform(0.9, 1.3)),
+                strike=float(rng.uniform(0.9, 1.3)),
+                volatility=float(rng.uniform(0.05, 0.4)),
+                domestic_rate=float(rng.uniform(-0.01, 0.05)),
+                foreign_rate=float(rng.uniform(-0.01, 0.05)),
+                # Every tenth trade is expired to exercise the intrinsic branch
+                time_to_maturity=0.0 if i % 10 == 0 else float(rng.uniform(0.01, 3)),
+                option_type=OptionType.CALL if i % 3 else OptionType.PUT,
+            )
+        )
+
+    scalar = [BlackScholesFX.calculate_greeks_and_pv(o) for o in options]
+    batch = BlackScholesFX.calculate_greeks_and_pv_batch(options)
+
+    for s, b in zip(scalar, batch):
+        assert s.id == b.id
+        assert math.isclose(s.pv, b.pv, rel_tol=1e-12, abs_tol=1e-12)
+        assert math.isclose(s.delta, b.delta, rel_tol=1e-12, abs_tol=1e-12)
+        assert math.isclose(s.vega, b.vega, rel_tol=1e-12, abs_tol=1e-12)
+
+
+@pytest.mark.parametrize("option_type", [OptionType.CALL, OptionType.PUT])
+def test_extra_greeks_match_finite_differences(option_type):
+    """Extra greeks should agree with bump and reprice of the batch pricer"""
+    args = dict(
+        spot=1.1,
+        strike=1.12,
+        volatility=0.15,
+        domestic_rate=0.02,
+        foreign_rate=0.01,
+        time_to_maturity=0.75,
+        is_call=option_type == OptionType.CALL,
+        multiplier=1.0,
+    )
+
+    def value(name="pv", **bumps):
+        bumped = {k: np.array([v + bumps.get(k, 0.0)]) for k, v in args.items()}
+        bumped["is_call"] = np.array([args["is_call"]])
+        return BlackScholesFX.calculate_greeks_batch(**bumped)[name][0]
+
+    greeks = BlackScholesFX.calculate_greeks_batch(
+        **{k: np.array([v]) for k, v in args.items()}, greeks=EXTRA_GREEKS
+    )
+    h = 1e-4
+
+    gamma = (value(spot=h) - 2 * value() + value(spot=-h)) / h**2
+    theta = (value(time_to_maturity=-h) - value(time_to_maturity=h)) / (2 * h) / 365
+    rho_d = (value(domestic_rate=h) - value(domestic_rate=-h)) / (2 * h) * 0.01
+    rho_f = (value(foreign_rate=h) - value(foreign_rate=-h)) / (2 * h) * 0.01
+    vanna = (value("delta", volatility=h) - value("delta", volatility=-h)) / (2 * h)
+    volga = (value("vega", volatility=h) - value("vega", volatility=-h)) / (2 * h)
+
+    assert greeks["gamma"][0] == pytest.approx(gamma, rel=1e-4)
+    assert greeks["theta"][0] == pytest.approx(theta, rel=1e-4)
+    assert greeks["rho_domestic"][0] == pytest.approx(rho_d, rel=1e-4)
+    assert greeks["rho_foreign"][0] == pytest.approx(rho_f, rel=1e-4)
+    assert greeks["vanna"][0] == pytest.approx(vanna * 0.01, rel=1e-4)
+    assert greeks["volga"][0] == pytest.approx(volga * 0.01, rel=1e-4)
+
+
+def test_extra_greeks_zero_at_maturity():
+    """Expired trades have no sensitivity beyond intrinsic delta"""
+    option = FXOption(
+        id="MATURITY_TEST",
+        underlying="EUR/USD",
+        spot_price=1.2,
+        strike=1.1,
+        volatility=0.1,
+        domestic_rate=0.01,
+        foreign_rate=0.01,
+        time_to_maturity=0,
+        notional=1,
+        notional_currency="EUR",
+        option_type=OptionType.CALL,
+    )
+
+    result = BlackScholesFX.calculate_greeks_and_pv(option, greeks=EXTRA_GREEKS)
+
+    assert math.isclose(result.pv, 0.1)
+    for name in EXTRA_GREEKS:
+        assert getattr(result, name) == 0.0
+
+
+def test_normal_cdf_matches_erfc_and_scipy():
+    """Every normal CDF path should agree with math.erfc and with scipy"""
+    from src.pricing.normal import ndtr, norm_cdf, norm_pdf
+
+    x = np.linspace(-37, 37, 20_001)
+    expected = np.array([0.5 * math.erfc(-v / math.sqrt(2)) for v in x])
+
+    np.testing.assert_allclose(norm_cdf(x), expected, rtol=1e-12, atol=0)
+    np.testing.assert_allclose(ndtr(x), expected, rtol=1e-12, atol=0)
+    np.testing.assert_array_equal(
+        ndtr(np.array([-np.inf, 0.0, np.inf, np.nan])), [0.0, 0.5, 1.0, np.nan]
+    )
+    assert norm_cdf(0.3) == pytest.approx(0.5 * math.erfc(-0.3 / math.sqrt(2)))
+    assert norm_pdf(0.0) == pytest.approx(1 / math.sqrt(2 * math.pi))
+    # A value gets the same CDF whatever the size of the array it is in
+    for size in (1, 7, 50_000):
+        sample = x[:size]
+        np.testing.assert_array_equal(norm_cdf(sample), norm_cdf(x)[:size])
+
+    stats = pytest.importorskip("scipy.stats")
+    x = np.linspace(-12, 12, 2001)
+    np.testing.assert_allclose(norm_cdf(x), stats.norm.cdf(x), rtol=1e-13)
+    np.testing.assert_allclose(ndtr(x), stats.norm.cdf(x), rtol=1e-13)
+    np.testing.assert_allclose(norm_pdf(x), stats.norm.pdf(x), rtol=1e-14)
+
+
+def test_duplicate_contracts_are_priced_once(monkeypatch, caplog):
+    """Trades sharing contract terms should match pricing each one separately"""
+    contracts = random_book(200, seed=5)
+    rng = np.random.default_rng(5)
+    trades = contracts.take(rng.integers(0, 200, 20_000))
+    trades = replace(
+        trades,
+        id=np.array([f"T{i}" for i in range(len(trades))], dtype=object),
+        notional=rng.uniform(1e5, 1e7, len(trades)),
+    )
+    greeks = ("gamma", "volga")
+
+    with caplog.at_level(logging.INFO):
+        deduped = BlackScholesFX.price_table(trades, greeks)
+    monkeypatch.setattr(black_scholes, "pricing_keys", lambda *columns: None)
+    separate = BlackScholesFX.price_table(trades, greeks)
+
+    assert "as 200 unique contracts, a dedupe ratio of 100.0" in caplog.text
+    assert list(deduped.id) == list(trades.id)
+    for name, values in separate.columns().items():
+        if name != "id":
+            np.testing.assert_allclose(deduped.columns()[name], values, rtol=1e-14)
+
+
+def test_pricing_keys_never_merge_colliding_contracts(monkeypatch):
+    """A hash that maps every trade to one key must not merge different trades"""
+    strike = np.array([1.0, 1.1, 1.0, 1.1, 1.0])
+    codes, first = black_scholes.pricing_keys(strike, np.ones(5))
+    assert list(codes) == [0, 1, 0, 1, 0] and list(first) == [0, 1]
+    # Mostly unique books are priced without collapsing
+    assert black_scholes.pricing_keys(np.arange(5.0), np.ones(5)) is None
+
+    monkeypatch.setattr(black_scholes, "HASH_PRIME", np.uint64(0))
+    assert black_scholes.pricing_keys(strike, np.ones(5)) is None
+
+
+@pytest.mark.parametrize("copies, expected", [(1, None), (2, 25_000), (1.05, None)])
+def test_sampled_books_are_deduped_by_their_unique_fraction(copies, expected):
+    """The sample gate should accept books the full check accepts, and only those"""
+    n = 50_000
+    contracts = random_book(int(n / copies), seed=9)
+    rng = np.random.default_rng(9)
+    rows = np.resize(np.arange(len(contracts)), n)
+    trades = contracts.take(rng.permutation(rows))
+    inputs = (trades.spot_price, trades.strike, trades.volatility, trades.is_call)
+
+    keys = black_scholes.pricing_keys(*inputs)
+
+    assert (keys if keys is None else len(keys[1])) == expected
+    # Copies of a contract are sampled together
+    sampled = black_scholes.sample_contracts(inputs)
+    assert 0 < len(sampled) < n
+    copied = np.isin(trades.strike, trades.strike[sampled])
+    assert set(sampled) == set(np.flatnonzero(copied))
+
+
+@pytest.mark.parametrize("precision, bound", [("fast", 1e-6), ("float32", 5e-5)])
+def test_precision_modes_stay_within_their_error_bounds(precision, bound):
+    """Approximate kernels should stay within their documented bounds of exact"""
+    rng = np.random.default_rng(11)
+    n = 20_000
+    trades = random_book(n, seed=11)
+    trades = replace(
+        trades,
+        spot_price=rng.uniform(0.9, 1.3, n),
+        strike=rng.uniform(0.9, 1.3, n),
+        volatility=rng.uniform(0.05, 0.4, n),
+        domestic_rate=rng.uniform(-0.01, 0.05, n),
+        foreign_rate=rng.uniform(-0.01, 0.05, n),
+        # Expired, very short and long dated trades, deep in and out of the money
+        time_to_maturity=np.where(
+            np.arange(n) % 10 == 0, 0.0, rng.uniform(0.001, 5, n)
+        ),
+    )
+    exact = BlackScholesFX.price_table(trades, EXTRA_GREEKS).columns()
+    approx = BlackScholesFX.price_table(trades, EXTRA_GREEKS, precision).columns()
+
+    multiplier = BlackScholesFX.get_notional_batch(
+        trades.underlying, trades.notional_currency, trades.notional, trades.spot_price
+    )
+    scale = {"delta": multiplier, "vanna": multiplier}
+    scale["gamma"] = multiplier / trades.spot_price
+    for name in exact:
+        if name != "id":
+            error = np.abs(approx[name] - exact[name])
+            size = np.maximum(
+                scale.get(name, multiplier * trades.spot_price), np.abs(exact[name])
+            )
+            assert approx[name].dtype == np.float64
+            assert np.max(error / size) < bound, name
+
+    with pytest.raises(ValueError, match="Unknown precision"):
+        BlackScholesFX.price_table(trades, precision="float16")
+
+
+def test_fast_normal_cdf_keeps_relative_accuracy_in_the_tails():
+    """Both tails of the fast CDF should match math.erfc to 1.2e-7 relative"""
+    from src.pricing.normal import norm_cdf_fast
+
+    x = np.linspace(-30, 30, 6001)
+    expected = np.array([0.5 * math.erfc(-v / math.sqrt(2)) for v in x])
+
+    lower, upper = norm_cdf_fast(x)
+    np.testing.assert_allclose(lower, expected, rtol=1.2e-7, atol=0)
+    np.testing.assert_allclose(upper, expected[::-1], rtol=1.2e-7, atol=0)
+    single, _ = norm_cdf_fast(x.astype(np.float32))
+    assert single.dtype == np.float32
+    np.testing.assert_allclose(single, expected, rtol=0, atol=3e-7)
@@ -0,0 +1,63 @@
+import json
+
+from src.io.reader import FileReader
+from src.pipeline import run_streaming
+from src.profiling import StageProfiler, metrics_path
+from tests.helpers import make_frame
+
+
+def test_reader_counts_rejected_rows(tmp_path):
+    """Both loaders should count the rows read and rejected"""
+    path = tmp_path / "trades.csv"
+    make_frame().to_csv(path, index=False)
+    table_stats, model_stats, chunk_stats = {}, {}, {}
+
+    FileReader.load_table(str(path), stats=table_stats)
+    FileReader.load_data(str(path), stats=model_stats)
+    list(FileReader.iter_tables(str(path), chunk_size=3, stats=chunk_stats))
+
+    expected = {"rows_read": 4, "rows_rejected": 2}
+    assert table_stats == model_stats == chunk_stats == expected
+
+
+def test_repeated_stages_accumulate(tmp_path):
+    """Entering a stage once per chunk should add up its trades and time"""
+    profiler = StageProfiler()
+    for _ in range(3):
+        with profiler.stage("price", trades=10):
+            pass
+
+    metrics = profiler.metrics()
+
+    (price,) = metrics["stages"]
+    assert price["stage"] == "price" and price["trades"] == 30
+    assert price["wall_seconds"] >= 0 and price["cpu_seconds"] >= 0
+
+
+def test_streaming_profile_writes_metrics_and_cprofile(tmp_path):
+    """A profiled run should leave the metrics file and pricing profile behind"""
+    path = tmp_path / "trades.csv"
+    output = tmp_path / "output.csv"
+    make_frame().to_csv(path, index=False)
+    profiler = StageProfiler(profile_path=str(tmp_path / "pricing.prof"))
+
+    run_streaming(str(path), str(output), chunk_size=3, profiler=profiler)
+    profiler.write(str(output))
+
+    metrics = json.loads(open(metrics_path(str(output))).read())
+    stages = {s["stage"]: s for s in metrics["stages"]}
+    assert set(stages) == {"load", "price", "write"}
+    assert stages["load"]["trades"] == 2
+    assert metrics["rows_rejected"] == 2
+    assert (tmp_path / "pricing.prof").stat().st_size > 0
+
+
+def test_disabled_profiler_writes_nothing(tmp_path):
+    """Without --profile no metrics file should appear"""
+    profiler = StageProfiler(enabled=False)
+    with profiler.stage("load"):
+        pass
+
+    profiler.write(str(tmp_path / "output.csv"))
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,107 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+from pydantic import ValidationError
+from src.io.reader import FileReader
+from src.io.validation import ValidationReport
+from src.models import FXOption, TradeTable
+from src.pricing.black_scholes import BlackScholesFX
+from tests.helpers import make_frame
+
+
+def test_columnar_loader_matches_model_loader(tmp_path):
+    """Columnar and model based loaders should keep the same trades"""
+    path = tmp_path / "trades.xlsx"
+    make_frame().to_excel(path, index=False)
+
+    options = FileReader.load_data(str(path))
+    table = FileReader.load_table(str(path))
+
+    assert list(table.id) == [o.id for o in options] == ["T1", "T2"]
+    assert list(table.is_call) == [True, False]
+    np.testing.assert_array_equal(table.notional, [o.notional for o in options])
+
+
+def test_rejects_are_reported_per_rule(tmp_path, caplog):
+    """Rejected rows should carry their reason codes and be logged per rule"""
+    frame = pd.concat([make_frame()] * 2, ignore_index=True)
+    frame["TradeID"] = [f"T{i}" for i in range(1, 9)]
+    frame.loc[4, "Underlying"] = "EURUSD"
+    frame.loc[5, "NotionalCurrency"] = "CHF"
+    frame["Strike"] = frame["Strike"].astype(object)
+    frame.loc[6, "Strike"] = "abc"
+    path = tmp_path / "trades.csv"
+    frame.to_csv(path, index=False)
+    report = ValidationReport()
+
+    with caplog.at_level(logging.WARNING):
+        table = FileReader.load_table(str(path), report=report)
+
+    assert list(table.id) == ["T1", "T2"]
+    rejects = report.table()
+    assert list(rejects["id"]) == ["T3", "T4", "T5", "T6", "T7", "T8"]
+    assert list(rejects["row"]) == [2, 3, 4, 5, 6, 7]
+    assert list(rejects["reasons"]) == [
+        "notional.greater_than",
+        "option_type.enum",
+        "underlying.currency_pair",
+        "notional_currency.not_in_pair",
+        "strike.float_parsing;notional.greater_than",
+        "option_type.enum",
+    ]
+    assert report.counts["notional.greater_than"] == 2
+    # One line for the total and one per rule, not one per rejected row
+    messages = [r.getMessage() for r in caplog.records]
+    assert messages[0] == "Rejected 6 of 8 rows"
+    assert len(messages) == 1 + len(report.counts) == 6
+    assert "notional.greater_than: 2 rows" in messages[1] and "T3, T7" in messages[1]
+
+    # Streaming in chunks and the model loader reject the same rows
+    streamed = ValidationReport()
+    chunks = list(FileReader.iter_tables(str(path), 3, report=streamed))
+    columns = ["row", "reasons", "id"]
+    pd.testing.assert_frame_equal(streamed.table()[columns], rejects[columns])
+    assert sum(len(chunk) for chunk in chunks) == 2
+    assert [o.id for o in FileReader.load_data(str(path))] == ["T1", "T2"]
+    with pytest.raises(ValidationError, match="base or quote currency"):
+        FXOption.model_validate(
+            dict(table.to_option(0).model_dump(), notional_currency="CHF")
+        )
+
+
+def test_columnar_pricing_matches_model_pricing(tmp_path):
+    """Pricing a TradeTable should give the same numbers as the model path"""
+    path = tmp_path / "trades.xlsx"
+    make_frame().to_excel(path, index=False)
+
+    results = [
+        BlackScholesFX.calculate_greeks_and_pv(o)
+        for o in FileReader.load_data(str(path))
+    ]
+    table = BlackScholesFX.price_table(FileReader.load_table(str(path)))
+
+    np.testing.assert_allclose(table.pv, [r.pv for r in results], rtol=1e-12)
+    np.testing.assert_allclose(table.delta, [r.delta for r in results], rtol=1e-12)
+    np.testing.assert_allclose(table.vega, [r.vega for r in results], rtol=1e-12)
+
+
+def test_trade_table_shares_currency_strings_and_round_trips(tmp_path):
+    """Loaded tables should hold one string per currency and convert back to models"""
+    path = tmp_path / "trades.csv"
+    frame = pd.concat([make_frame()] * 50, ignore_index=True)
+    frame["TradeID"] = [f"T{i}" for i in range(len(frame))]
+    frame.to_csv(path, index=False)
+
+    options = FileReader.load_data(str(path))
+    table = FileReader.load_table(str(path))
+
+    assert len({id(u) for u in table.underlying}) == 1
+    assert len({id(c) for c in table.notional_currency}) == 2
+    assert table.to_option(1) == options[1]
+    assert TradeTable.from_options(options).to_options() == options
+    assert table.take(slice(0, 10)).nbytes() < table.nbytes()
+
+    results = BlackScholesFX.price_table(table)
+    assert results.to_result(3) == results.to_results()[3]
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from src.models import TradeTable
+from src.models.option import FXOption, OptionType
+from src.pricing import scenarios
+from src.pricing.black_scholes import BlackScholesFX
+
+
+def make_options():
+    """Base currency notionals so the scalar reprice uses the same multiplier"""
+    call = FXOption(
+        id="CALL001",
+        option_type=OptionType.CALL,
+        spot_price=1.1,
+        strike=1.12,
+        volatility=0.15,
+        domestic_rate=0.02,
+        foreign_rate=0.01,
+        time_to_maturity=0.25,
+        underlying="EUR/USD",
+        notional=1000000,
+        notional_currency="EUR",
+    )
+    put = call.model_copy(
+        update={"id": "PUT001", "option_type": OptionType.PUT, "strike": 1.15}
+    )
+    return [call, put]
+
+
+def test_parse_shocks():
+    """Ranges are inclusive and lists are taken as given"""
+    np.testing.assert_allclose(
+        scenarios.parse_shocks("-0.02:0.02:0.01"), [-0.02, -0.01, 0, 0.01, 0.02]
+    )
+    np.testing.assert_allclose(scenarios.parse_shocks("0.05,-0.05"), [0.05, -0.05])
+    assert list(scenarios.parse_shocks(None)) == [0.0]
+
+
+def test_zero_shock_scenario_has_no_pnl():
+    """The unshocked scenario should reproduce the base portfolio PV"""
+    options = make_options()
+    grid = scenarios.build_grid(spot_shocks=[-0.1, 0.0, 0.1])
+    result = scenarios.run_scenarios(TradeTable.from_options(options), grid)
+
+    base = sum(BlackScholesFX.calculate_greeks_and_pv(o).pv for o in options)
+    unshocked = result[result["spot_shock"] == 0].iloc[0]
+    assert unshocked["pnl"] == pytest.approx(0.0, abs=1e-9)
+    assert unshocked["total_pv"] == pytest.approx(base, rel=1e-12)
+
+
+def test_scenarios_match_full_reprice(monkeypatch):
+    """Every scenario should equal repricing shocked copies of the trades"""
+    # Force several trade blocks to exercise the blocked accumulation
+    monkeypatch.setattr(scenarios, "BLOCK_ELEMENTS", 4)
+    options = make_options()
+    grid = scenarios.build_grid(
+        spot_shocks=[-0.05, 0.05], vol_shocks=[-0.02, 0.02], domestic_shocks=[0.01]
+    )
+    result = scenarios.run_scenarios(TradeTable.from_options(options), grid)
+
+    for _, row in result.iterrows():
+        shocked = [
+            o.model_copy(
+                update={
+                    "spot_price": o.spot_price * (1 + row["spot_shock"]),
+                    "volatility": o.volatility + row["vol_shock"],
+                    "domestic_rate": o.domestic_rate + row["domestic_shock"],
+                }
+            )
+            for o in options
+        ]
+        expected = sum(BlackScholesFX.calculate_greeks_and_pv(o).pv for o in shocked)
+        assert row["total_pv"] == pytest.approx(expected, rel=1e-12)
@@ -0,0 +1,153 @@
+import asyncio
+import json
+
+import pytest
+from src.models import TradeTable
+from src.pricing.black_scholes import BlackScholesFX
+from src.pricing.parallel import price_parallel
+from src.server import PricingServer, PricingService
+from tests.helpers import make_frame
+
+TRADE = {
+    "id": "N1",
+    "option_type": "Put",
+    "strike": 1.08,
+    "volatility": 0.1,
+    "time_to_maturity": 0.5,
+    "spot_price": 1.1,
+    "domestic_rate": 0.02,
+    "foreign_rate": 0.01,
+    "underlying": "EUR/USD",
+    "notional": 2000000,
+    "notional_currency": "EUR",
+}
+
+
+@pytest.fixture
+def book(tmp_path):
+    path = tmp_path / "trades.csv"
+    make_frame().to_csv(path, index=False)
+    return str(path)
+
+
+def test_price_matches_pricer():
+    """Priced payloads should match calculate_greeks_and_pv"""
+    response = PricingService().price({"trades": [TRADE], "greeks": ["gamma"]})
+
+    (result,) = response["results"]
+    expected = BlackScholesFX.calculate_greeks_and_pv_batch(
+        PricingService.parse_trades([TRADE]), ("gamma",)
+    )[0]
+    assert result == expected.model_dump(exclude_none=True)
+
+
+def test_what_if_matches_full_recompute(book):
+    """What-if totals should match pricing the changed book from scratch"""
+    service = PricingService()
+    service.load({"path": book})
+    amended = dict(TRADE, id="T1")
+
+    response = service.what_if({"add": [TRADE, amended], "remove": ["T2"]})
+
+    # T2 is removed and T1 amended, leaving only the two trades of the request
+    options = PricingService.parse_trades([TRADE, amended])
+    _, expected = price_parallel(TradeTable.from_options(options))
+    portfolio = response["portfolio"]
+    assert portfolio["num_of_trades"] == 2
+    assert portfolio["total_pv"] == pytest.approx(expected.total_pv, rel=1e-12)
+    assert portfolio["total_vega"] == pytest.approx(expected.total_vega, rel=1e-12)
+    # The held portfolio is left unchanged
+    assert service.totals({})["portfolio"]["num_of_trades"] == 2
+    assert service.totals({})["portfolio"]["total_pv"] != pytest.approx(
+        portfolio["total_pv"]
+    )
+
+
+def test_what_if_rejects_unknown_ids(book):
+    """Removing a trade that is not in the book is a bad request"""
+    service = PricingService()
+    service.load({"path": book})
+
+    with pytest.raises(ValueError, match="Unknown trade ids"):
+        service.what_if({"remove": ["T9"]})
+
+
+async def request(port, method, path, payload=None):
+    """Send one HTTP request to the server and return the status and JSON body"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(content)
+
+
+def test_http_endpoints(book):
+    """The server should route requests and report bad ones as 400"""
+
+    async def scenario():
+        server = await PricingServer(PricingService()).start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            missing = await request(port, "GET", "/portfolio")
+            loaded = await request(port, "POST", "/portfolio", {"path": book})
+            priced = await request(port, "POST", "/price", {"trades": [TRADE]})
+            invalid = await request(
+                port, "POST", "/price", {"trades": [dict(TRADE, strike=-1)]}
+            )
+            unknown = await request(port, "GET", "/nowhere")
+        return missing, loaded, priced, invalid, unknown
+
+    missing, loaded, priced, invalid, unknown = asyncio.run(scenario())
+
+    assert missing[0] == 400
+    assert loaded[0] == 200 and loaded[1]["portfolio"]["num_of_trades"] == 2
+    assert priced[0] == 200 and priced[1]["results"][0]["id"] == "N1"
+    assert invalid[0] == 400 and invalid[1]["details"][0]["loc"] == ["strike"]
+    assert unknown[0] == 404
+
+
+def test_bad_requests_are_answered(book):
+    """Malformed arguments get a 400 and handler failures a 500, never no reply"""
+
+    async def scenario():
+        server = PricingServer(PricingService())
+        server.routes[("POST", "/fail")] = lambda request: 1 / 0
+        server = await server.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            responses = [
+                await request(port, "POST", "/price", {"trades": [], "greeks": greeks})
+                for greeks in (5, "gamma")
+            ]
+            await request(port, "POST", "/portfolio", {"path": book})
+            responses.append(
+                await request(port, "POST", "/portfolio/trades", {"remove": [{"a": 1}]})
+            )
+            responses.append(await request(port, "POST", "/fail", {}))
+        return responses
+
+    number, text, removed, failed = asyncio.run(scenario())
+
+    assert number == text == (400, {"error": "'greeks' must be a list of greek names"})
+    assert removed[0] == 400 and "must be strings" in removed[1]["error"]
+    assert failed == (500, {"error": "ZeroDivisionError: division by zero"})
+
+
+def test_trade_updates_change_the_held_portfolio(book):
+    """Updates should move the held totals to those of the what-if"""
+    service = PricingService()
+    service.load({"path": book})
+    change = {"add": [TRADE], "remove": ["T2"]}
+    what_if = service.what_if(change)
+
+    updated = service.update(change)
+
+    assert updated == what_if == service.totals({})
+    assert updated["underlyings"]["EUR/USD"]["num_of_trades"] == 2
+    assert service.reconcile({})["drift"] == pytest.approx(0, abs=1e-6)
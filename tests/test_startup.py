@@ -0,0 +1,99 @@
+import importlib.util
+import json
+import re
+import subprocess
+import sys
+
+# Cumulative import time allowed for the command line module, in milliseconds.
+# It only needs argparse and logging, the pipeline is imported stage by stage
+CLI_IMPORT_BUDGET_MS = 150
+
+# Import time allowed for everything needed to price a small CSV book
+SMALL_BOOK_IMPORT_BUDGET_MS = 1500
+
+
+def import_time_ms(*modules):
+    """Best of three cold imports of the modules, in milliseconds"""
+    code = "; ".join(f"import {m}" for m in modules)
+    timings = []
+    for _ in range(3):
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stderr
+        # Top level imports have no indentation before the module name
+        total = sum(
+            int(m.group(1))
+            for m in re.finditer(r"^import time:\s+\d+ \|\s+(\d+) \| \S", stderr, re.M)
+        )
+        timings.append(total / 1000)
+    return min(timings)
+
+
+def scipy_installed():
+    """True when scipy can be imported, so the normal CDF uses it"""
+    return importlib.util.find_spec("scipy") is not None
+
+
+def loaded_modules(code):
+    """Names of the heavy third party modules loaded after running the code"""
+    check = (
+        f"{code}\nimport sys, json\nprint(json.dumps([m for m in "
+        "('pandas', 'scipy', 'openpyxl', 'pydantic', 'numpy') if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check], capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_cli_import_stays_within_budget():
+    """Importing the command line should stay cheap"""
+    assert import_time_ms("src.main") < CLI_IMPORT_BUDGET_MS
+
+
+def test_help_loads_no_heavy_dependencies():
+    """--help should return before pandas, numpy or pydantic are imported"""
+    code = (
+        "import sys\n"
+        "from src.main import main\n"
+        "sys.argv = ['main', '--help']\n"
+        "try:\n"
+        "    main()\n"
+        "except SystemExit:\n"
+        "    pass"
+    )
+    assert loaded_modules(code) == []
+
+
+def test_small_book_loads_scipy_only_to_price_and_never_openpyxl(tmp_path):
+    """Imports for a CSV book should stay lazy, pricing loads only scipy"""
+    modules = (
+        "src.io.reader",
+        "src.io.writer",
+        "src.pricing.black_scholes",
+        "src.pricing.parallel",
+    )
+    loaded = loaded_modules("\n".join(f"import {m}" for m in modules))
+    assert "scipy" not in loaded and "openpyxl" not in loaded
+    assert import_time_ms(*modules) < SMALL_BOOK_IMPORT_BUDGET_MS
+
+    book = tmp_path / "trades.csv"
+    book.write_text(
+        "TradeID,Underlying,Notional,NotionalCurrency,Spot,Strike,Vol,"
+        "RateDomestic,RateForeign,Expiry,OptionType\n"
+        "T1,EUR/USD,1000000,USD,1.1,1.12,0.15,0.02,0.01,0.25,Call\n"
+    )
+    code = (
+        "import sys\n"
+        "from src.main import main\n"
+        f"sys.argv = ['main', {str(book)!r}, {str(tmp_path / 'out.csv')!r}]\n"
+        "main()"
+    )
+    loaded = loaded_modules(code)
+    # The normal CDF of the priced array comes from scipy where it is installed
+    assert "openpyxl" not in loaded
+    assert ("scipy" in loaded) == scipy_installed()
+    assert (tmp_path / "out.csv").read_text().startswith("id,pv,delta,vega")
@@ -0,0 +1,109 @@
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+import pytest
+from src.io.reader import FileReader
+from src.pricing.normal import norm_cdf
+from src.pricing.vol_surface import VolSurface
+from tests.helpers import MARKET, make_frame
+
+GRID = pd.DataFrame(
+    {
+        "Underlying": ["EUR/USD"] * 6 + ["USD/JPY"] * 3,
+        "Expiry": [0.25, 0.25, 0.25, 1.0, 1.0, 1.0, 0.5, 0.5, 0.5],
+        "Strike": [1.0, 1.1, 1.2, 1.0, 1.1, 1.2, 140.0, 150.0, 160.0],
+        "Vol": [0.12, 0.1, 0.11, 0.14, 0.12, 0.125, 0.11, 0.1, 0.12],
+    }
+)
+
+
+def reference_vol(grid, underlying, strike, t):
+    """Interpolate one trade slice by slice, the way the surface is defined"""
+    rows = grid[grid["Underlying"] == underlying]
+    expiries = np.sort(rows["Expiry"].unique())
+
+    def slice_vol(expiry):
+        pillars = rows[rows["Expiry"] == expiry].sort_values("Strike")
+        return np.interp(np.log(strike), np.log(pillars["Strike"]), pillars["Vol"])
+
+    if t <= expiries[0]:
+        return slice_vol(expiries[0])
+    if t >= expiries[-1]:
+        return slice_vol(expiries[-1])
+    hi = np.searchsorted(expiries, t)
+    t_lo, t_hi = expiries[hi - 1], expiries[hi]
+    weight = (t - t_lo) / (t_hi - t_lo)
+    variance = (1 - weight) * slice_vol(t_lo) ** 2 * t_lo
+    variance += weight * slice_vol(t_hi) ** 2 * t_hi
+    return np.sqrt(variance / t)
+
+
+def test_vectorised_vols_match_slice_by_slice_interpolation():
+    """One pass over a random book should match interpolating trade by trade"""
+    surface = VolSurface(*(GRID[c].to_numpy() for c in GRID.columns))
+    rng = np.random.default_rng(1)
+    underlying = np.where(rng.random(500) < 0.5, "EUR/USD", "USD/JPY").astype(object)
+    strike = np.where(
+        underlying == "EUR/USD", rng.uniform(0.9, 1.3, 500), rng.uniform(130, 170, 500)
+    )
+    t = rng.uniform(0, 2, 500)
+
+    vols = surface.vols(underlying, strike, t)
+
+    expected = [reference_vol(GRID, *trade) for trade in zip(underlying, strike, t)]
+    np.testing.assert_allclose(vols, expected, rtol=1e-12)
+    # Pillars are returned exactly and unknown pairs fall back to the default
+    assert surface.vols(["EUR/USD"], [1.1], [1.0])[0] == pytest.approx(0.12, abs=1e-15)
+    assert surface.vols(["GBP/USD"], [1.3], [1.0], default=[0.3])[0] == 0.3
+
+
+def test_delta_quotes_are_placed_at_their_deltas(tmp_path):
+    """ATM and 25 delta pillars should sit at forward deltas of 0.5 and 0.25"""
+    path = tmp_path / "quotes.csv"
+    pd.DataFrame(
+        {
+            "Underlying": ["EUR/USD", "EUR/USD"],
+            "Expiry": [0.5, 1.0],
+            "ATM": [0.1, 0.11],
+            "RR25": [-0.01, -0.015],
+            "BF25": [0.003, 0.004],
+        }
+    ).to_csv(path, index=False)
+    market_path = tmp_path / "market.csv"
+    MARKET.to_csv(market_path, index=False)
+    market = FileReader.load_market(str(market_path))
+
+    surface = FileReader.load_vol_surface(str(path), market=market)
+
+    spot, rd, rf = 1.2, 0.03, 0.015
+    forward = spot * np.exp((rd - rf) * 1.0)
+    vol_call = 0.11 + 0.004 - 0.015 / 2
+    # Strike of the 25 delta call from its vol, then its forward delta
+    for delta, vol in ((0.5, 0.11), (0.25, vol_call)):
+        d1 = NormalDist().inv_cdf(delta)
+        strike = forward * np.exp(-d1 * vol + vol**2 / 2)
+        assert surface.vols(["EUR/USD"], [strike], [1.0])[0] == pytest.approx(vol)
+        d1 = (np.log(forward / strike) + vol**2 / 2) / vol
+        assert norm_cdf(d1) == pytest.approx(delta)
+
+    with pytest.raises(ValueError, match="needs market data"):
+        FileReader.load_vol_surface(str(path))
+
+
+def test_loaded_trades_take_their_vols_from_the_surface(tmp_path):
+    """Joining at load and applying to a loaded book should give the same vols"""
+    path = tmp_path / "trades.csv"
+    make_frame().to_csv(path, index=False)
+    surface_path = tmp_path / "surface.csv"
+    GRID.to_csv(surface_path, index=False)
+    surface = FileReader.load_vol_surface(str(surface_path))
+
+    joined = FileReader.load_table(str(path), surface=surface)
+    applied = surface.apply(FileReader.load_table(str(path)))
+
+    np.testing.assert_array_equal(joined.volatility, applied.volatility)
+    np.testing.assert_allclose(
+        joined.volatility,
+        [reference_vol(GRID, "EUR/USD", k, t) for k, t in ((1.12, 0.25), (1.15, 0.5))],
+        rtol=1e-12,
+    )